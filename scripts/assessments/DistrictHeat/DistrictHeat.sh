@@ -47,6 +47,7 @@ do_simulation=true
 do_indra=true
 do_CFD=false
 num_years=10
+num_jobs=0
 # do_detailed_report=false
 limit_multiplier='0.1' # 0.1 = 10% allowable deviation
 
@@ -54,11 +55,17 @@ limit_multiplier='0.1' # 0.1 = 10% allowable deviation
 script_dir="$(dirname "$(readlink -f "$0")")"
 common_dir="$script_dir/../../common"
 
+# Progress reporting.
+source "$common_dir/progress.sh"
+
+# Parallel simulation of years.
+source "$common_dir/years.sh"
+
 # Get current directory.
 current_dir="$PWD"
 
 # Parse command line.
-while getopts ":hvf:p:t:s:d:r:P:SIC" opt; do
+while getopts ":hvf:p:t:s:d:r:P:SICJ:" opt; do
   case "$opt" in
     h) information=true;;
     v) verbose=true;;
@@ -74,6 +81,7 @@ while getopts ":hvf:p:t:s:d:r:P:SIC" opt; do
     S) do_simulation=false;;
     I) do_indra=false;;
     C) do_CFD=false;;
+    J) num_jobs="$OPTARG";;
     # R) do_detailed_report=true
     #    detailed_report_final="$OPTARG";;
     \?) echo "Error: unknown option -$OPTARG. Use option -h for help." >&2
@@ -144,6 +152,10 @@ if "$information" ; then
   echo "                       -C" 
   echo "                          Switch off CFD in simulations"
   echo "                          default: off"
+  echo "                       -J number-of-jobs"
+  echo "                          number of years to simulate at the same time"
+  echo "                          default: 0 (this job's share of the CPUs, given by"
+  echo "                          MARATHON_JOB_CPUS, otherwise 1)"
   echo
   echo " If a simulation preset is defined and present, it will override the period and time steps parameters."
   echo " If the simulation preset is not found this will not cause a fatal error; the PAM will use user-defined"
@@ -203,7 +215,7 @@ if [ ! -d "$tmp_dir" ]; then
 fi
 
 # Create progress file.
-echo '2' > "$tmp_dir/progress.txt"
+setProgress "$tmp_dir" 2
 
 # ESP-r seems to have problems if locations have a dot in
 # front of them; check for this and remove it.
@@ -459,7 +471,7 @@ if $is_plant; then plt_results="${results_file}.plr"; fi
 if $do_indra; then
 
   # Update progress file.
-  echo '3' > "$tmp_dir/progress.txt"
+  setProgress "$tmp_dir" 3
 
   # Generate an ASCII version of the seed weather file.
   clm -file "$weather_base_abs" -act bin2asci silent "$tmp_dir/weather_base.txt"
@@ -468,13 +480,21 @@ if $do_indra; then
     exit 666
   fi
 
-  # Train indra from the seed weather file.
+  # Train indra from the seed weather file. The seed is fixed so that the
+  # trained model can be shared between jobs through the model store.
   mkdir "$tmp_dir/indra"
-  python3 "$common_dir/SyntheticWeather/indra.py" --train 1 --station_code 'ra' --n_samples "$num_years" --path_file_in "$tmp_dir/weather_base.txt" --path_file_out "$weather_base_abs.txt" --file_type 'espr' --store_path "$tmp_dir/indra" 1>"$tmp_dir/indra.out" 2>&1
+  python3 "$common_dir/SyntheticWeather/indra.py" --train 1 --station_code 'ra' --n_samples "$num_years" --randseed 42 --path_file_in "$tmp_dir/weather_base.txt" --path_file_out "$weather_base_abs.txt" --file_type 'espr' --store_path "$tmp_dir/indra" 1>"$tmp_dir/indra.out" 2>&1
   if [ $? -ne 0 ]; then
     echo "Error: failed to train indra."
     exit 666
   fi
+
+  # Write weather data for all years at once.
+  python3 "$common_dir/SyntheticWeather/indra.py" --train 0 --n_out "$num_years" --station_code 'ra' --path_file_in "$tmp_dir/weather_base.txt" --path_file_out "$tmp_dir/indra/weather.txt" --file_type 'espr' --store_path "$tmp_dir/indra" >> "$tmp_dir/indra.out"
+  if [ $? -ne 0 ]; then
+    echo "Error: failed to retrieve weather data from indra."
+    exit 666
+  fi
 fi
 
 # Set up paths.
@@ -500,107 +520,162 @@ fi
 # Update simulation year in cfg file.
 sed -i -e 's/\*year *[0-9]*/*year '"$year"'/' "$building_tmp"
 
+# Years are simulated in their own directories in the temporary files
+# directory, and their results libraries are kept there until they have been
+# analysed. Unless a simulation preset is used, each year simulates its own
+# copy of the model, with its own weather file, so that up to num_jobs years
+# can run at the same time. bps puts the results libraries of presets in
+# fixed places, so with a preset the years are simulated one at a time in
+# the model itself, as they are if the temporary files directory is inside
+# the model directory.
+tmp_dir_abs="$(readlink -f "$tmp_dir_tmp")"
+model_dir_abs="$(readlink -f "$building_dir_tmp/..")"
+building_rel="$(basename "$building_dir_tmp")/$(basename "$building_tmp")"
+if [ "X$preset" == "X" ] && [ "${tmp_dir_abs#$model_dir_abs/}" == "$tmp_dir_abs" ]; then
+  copy_model=true
+  num_jobs="$(numJobs "$num_jobs")"
+else
+  copy_model=false
+  num_jobs=1
+fi
 
+# Set the directory and results library paths of year $1.
+setYearPaths () {
+  year_dir="$tmp_dir_abs/years/$1"
+  if $is_building; then sim_results_tmp="$year_dir/$(basename "$sim_results")"; fi
+  if $is_afn; then mf_results_tmp="$year_dir/$(basename "$mf_results")"; fi
+  if $is_CFD; then cfd_results_tmp="$year_dir/$(basename "$cfd_results")"; fi
+  if $is_plant; then plt_results_tmp="$year_dir/$(basename "$plt_results")"; fi
+}
 
+# Export the occupied hours from results library $sim_results_tmp to
+# occupied_hours.txt in directory $1, with the res output in res.out there.
+exportOccupiedHours () {
+  res -mode script -file "$sim_results_tmp" > "$1/res.out" <<~
 
+d
+c
+>
+b
+${1}/occupied_hours.txt
+j
+e
+-
+0.001
+>
+-
+-
+-
+~
 
-# *** START OF SIMULATION LOOP ***
-
-# Update progress file.
-echo '4' > "$tmp_dir/progress.txt"
-
-# Loop for the prescribed number of years.
-iyear=1
-while [ "$iyear" -le "$num_years" ]; do
-
-  # * SIMULATE *
-  if "$do_simulation"; then
+  # Check error code and existence of output.
+  if [ "$?" -ne 0 ] || ! [ -f "$1/occupied_hours.txt" ]; then
+    echo "Error: occupancy results extraction failed." >&2
+    exit 105
+  fi
+}
 
-    # Remove any files that might cause unexpected questions from ESP-r.
-    # Suppress output to prevent chatter.
-    if $is_building; then rm -f "$sim_results_tmp" > /dev/null; fi
-    if $is_afn; then rm -f "$mf_results_tmp" > /dev/null; fi
-    if $is_CFD; then 
-      rm -f "$cfd_results_tmp" > /dev/null
-      rm -f "$building_dir_tmp"/ACC-actions_*.rec > /dev/null
-      rm -f "$building_dir_tmp"/cfd3dascii_* > /dev/null
+# Simulate year $1 (see startYears in years.sh).
+simulateYear () {
+  local iyear="$1"
+  local weather_year="$weather_base_abs"
+
+  setYearPaths "$iyear"
+  rm -rf "$year_dir"
+  mkdir -p "$year_dir"
+
+  # Copy the model into this year's directory, and point it at this year's
+  # weather file.
+  if $copy_model; then
+    cp -r "$model_dir_abs" "$year_dir/model"
+    building_tmp="$year_dir/model/$building_rel"
+    building_dir_tmp="$(dirname "$building_tmp")"
+    if $do_indra; then
+      weather_year="$year_dir/weather.clm"
+      sed -i -e 's|^\*\(std\)\?clm .*|*clm '"$weather_year"'|' "$building_tmp"
     fi
-    if $is_plant; then rm -f "$plt_results_tmp" > /dev/null; fi
+    cd "$year_dir" || exit 666
+  fi
 
-    # if ! [ "X$up_one" == "X" ]; then
-    #   cd ..
-    # fi
+  # Remove any files that might cause unexpected questions from ESP-r.
+  # Suppress output to prevent chatter.
+  if $is_building; then rm -f "$sim_results_tmp" > /dev/null; fi
+  if $is_afn; then rm -f "$mf_results_tmp" > /dev/null; fi
+  if $is_CFD; then 
+    rm -f "$cfd_results_tmp" > /dev/null
+    rm -f "$building_dir_tmp"/ACC-actions_*.rec > /dev/null
+    rm -f "$building_dir_tmp"/cfd3dascii_* > /dev/null
+  fi
+  if $is_plant; then rm -f "$plt_results_tmp" > /dev/null; fi
 
-    # Retrieve weather data from indra.
-    if $do_indra; then
-      python3 "$common_dir/SyntheticWeather/indra.py" --train 0 --station_code 'ra' --path_file_in "$tmp_dir_tmp/weather_base.txt" --path_file_out "$weather_base_abs.txt" --file_type 'espr' --store_path "$tmp_dir_tmp/indra" >> "$tmp_dir_tmp/indra.out"
-      if [ $? -ne 0 ]; then  
-        echo "Error: failed to retrieve weather data from indra."
-        exit 666
-      fi
+  # if ! [ "X$up_one" == "X" ]; then
+  #   cd ..
+  # fi
 
-      # Convert ASCII weather data to binary.
-      rm "$weather_base_abs"
-      clm -file "$weather_base_abs" -act asci2bin silent "$weather_base_abs.txt"
-      if [ $? -ne 0 ]; then  
-        echo "Error: failed to convert weather data to binary."
-        exit 666
-      fi
+  # Use this year's weather data from indra.
+  if $do_indra; then
+    # Convert ASCII weather data to binary.
+    rm -f "$weather_year"
+    clm -file "$weather_year" -act asci2bin silent "$tmp_dir_abs/indra/weather_$iyear.txt"
+    if [ $? -ne 0 ]; then  
+      echo "Error: failed to convert weather data to binary."
+      exit 666
     fi
+  fi
 
-    # Run ESP-r simulation.
-    if ! [ "X$preset" == "X" ]; then
-      bps_script=""
-      bps -mode script -file "$building_tmp" -p "$preset" silent > "$tmp_dir_tmp/bps.out"
+  # Run ESP-r simulation.
+  if ! [ "X$preset" == "X" ]; then
+    bps_script=""
+    bps -mode script -file "$building_tmp" -p "$preset" silent > "$year_dir/bps.out"
 
-      if $is_building; then mv "$sim_results_preset" "$sim_results_tmp"; fi
-      if $is_afn; then mv "$mf_results_preset" "$mf_results_tmp"; fi
-      if $is_CFD; then mv "$cfd_results_preset" "$cfd_results_tmp"; fi
-      if $is_plant; then mv "$plt_results_preset" "$plt_results_tmp"; fi
-    else
-      bps_script="
+    if $is_building; then mv "$sim_results_preset" "$sim_results_tmp"; fi
+    if $is_afn; then mv "$mf_results_preset" "$mf_results_tmp"; fi
+    if $is_CFD; then mv "$cfd_results_preset" "$cfd_results_tmp"; fi
+    if $is_plant; then mv "$plt_results_preset" "$plt_results_tmp"; fi
+  else
+    bps_script="
 c"
-      if $is_building; then
-        bps_script="
+    if $is_building; then
+      bps_script="
 ${sim_results_tmp}"
-      fi
-      if $is_afn; then
-        bps_script="$bps_script
+    fi
+    if $is_afn; then
+      bps_script="$bps_script
 ${mf_results_tmp}"
-      fi
-      if $is_CFD; then
-        bps_script="$bps_script
+    fi
+    if $is_CFD; then
+      bps_script="$bps_script
 ${cfd_results_tmp}"
-      fi
-      if $is_plant; then
-        bps_script="$bps_script
-${plt_results_tmp}"
-      fi
+    fi
+    if $is_plant; then
       bps_script="$bps_script
+${plt_results_tmp}"
+    fi
+    bps_script="$bps_script
 ${start}
 ${finish}
 ${startup}
 ${timesteps}"
-      if [ "$timesteps" -gt 1 ]; then
-        bps_script="$bps_script
+    if [ "$timesteps" -gt 1 ]; then
+      bps_script="$bps_script
 n"
-      fi
-      if $is_CFD; then
-        if $do_CFD; then
-          # Run CFD for whole period.
-          bps_script="$bps_script
+    fi
+    if $is_CFD; then
+      if $do_CFD; then
+        # Run CFD for whole period.
+        bps_script="$bps_script
 y
 ${start}
 ${finish}
 ${CFD_start_hour}
 ${CFD_finish_hour}"
-        else
-          # Disable CFD for the simulation.
-          bps_script="$bps_script
+      else
+        # Disable CFD for the simulation.
+        bps_script="$bps_script
 n"
-        fi
       fi
-      bps_script="$bps_script
+    fi
+    bps_script="$bps_script
 s
 y"
 #       if $is_ucn; then
@@ -608,85 +683,93 @@ y"
 # d
 # -"
 #       fi
-      bps_script="$bps_script
+    bps_script="$bps_script
 y
 y
 -
 -
 "
 
-      echo "$bps_script" > "$tmp_dir_tmp/bps.script"
+    echo "$bps_script" > "$year_dir/bps.script"
 
-      bps -mode script -file "$building_tmp" > "$tmp_dir_tmp/bps.out" <<~
+    bps -mode script -file "$building_tmp" > "$year_dir/bps.out" <<~
 ${bps_script}
 ~
-    fi
+  fi
 
-    # if ! [ "X$up_one" == "X" ]; then
-    #   cd "$up_one" || exit 666
-    # fi
+  # if ! [ "X$up_one" == "X" ]; then
+  #   cd "$up_one" || exit 666
+  # fi
 
-    # Check error code and existence of results libraries.
-    if [ "$?" -ne 0 ]; then
-      echo "Error: simulation failed, please check model manually." >&2
-      exit 104
-    fi
+  # Check error code and existence of results libraries.
+  if [ "$?" -ne 0 ]; then
+    echo "Error: simulation failed, please check model manually." >&2
+    exit 104
+  fi
 
-    if $is_building && ! [ -f "$sim_results_tmp" ]; then
-      echo "Error: simulation failed, please check model manually." >&2
-      exit 104
-    fi
+  if $is_building && ! [ -f "$sim_results_tmp" ]; then
+    echo "Error: simulation failed, please check model manually." >&2
+    exit 104
+  fi
 
-    if $is_afn && ! [ -f "$mf_results_tmp" ]; then
-      echo "Error: simulation failed, please check model manually." >&2
-      exit 104
-    fi
+  if $is_afn && ! [ -f "$mf_results_tmp" ]; then
+    echo "Error: simulation failed, please check model manually." >&2
+    exit 104
+  fi
 
-    if $is_CFD && $do_CFD && ! [ -f "$cfd_results_tmp" ]; then
-      echo "Error: simulation failed, please check model manually." >&2
-      exit 104
-    fi
+  if $is_CFD && $do_CFD && ! [ -f "$cfd_results_tmp" ]; then
+    echo "Error: simulation failed, please check model manually." >&2
+    exit 104
+  fi
 
-    if $is_plant && ! [ -f "$plt_results_tmp" ]; then
-      echo "Error: simulation failed, please check model manually." >&2
-      exit 104
-    fi
+  if $is_plant && ! [ -f "$plt_results_tmp" ]; then
+    echo "Error: simulation failed, please check model manually." >&2
+    exit 104
+  fi
+
+  # Export this year's occupied hours, as stochastic occupancy may differ
+  # from year to year.
+  if $is_building; then
+    exportOccupiedHours "$year_dir"
+  fi
+}
+
+# *** START OF SIMULATION LOOP ***
+
+# Update progress file.
+setProgress "$tmp_dir" 4
+
+# Simulate the years in the background, up to num_jobs at a time, while
+# the loop below analyses each one as it finishes.
+if "$do_simulation"; then
+  startYears "$num_jobs" "$num_years" simulateYear "$tmp_dir" 4
+fi
+
+# Loop for the prescribed number of years.
+iyear=1
+while [ "$iyear" -le "$num_years" ]; do
+
+  # Wait for this year's simulation, and use its results libraries.
+  if "$do_simulation"; then
+    waitYear "$iyear" || exit "$?"
+    setYearPaths "$iyear"
   fi
 
   # * EXTRACT RESULTS *
 
   rm "$tmp_dir_tmp/res.script" "$tmp_dir_tmp/res.out" 1>/dev/null 2>&1
 
-  # Update progress file.
-  echo '4' > "$tmp_dir_tmp/progress.txt"
-
   # if ! [ "X$up_one" == "X" ]; then
   #   cd .. || exit 1
   # fi
 
   if $is_building; then
-    # Run res to get occupied hours.
-    res -mode script -file "$sim_results_tmp" > "$tmp_dir_tmp/res.out" <<~
-
-d
-c
->
-b
-${tmp_dir_tmp}/occupied_hours.txt
-j
-e
--
-0.001
->
--
--
--
-~
-
-    # Check error code and existence of output.
-    if [ "$?" -ne 0 ] || ! [ -f "$tmp_dir_tmp/occupied_hours.txt" ]; then
-      echo "Error: occupancy results extraction failed." >&2
-      exit 105
+    # Get occupied hours. When simulating, simulateYear has already exported
+    # them for this year.
+    if "$do_simulation"; then
+      mv "$year_dir/res.out" "$year_dir/occupied_hours.txt" "$tmp_dir_tmp"
+    else
+      exportOccupiedHours "$tmp_dir_tmp"
     fi
 
     # Extract data from res output.
@@ -751,12 +834,18 @@ ${cfd_results_tmp}"
   fi
 
   # Open mass flow library to avoid unexpected prompts.
-  # ESP-r looks for the mass flow library relative to the cfg file.
+  # ESP-r looks for the mass flow library relative to the cfg file, unless
+  # its path is absolute, as it is for the year libraries (see setYearPaths).
   if $is_afn; then
+    if [ "${mf_results_tmp:0:1}" == "/" ]; then
+      mf_results_res="$mf_results_tmp"
+    else
+      mf_results_res="../../$mf_results_tmp"
+    fi
     res_script="$res_script
 c
 i
-../../${mf_results_tmp}
+${mf_results_res}
 -
 -"
   fi
@@ -983,7 +1072,7 @@ $(echo "$temp_deviation" | awk -f "$script_dir/check_deviation_timeStep.awk" -v
     echo "$performance_flag" > "$tmp_dir_tmp/pflag.txt"
 
     # Update progress file.
-    echo '6' > "$tmp_dir/progress.txt" 
+    setProgress "$tmp_dir" 6
 
     # Write feedback report.
     report="$tmp_dir_tmp/report.tex"
@@ -1049,6 +1138,11 @@ $(echo "$temp_deviation" | awk -f "$script_dir/check_deviation_timeStep.awk" -v
     exit 0
   fi
 
+  # This year's results libraries are no longer needed.
+  if "$do_simulation"; then
+    rm -rf "$year_dir"
+  fi
+
   ((iyear++))
 
 done
@@ -23,6 +23,9 @@ do_training=true
 script_dir="$(dirname "$(readlink -f "$0")")"
 common_dir="$script_dir/../../common"
 
+# Progress reporting.
+source "$common_dir/progress.sh"
+
 # Parse command line.
 while getopts ":hvf:p:t:s:d:r:j:P:U" opt; do
   case "$opt" in
@@ -152,7 +155,7 @@ if [ ! -d "$tmp_dir" ]; then
 fi
 
 # Create progress file.
-echo '2' > "$tmp_dir/progress.txt"
+setProgress "$tmp_dir" 2
 
 # ESP-r seems to have problems if locations have a dot in
 # front of them; check for this and remove it.
@@ -367,7 +370,7 @@ if $do_training; then
 fi
 
 # Update progress file.
-echo '3' > "$tmp_dir_tmp/progress.txt"
+setProgress "$tmp_dir_tmp" 3
 
 # Make sure there is no existing results library or ACC-actions file. 
 # Suppress output in case there isn't to prevent chatter.
@@ -510,7 +513,7 @@ ${bps_script}
   # *** EXTRACT RESULTS ***
 
   # Update progress file.
-  echo '4' > "$tmp_dir/progress.txt"
+  setProgress "$tmp_dir" 4
 
   if ! [ "X$up_one" == "X" ]; then
     cd .. || exit 1
@@ -542,7 +545,7 @@ ${res_script}
   # *** POST PROCESSING ***
 
   # Update progress file.
-  echo '5' > "$tmp_dir_tmp/progress.txt"
+  setProgress "$tmp_dir_tmp" 5
 
   # Get energy delivered per unit area for each zone.
   ED="$(awk -f "$script_dir/get_energyDeliveredPerArea" "$tmp_dir_tmp/energy_delivered")"
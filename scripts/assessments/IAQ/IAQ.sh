@@ -34,6 +34,9 @@ do_detailed_report=false
 script_dir="$(dirname "$(readlink -f "$0")")"
 common_dir="$script_dir/../../common"
 
+# Progress reporting.
+source "$common_dir/progress.sh"
+
 # Get current directory.
 current_dir="$PWD"
 
@@ -188,7 +191,7 @@ if [ ! -d "$tmp_dir" ]; then
 fi
 
 # Create progress file.
-echo '2' > "$tmp_dir/progress.txt"
+setProgress "$tmp_dir" 2
 
 # ESP-r seems to have problems if locations have a dot in
 # front of them; check for this and remove it.
@@ -199,6 +202,11 @@ if [ "${tmp_dir:0:2}" == "./" ] && ! [ "$tmp_dir" == "./" ]; then
   tmp_dir="${tmp_dir:2}"
 fi
 
+# res-analysis parses each exported table only once, and keeps the arrays
+# here for later calls.
+export RESANALYSIS_CACHE_DIR="$(readlink -f "$tmp_dir")/res-analysis"
+mkdir -p "$RESANALYSIS_CACHE_DIR"
+
 # Currently, res asks a question if the cfg file is not in the directory from
 # which it is called. Unless this is accounted for, it will break
 # scripted results recovery if it happens. We get around this by forcing
@@ -437,7 +445,7 @@ fi
 if $do_simulation; then
 
   # Update progress file.
-  echo '3' > "$tmp_dir_tmp/progress.txt"
+  setProgress "$tmp_dir_tmp" 3
 
   # Make sure there is no existing results library or ACC-actions file. 
   # Suppress output in case there isn't to prevent chatter.
@@ -567,7 +575,7 @@ fi
 # *** EXTRACT RESULTS ***
 
 # Update progress file.
-echo '4' > "$tmp_dir/progress.txt"
+setProgress "$tmp_dir" 4
 
 # Get array of AFN zone node indices.
 AFNnod_indices="$(awk -f "$common_dir/esp-query/processOutput_getSpaceSeparatedAFNnodNums.awk" "$tmp_dir/query_results.txt")"
@@ -875,7 +883,7 @@ fi
 # *** POST PROCESSING ***
 
 # Update progress file.
-echo '5' > "$tmp_dir/progress.txt"
+setProgress "$tmp_dir" 5
 
 # Define function to convert "day month" string to julian day.
 function DM2JD {
@@ -995,14 +1003,7 @@ if "$do_detailed_report"; then
       for sensor_name in "${array_zone_sensor_names[@]}"; do
         if [ "${array_severity[i0_result]}" -gt 0 ]; then
           i1_result="$((i0_result+1))"
-          i=1
-          output="$(awk -v zone="$i1_result" -v recursion="$i" -f "$script_dir/get_singleZoneAllRecursive.awk" "$tmp_dir/CO2.txt")"
-          while [ ! "X$output" == "X" ]; do
-            echo "$output" > "$tmp_dir/res$i1_result-$i"
-            ((i++))    
-            output="$(awk -v zone="$i1_result" -v recursion="$i" -f "$script_dir/get_singleZoneAllRecursive.awk" "$tmp_dir/CO2.txt")"
-          done
-          array_num_plotFiles[i0_result]="$((i-1))"
+          array_num_plotFiles[i0_result]="$("$common_dir/res-analysis/res-analysis.py" runs -c "$i1_result" -o "$tmp_dir/res$i1_result-" "$tmp_dir/CO2.txt")"
         else
           array_num_plotFiles[i0_result]=0
         fi
@@ -1013,14 +1014,7 @@ if "$do_detailed_report"; then
     else
       if [ "${array_severity[i0_result]}" -gt 0 ]; then
         i1_result="$((i0_result+1))"
-        i=1
-        output="$(awk -v zone="$i1_result" -v recursion="$i" -f "$script_dir/get_singleZoneAllRecursive.awk" "$tmp_dir/CO2.txt")"
-        while [ ! "X$output" == "X" ]; do
-          echo "$output" > "$tmp_dir/res$i1_result-$i"
-          ((i++))    
-          output="$(awk -v zone="$i1_result" -v recursion="$i" -f "$script_dir/get_singleZoneAllRecursive.awk" "$tmp_dir/CO2.txt")"
-        done
-        array_num_plotFiles[i0_result]="$((i-1))"
+        array_num_plotFiles[i0_result]="$("$common_dir/res-analysis/res-analysis.py" runs -c "$i1_result" -o "$tmp_dir/res$i1_result-" "$tmp_dir/CO2.txt")"
       else
         array_num_plotFiles[i0_result]=0
       fi
@@ -1030,18 +1024,16 @@ if "$do_detailed_report"; then
 fi
 
 # Update progress file.
-echo '6' > "$tmp_dir/progress.txt"
+setProgress "$tmp_dir" 6
 
 
 
 # *** Write JSON file ***
 
-echo '{' > "$JSON"
+json_records=""
 
 # If there is any discomfort, write directives.
 if [ "$performance_flag" -gt 0 ]; then
-  echo "  \"poor air quality\": [" >> "$JSON"
-  first=true
   i0_result=0
   for i1_zone in "${array_zones_with_MRTsensors[@]}"; do
     i0_zone="$((i1_zone-1))"
@@ -1054,23 +1046,15 @@ if [ "$performance_flag" -gt 0 ]; then
       for sensor_name in "${array_zone_sensor_names[@]}"; do
 #      while [ "$i0_zone_sensor" -lt "${array_MRT_sensors[i0_zone]}" ]; do
         if [ "${array_severity[i0_result]}" -gt 0 ]; then          
-          if $first; then
-            first=false
-          else
-            echo "," >> "$JSON"
-          fi
-          echo '    {' >> "$JSON"
-          echo "      \"area\": \"$zone_name\"," >> "$JSON"
-          echo "      \"location\": \"$sensor_name\"," >> "$JSON"
-          echo "      \"CO2 concentration\": {" >> "$JSON"
-          echo "        \"frequency of occurrence (%)\": \"${array_PTD[i0_result]}\"," >> "$JSON"
           i1_result="$((i0_result+1))"
           x="$(awk -v entryNum="$i1_result" -f "$script_dir/get_sensorStats.awk" "$tmp_dir/CO2summary.txt")"
           a=($x)
           s="${a[0]}/${a[1]}/$year @ ${a[2]}"
-          echo "        \"worst time\": \"$s\"" >> "$JSON"
-          echo "      }" >> "$JSON"
-          printf '    }' >> "$JSON"
+          json_records="$json_records
+poor air quality/+/area=$zone_name
+poor air quality/-/location=$sensor_name
+poor air quality/-/CO2 concentration/frequency of occurrence (%)=${array_PTD[i0_result]}
+poor air quality/-/CO2 concentration/worst time=$s"
         fi
 #        ((i0_zone_sensor++))
         ((i0_result++))
@@ -1092,34 +1076,28 @@ if [ "$performance_flag" -gt 0 ]; then
       for sensor_name in "${array_zone_sensor_names[@]}"; do
 
         if [ "$severity" -gt 0 ]; then          
-          if $first; then
-            first=false
-          else
-            echo "," >> "$JSON"
-          fi
-          echo '    {' >> "$JSON"
-          echo "      \"area\": \"$zone_name\"," >> "$JSON"
-          echo "      \"location\": \"$sensor_name\"," >> "$JSON"
-          echo "      \"CO2 concentration\": {" >> "$JSON"
-          echo "        \"frequency of occurrence (%)\": \"$PTD\"," >> "$JSON"
-          echo "        \"worst time\": \"$worst_time\"" >> "$JSON"
-          echo "      }" >> "$JSON"
-          printf '    }' >> "$JSON"
+          json_records="$json_records
+poor air quality/+/area=$zone_name
+poor air quality/-/location=$sensor_name
+poor air quality/-/CO2 concentration/frequency of occurrence (%)=$PTD
+poor air quality/-/CO2 concentration/worst time=$worst_time"
         fi
 #        ((i0_zone_sensor++))
       done
       ((i0_result++))
     fi    
   done
-  echo '' >> "$JSON"
-  echo '  ],' >> "$JSON"
 fi
-echo '  "report": "",' >> "$JSON"
-echo '  "results libraries": ""' >> "$JSON"
-echo '}' >> "$JSON"
+json_records="$json_records
+report=
+results libraries="
+
+"$common_dir/json-report/json-report.py" -o "$JSON" <<~
+${json_records}
+~
 
 # Check json file exists.
-if ! [ -f "$JSON" ]; then
+if [ "$?" -ne 0 ] || ! [ -f "$JSON" ]; then
   echo "Error: failed to write json output." >&2
   exit 110
 fi
@@ -1127,7 +1105,7 @@ fi
 
 
 # Update progress file.
-echo '8' > "$tmp_dir/progress.txt"
+setProgress "$tmp_dir" 8
 
 # *** Write report - latex ***
 echo '\nonstopmode' > "$report"
@@ -34,6 +34,12 @@ do_detailed_report=false
 script_dir="$(dirname "$(readlink -f "$0")")"
 common_dir="$script_dir/../../common"
 
+# Progress reporting.
+source "$common_dir/progress.sh"
+
+# Chunked res exports.
+source "$common_dir/res-script.sh"
+
 # Parse command line.
 while getopts ":hvf:p:t:s:d:r:R:j:P:U" opt; do
   case "$opt" in
@@ -221,7 +227,7 @@ if [ ! -d "$tmp_dir" ]; then
 fi
 
 # Create progress file.
-echo '2' > "$tmp_dir/progress.txt"
+setProgress "$tmp_dir" 2
 
 # ESP-r seems to have problems if locations have a dot in
 # front of them; check for this and remove it.
@@ -232,6 +238,11 @@ if [ "${tmp_dir:0:2}" == "./" ] && ! [ "$tmp_dir" == "./" ]; then
   tmp_dir="${tmp_dir:2}"
 fi
 
+# res-analysis parses each exported table only once, and keeps the arrays
+# here for later calls.
+export RESANALYSIS_CACHE_DIR="$(readlink -f "$tmp_dir")/res-analysis"
+mkdir -p "$RESANALYSIS_CACHE_DIR"
+
 # Currently, res asks a question if the cfg file is not in the directory from
 # which it is called. Unless this is accounted for, it will break
 # scripted results recovery if it happens. We get around this by forcing
@@ -341,6 +352,13 @@ if ! $is_MRT; then
   exit 103
 fi
 
+# Plan how exports of the MRT sensors are split into files of up to 41
+# columns (see planChunks in res-script.sh). Operative temperature is
+# selected a zone at a time, so its chunks keep zones whole; other metrics
+# select sensors directly.
+opt_chunks=($(planChunks 41 false "${array_MRT_sensors[@]}"))
+sensor_chunks=($(planChunks 41 true "${array_MRT_sensors[@]}"))
+
 # Assemble array of MRT sensor names.
 MRTsensor_names="$(awk -f "$common_dir/esp-query/processOutput_getSpaceSeparatedAllMRTsensorNames.awk" "$tmp_dir/query_results.txt")"
 array_MRTsensor_names=($MRTsensor_names)
@@ -472,7 +490,7 @@ fi
 if $do_simulation; then
 
   # Update progress file.
-  echo '3' > "$tmp_dir_tmp/progress.txt"
+  setProgress "$tmp_dir_tmp" 3
 
   # Make sure there is no existing results library or ACC-actions file. 
   # Suppress output in case there isn't to prevent chatter.
@@ -602,7 +620,7 @@ fi
 # *** EXTRACT RESULTS ***
 
 # Update progress file.
-echo '4' > "$tmp_dir/progress.txt"
+setProgress "$tmp_dir" 4
 
 # Run res to get occupied hours.
 if ! [ "X$up_one" == "X" ]; then
@@ -847,42 +865,42 @@ $tmp_dir_tmp/early_winter_opt
 "
     first_season=false
   fi
-  first=true
-  num_cols=0
-  for i1 in "${array_zones_with_MRTsensors[@]}"; do
-    i0=$((i1-1))
-    if [ "$number_zones" -gt 1 ]; then
+  ichunk=0
+  for chunk in "${opt_chunks[@]}"; do
+    if [ "$ichunk" -gt 0 ]; then
       res_script="$res_script
+!
+>
+>
+b
+${tmp_dir_tmp}/early_winter_opt_${ichunk}
+
+"
+    fi
+    for i1 in $(chunkZones "$chunk"); do
+      i0=$((i1-1))
+      if [ "$number_zones" -gt 1 ]; then
+        res_script="$res_script
 4
 <
 1
 $i1"
-    fi
-    res_script="$res_script
+      fi
+      res_script="$res_script
 b
 m
 -"
-    res_script="$res_script
+      res_script="$res_script
 *
 -"
-    if [ "${array_CFD_domains[i0]}" -lt 2 ]; then
-      res_script="$res_script
+      if [ "${array_CFD_domains[i0]}" -lt 2 ]; then
+        res_script="$res_script
 y"
-    fi
-    ((num_cols+=array_MRT_sensors[i0]))
-    if [ "$num_cols" -eq 41 ]; then
-      ((num_extra_opt_files++))
-      res_script="$res_script
-!
->
->
-b
-${tmp_dir_tmp}/early_winter_opt_${num_extra_opt_files}
-
-"
-      num_cols=0
-    fi
+      fi
+    done
+    ((ichunk++))
   done
+  num_extra_opt_files="$((ichunk-1))"
   res_script="$res_script
 !
 >
@@ -962,42 +980,42 @@ b
 $tmp_dir_tmp/spring_opt
 
 "
-  first=true
-  num_cols=0
-  for i1 in "${array_zones_with_MRTsensors[@]}"; do
-    i0=$((i1-1))
-    if [ "$number_zones" -gt 1 ]; then
+  ichunk=0
+  for chunk in "${opt_chunks[@]}"; do
+    if [ "$ichunk" -gt 0 ]; then
       res_script="$res_script
+!
+>
+>
+b
+${tmp_dir_tmp}/spring_opt_${ichunk}
+
+"
+    fi
+    for i1 in $(chunkZones "$chunk"); do
+      i0=$((i1-1))
+      if [ "$number_zones" -gt 1 ]; then
+        res_script="$res_script
 4
 <
 1
 $i1"
-    fi
-    res_script="$res_script
+      fi
+      res_script="$res_script
 b
 m
 -"
-    res_script="$res_script
+      res_script="$res_script
 *
 -"
-    if [ "${array_CFD_domains[i0]}" -lt 2 ]; then
-      res_script="$res_script
+      if [ "${array_CFD_domains[i0]}" -lt 2 ]; then
+        res_script="$res_script
 y"
-    fi
-    ((num_cols+=array_MRT_sensors[i0]))
-    if [ "$num_cols" -eq 41 ]; then
-      ((num_extra_opt_files++))
-      res_script="$res_script
-!
->
->
-b
-${tmp_dir_tmp}/spring_opt_${num_extra_opt_files}
-
-"
-      num_cols=0
-    fi
+      fi
+    done
+    ((ichunk++))
   done
+  num_extra_opt_files="$((ichunk-1))"
   res_script="$res_script
 !
 >
@@ -1077,42 +1095,42 @@ b
 $tmp_dir_tmp/summer_opt
 
 "
-  first=true
-  num_cols=0
-  for i1 in "${array_zones_with_MRTsensors[@]}"; do
-    i0=$((i1-1))
-    if [ "$number_zones" -gt 1 ]; then
+  ichunk=0
+  for chunk in "${opt_chunks[@]}"; do
+    if [ "$ichunk" -gt 0 ]; then
       res_script="$res_script
+!
+>
+>
+b
+${tmp_dir_tmp}/summer_opt_${ichunk}
+
+"
+    fi
+    for i1 in $(chunkZones "$chunk"); do
+      i0=$((i1-1))
+      if [ "$number_zones" -gt 1 ]; then
+        res_script="$res_script
 4
 <
 1
 $i1"
-    fi
-    res_script="$res_script
+      fi
+      res_script="$res_script
 b
 m
 -"
-    res_script="$res_script
+      res_script="$res_script
 *
 -"
-    if [ "${array_CFD_domains[i0]}" -lt 2 ]; then
-      res_script="$res_script
+      if [ "${array_CFD_domains[i0]}" -lt 2 ]; then
+        res_script="$res_script
 y"
-    fi
-    ((num_cols+=array_MRT_sensors[i0]))
-    if [ "$num_cols" -eq 41 ]; then
-      ((num_extra_opt_files++))
-      res_script="$res_script
-!
->
->
-b
-${tmp_dir_tmp}/summer_opt_${num_extra_opt_files}
-
-"
-      num_cols=0
-    fi
+      fi
+    done
+    ((ichunk++))
   done
+  num_extra_opt_files="$((ichunk-1))"
   res_script="$res_script
 !
 >
@@ -1193,42 +1211,42 @@ b
 $tmp_dir_tmp/autumn_opt
 
 "
-  first=true
-  num_cols=0
-  for i1 in "${array_zones_with_MRTsensors[@]}"; do
-    i0=$((i1-1))
-    if [ "$number_zones" -gt 1 ]; then
+  ichunk=0
+  for chunk in "${opt_chunks[@]}"; do
+    if [ "$ichunk" -gt 0 ]; then
       res_script="$res_script
+!
+>
+>
+b
+${tmp_dir_tmp}/autumn_opt_${ichunk}
+
+"
+    fi
+    for i1 in $(chunkZones "$chunk"); do
+      i0=$((i1-1))
+      if [ "$number_zones" -gt 1 ]; then
+        res_script="$res_script
 4
 <
 1
 $i1"
-    fi
-    res_script="$res_script
+      fi
+      res_script="$res_script
 b
 m
 -"
-    res_script="$res_script
+      res_script="$res_script
 *
 -"
-    if [ "${array_CFD_domains[i0]}" -lt 2 ]; then
-      res_script="$res_script
+      if [ "${array_CFD_domains[i0]}" -lt 2 ]; then
+        res_script="$res_script
 y"
-    fi
-    ((num_cols+=array_MRT_sensors[i0]))
-    if [ "$num_cols" -eq 41 ]; then
-      ((num_extra_opt_files++))
-      res_script="$res_script
-!
->
->
-b
-${tmp_dir_tmp}/autumn_opt_${num_extra_opt_files}
-
-"
-      num_cols=0
-    fi
+      fi
+    done
+    ((ichunk++))
   done
+  num_extra_opt_files="$((ichunk-1))"
   res_script="$res_script
 !
 >
@@ -1310,42 +1328,42 @@ b
 ${tmp_dir_tmp}/late_winter_opt
 
 "
-  first=true
-  num_cols=0
-  for i1 in "${array_zones_with_MRTsensors[@]}"; do
-    i0=$((i1-1))
-    if [ "$number_zones" -gt 1 ]; then
+  ichunk=0
+  for chunk in "${opt_chunks[@]}"; do
+    if [ "$ichunk" -gt 0 ]; then
       res_script="$res_script
+!
+>
+>
+b
+${tmp_dir_tmp}/late_winter_opt_${ichunk}
+
+"
+    fi
+    for i1 in $(chunkZones "$chunk"); do
+      i0=$((i1-1))
+      if [ "$number_zones" -gt 1 ]; then
+        res_script="$res_script
 4
 <
 1
 $i1"
-    fi
-    res_script="$res_script
+      fi
+      res_script="$res_script
 b
 m
 -"
-    res_script="$res_script
+      res_script="$res_script
 *
 -"
-    if [ "${array_CFD_domains[i0]}" -lt 2 ]; then
-      res_script="$res_script
-y"
-    fi
-    ((num_cols+=array_MRT_sensors[i0]))
-    if [ "$num_cols" -eq 41 ]; then
-        ((num_extra_opt_files++))
+      if [ "${array_CFD_domains[i0]}" -lt 2 ]; then
         res_script="$res_script
-!
->
->
-b
-${tmp_dir_tmp}/late_winter_opt_${num_extra_opt_files}
-
-"
-      num_cols=0
-    fi
+y"
+      fi
+    done
+    ((ichunk++))
   done
+  num_extra_opt_files="$((ichunk-1))"
   res_script="$res_script
 !
 >
@@ -1516,101 +1534,22 @@ $tmp_dir_tmp/ceiling_discomfort
 "
 if [ "$number_zones_with_MRTsensors" -gt 1 ]; then
   if [ "$number_MRT_sensors" -gt 41 ]; then
-    num_sensors_left="$number_MRT_sensors"
-    num_zones_left="$number_zones"
-    cur_zone=1
-    num_zones_tmp=0
-    num_sensors_from_previous=0
-    while [ "$num_sensors_left" -gt 41 ]; do
-      first=true
-      num_cols_left=41
-      s=""
-      if [ "$num_sensors_from_previous" -gt 0 ]; then
-        already_done_zone=true
-      else
-        already_done_zone=false
-      fi
-      while [ "$num_cols_left" -gt 0 ]; do
-        zon_num_sensors="${array_MRT_sensors[cur_zone-1]}"
-        num_sensors_tmp="$((zon_num_sensors-num_sensors_from_previous))"
-        if [ "$num_sensors_tmp" -le "$num_cols_left" ]; then
-          ((num_zones_tmp++))
-          if $first; then
-            ((num_cols_left-=num_sensors_tmp))
-            first=false
-          else
-            ((num_cols_left-=zon_num_sensors))
-          fi
-          s="$s
-$((cur_zone))"
-          ((cur_zone++))
-        else
-          if $first; then
-            ((i_st+=41))
-            ((num_sensors_from_previous+=41))
-            first=false
-          else
-            i_st=$((1+num_sensors_from_previous))
-            num_sensors_from_previous=$((num_cols_left))
-          fi
-          i_end=$((i_st+40))
-          ((num_zones_tmp++))
-          num_cols_left=0
-          s="$s
-$((cur_zone))"
-        fi
-      done
-      ((num_extra_ceiling_files++))
-      res_script="$res_script
-4
-<
-$num_zones_tmp$s"
-      res_script="$res_script
-c
-f
-<
-41"
-      ii=$i_st
-      while [ "$ii" -le "$i_end" ]; do
+    ichunk=0
+    for chunk in "${sensor_chunks[@]}"; do
+      if [ "$ichunk" -gt 0 ]; then
         res_script="$res_script
-${ii}"
-      done
-      res_script="$res_script
 !
 >
 >
 b
-$tmp_dir_tmp/ceiling_discomfort_$num_extra_ceiling_files
+$tmp_dir_tmp/ceiling_discomfort_$ichunk
 "
-      ((num_zones_left-=num_zones_tmp))
-      if $already_done_zone; then 
-        ((num_zones_left+=1))
       fi
-      ((num_sensors_left-=41))
-    done
-    res_script="$res_script
-4
-<
-$num_zones_left"
-    i="$cur_zone"
-    while [ "$i" -le "$number_zones" ]; do
       res_script="$res_script
-${i}"
-      ((i++))
-    done
-    res_script="$res_script
-c
-f
-<
-${num_sensors_left}"
-    i=0
-    ii="$((num_sensors_from_previous+1))"
-    while [ "$i" -lt "$num_sensors_left" ]; do
-      res_script="$res_script
-${ii}"
-      ((i++))
-      ((ii++))
+$(resSelectChunk "$chunk" "$number_zones" c f)"
+      ((ichunk++))
     done
+    num_extra_ceiling_files="$((ichunk-1))"
   else
     res_script="$res_script
 4
@@ -1830,102 +1769,22 @@ $tmp_dir_tmp/vertdT_discomfort
 "
   if [ "$number_zones" -gt 1 ]; then
     if [ "$number_MRT_sensors" -gt 41 ]; then
-      num_sensors_left="$number_MRT_sensors"
-      num_zones_left="$number_zones"
-      cur_zone=1
-      num_zones_tmp=0
-      num_sensors_from_previous=0
-      while [ "$num_sensors_left" -gt 41 ]; do
-        first=true
-        num_cols_left=41
-        s=""
-        if [ "$num_sensors_from_previous" -gt 0 ]; then
-          already_done_zone=true
-        else
-          already_done_zone=false
-        fi
-        while [ "$num_cols_left" -gt 0 ]; do
-          zon_num_sensors="${array_MRT_sensors[cur_zone-1]}"
-          num_sensors_tmp="$((zon_num_sensors-num_sensors_from_previous))"
-          if [ "$num_sensors_tmp" -le "$num_cols_left" ]; then
-            ((num_zones_tmp++))
-            if $first; then
-              ((num_cols_left-=num_sensors_tmp))
-              first=false
-            else
-              ((num_cols_left-=zon_num_sensors))
-            fi
-            s="$s
-$((cur_zone))"
-            ((cur_zone++))
-          else
-            if $first; then
-              ((i_st+=41))
-              ((num_sensors_from_previous+=41))
-              first=false
-            else
-              i_st=$((1+num_sensors_from_previous))
-              num_sensors_from_previous=$((num_cols_left))
-            fi
-            i_end=$((i_st+40))
-            ((num_zones_tmp++))
-            num_cols_left=0
-            s="$s
-$((cur_zone))"
-          fi
-        done
-        ((num_extra_vertdT_files++))
-        res_script="$res_script
-4
-<
-$num_zones_tmp$s"
-        res_script="$res_script
-c
-d
-<
-41"
-        ii=$i_st
-        while [ "$ii" -le "$i_end" ]; do
+      ichunk=0
+      for chunk in "${sensor_chunks[@]}"; do
+        if [ "$ichunk" -gt 0 ]; then
           res_script="$res_script
-${ii}"
-        done
-        res_script="$res_script
 !
 >
 >
 b
-$tmp_dir_tmp/vertdT_discomfort_$num_extra_vertdT_files
+$tmp_dir_tmp/vertdT_discomfort_$ichunk
 "
-        ((num_zones_left-=num_zones_tmp))
-        if $already_done_zone; then 
-          ((num_zones_left+=1))
         fi
-        ((num_sensors_left-=41))
-      done
-      res_script="$res_script
-4
-<
-$num_zones_left"
-      i="$cur_zone"
-      while [ "$i" -le "$number_zones" ]; do
         res_script="$res_script
-${i}"
-        ((i++))
+$(resSelectChunk "$chunk" "$number_zones" c d)"
+        ((ichunk++))
       done
-      res_script="$res_script
-c
-d
-<
-${num_sensors_left}"
-      i=0
-      ii="$((num_sensors_from_previous+1))"
-      while [ "$i" -lt "$num_sensors_left" ]; do
-        res_script="$res_script
-${ii}"
-        ((i++))
-        ((ii++))
-      done
-
+      num_extra_vertdT_files="$((ichunk-1))"
     else
       res_script="$res_script
 4
@@ -1993,102 +1852,22 @@ $tmp_dir_tmp/draught_discomfort
 "
   if [ "$number_zones" -gt 1 ]; then
     if [ "$number_MRT_sensors" -gt 41 ]; then
-      num_sensors_left="$number_MRT_sensors"
-      num_zones_left="$number_zones"
-      cur_zone=1
-      num_zones_tmp=0
-      num_sensors_from_previous=0
-      while [ "$num_sensors_left" -gt 41 ]; do
-        first=true
-        num_cols_left=41
-        s=""
-        if [ "$num_sensors_from_previous" -gt 0 ]; then
-          already_done_zone=true
-        else
-          already_done_zone=false
-        fi
-        while [ "$num_cols_left" -gt 0 ]; do
-          zon_num_sensors="${array_MRT_sensors[cur_zone-1]}"
-          num_sensors_tmp="$((zon_num_sensors-num_sensors_from_previous))"
-          if [ "$num_sensors_tmp" -le "$num_cols_left" ]; then
-            ((num_zones_tmp++))
-            if $first; then
-              ((num_cols_left-=num_sensors_tmp))
-              first=false
-            else
-              ((num_cols_left-=zon_num_sensors))
-            fi
-            s="$s
-$((cur_zone))"
-            ((cur_zone++))
-          else
-            if $first; then
-              ((i_st+=41))
-              ((num_sensors_from_previous+=41))
-              first=false
-            else
-              i_st=$((1+num_sensors_from_previous))
-              num_sensors_from_previous=$((num_cols_left))
-            fi
-            i_end=$((i_st+40))
-            ((num_zones_tmp++))
-            num_cols_left=0
-            s="$s
-$((cur_zone))"
-          fi
-        done
-        ((num_extra_draught_files++))
-        res_script="$res_script
-4
-<
-$num_zones_tmp$s"
-        res_script="$res_script
-c
-h
-<
-41"
-        ii=$i_st
-        while [ "$ii" -le "$i_end" ]; do
+      ichunk=0
+      for chunk in "${sensor_chunks[@]}"; do
+        if [ "$ichunk" -gt 0 ]; then
           res_script="$res_script
-${ii}"
-        done
-        res_script="$res_script
 !
 >
 >
 b
-$tmp_dir_tmp/draught_discomfort_$num_extra_draught_files
+$tmp_dir_tmp/draught_discomfort_$ichunk
 "
-        ((num_zones_left-=num_zones_tmp))
-        if $already_done_zone; then 
-          ((num_zones_left+=1))
         fi
-        ((num_sensors_left-=41))
-      done
-      res_script="$res_script
-4
-<
-$num_zones_left"
-      i="$cur_zone"
-      while [ "$i" -le "$number_zones" ]; do
         res_script="$res_script
-${i}"
-        ((i++))
+$(resSelectChunk "$chunk" "$number_zones" c h)"
+        ((ichunk++))
       done
-      res_script="$res_script
-c
-h
-<
-${num_sensors_left}"
-      i=0
-      ii="$((num_sensors_from_previous+1))"
-      while [ "$i" -lt "$num_sensors_left" ]; do
-        res_script="$res_script
-${ii}"
-        ((i++))
-        ((ii++))
-      done
-
+      num_extra_draught_files="$((ichunk-1))"
     else
       res_script="$res_script
 4
@@ -2177,23 +1956,23 @@ echo "$x" > "$tmp_dir_tmp/all_opt_summary"
 # Combine op temp results if needed.
 if [ "$num_extra_opt_files" -gt 0 ]; then  
   if "$early_winter"; then
-    x="$(awk -f "$script_dir/combine_columnData.awk" $tmp_dir_tmp/early_winter_opt*)"
+    x="$(awk -f "$script_dir/combine_columnData.awk" $(chunkFiles "$tmp_dir_tmp/early_winter_opt" "$((num_extra_opt_files+1))"))"
     echo "$x" > "$tmp_dir_tmp/early_winter_opt"
   fi
   if "$spring"; then
-    x="$(awk -f "$script_dir/combine_columnData.awk" $tmp_dir_tmp/spring_opt*)"
+    x="$(awk -f "$script_dir/combine_columnData.awk" $(chunkFiles "$tmp_dir_tmp/spring_opt" "$((num_extra_opt_files+1))"))"
     echo "$x" > "$tmp_dir_tmp/spring_opt"
   fi
   if "$summer"; then
-    x="$(awk -f "$script_dir/combine_columnData.awk" $tmp_dir_tmp/summer_opt*)"
+    x="$(awk -f "$script_dir/combine_columnData.awk" $(chunkFiles "$tmp_dir_tmp/summer_opt" "$((num_extra_opt_files+1))"))"
     echo "$x" > "$tmp_dir_tmp/summer_opt"
   fi
   if "$autumn"; then
-    x="$(awk -f "$script_dir/combine_columnData.awk" $tmp_dir_tmp/autumn_opt*)"
+    x="$(awk -f "$script_dir/combine_columnData.awk" $(chunkFiles "$tmp_dir_tmp/autumn_opt" "$((num_extra_opt_files+1))"))"
     echo "$x" > "$tmp_dir_tmp/autumn_opt"
   fi
   if "$late_winter"; then
-    x="$(awk -f "$script_dir/combine_columnData.awk" $tmp_dir_tmp/late_winter_opt*)"
+    x="$(awk -f "$script_dir/combine_columnData.awk" $(chunkFiles "$tmp_dir_tmp/late_winter_opt" "$((num_extra_opt_files+1))"))"
     echo "$x" > "$tmp_dir_tmp/late_winter_opt"
   fi
 fi
@@ -2214,7 +1993,7 @@ echo "$x" > "$tmp_dir_tmp/ceiling_summary"
 
 # Combine ceiling discomfort results if needed.
 if [ "$num_extra_ceiling_files" -gt 0 ]; then
-  x="$(awk -f "$script_dir/combine_columnData.awk" $tmp_dir_tmp/ceiling_discomfort*)"
+  x="$(awk -f "$script_dir/combine_columnData.awk" $(chunkFiles "$tmp_dir_tmp/ceiling_discomfort" "$((num_extra_ceiling_files+1))"))"
   echo "$x" > "$tmp_dir_tmp/ceiling_discomfort"
 fi
 
@@ -2236,7 +2015,7 @@ if $is_CFDandMRT; then
 
 # Combine vertdT discomfort results if needed.
   if [ "$num_extra_vertdT_files" -gt 0 ]; then
-    x="$(awk -f "$script_dir/combine_columnData.awk" $tmp_dir_tmp/vertdT_discomfort*)"
+    x="$(awk -f "$script_dir/combine_columnData.awk" $(chunkFiles "$tmp_dir_tmp/vertdT_discomfort" "$((num_extra_vertdT_files+1))"))"
     echo "$x" > "$tmp_dir_tmp/vertdT_discomfort"
   fi
 
@@ -2246,7 +2025,7 @@ if $is_CFDandMRT; then
 
 # Combine draught discomfort results if needed.
   if [ "$num_extra_draught_files" -gt 0 ]; then
-    x="$(awk -f "$script_dir/combine_columnData.awk" $tmp_dir_tmp/draught_discomfort*)"
+    x="$(awk -f "$script_dir/combine_columnData.awk" $(chunkFiles "$tmp_dir_tmp/draught_discomfort" "$((num_extra_draught_files+1))"))"
     echo "$x" > "$tmp_dir_tmp/draught_discomfort"
   fi
 fi
@@ -2301,7 +2080,7 @@ fi
 # *** POST PROCESSING ***
 
 # Update progress file.
-echo '5' > "$tmp_dir/progress.txt"
+setProgress "$tmp_dir" 5
 
 # Define function to convert "day month" string to julian day.
 function DM2JD {
@@ -2388,9 +2167,10 @@ DM2JD "$AF"
 AF_JD="$julianDay"
 
 # Calculate deviation of op temp from comfort criteria.
-deviation_opt=''
+deviation_opt_files=''
 if "$early_winter"; then
-  deviation_opt="$deviation_opt $(awk -v criteriaU="$opt_criteria_max_win" -v criteriaL="$opt_criteria_min_win" -f "$script_dir/get_deviation_upAndLow.awk" "$tmp_dir/early_winter_opt")"
+  "$common_dir/res-analysis/res-analysis.py" deviation -u "$opt_criteria_max_win" -l "$opt_criteria_min_win" -o "$tmp_dir/early_winter_opt.dev" "$tmp_dir/early_winter_opt"
+  deviation_opt_files="$deviation_opt_files $tmp_dir/early_winter_opt.dev"
   midpoint_win="$(echo "$opt_criteria_max_win $opt_criteria_min_win" | awk '{print(($1+$2)/2.0)}')"
 fi
 if "$spring"; then
@@ -2398,9 +2178,6 @@ if "$spring"; then
 # We assume comfort criteria varies linearly between winter and summer limits through transition seasons.
 # So, we need to calculate upper and lower limits for the period that we're running for.
   if [ "$simS_JD" -le "$SpS_JD" ] && [ "$simF_JD" -ge "$SpF_JD" ]; then
-    nhead=4
-    i="$(awk 'END{print NR}' "$tmp_dir/spring_opt")"
-    ndata="$((i-nhead))"
     criteriaUS="$opt_criteria_max_win"
     criteriaLS="$opt_criteria_min_win"
     criteriaUF="$opt_criteria_max_sum"
@@ -2429,21 +2206,20 @@ if "$spring"; then
     fi
   fi
 
-  deviation_opt="$deviation_opt $(awk -v criteriaUS="$criteriaUS" -v criteriaLS="$criteriaLS" -v criteriaUF="$criteriaUF" -v criteriaLF="$criteriaLF" -v nhead="$nhead" -v ndata="$ndata" -f "$script_dir/get_deviation_upAndLow_linear.awk" "$tmp_dir/spring_opt")"
+  "$common_dir/res-analysis/res-analysis.py" deviation -u "$criteriaUS" -l "$criteriaLS" -U "$criteriaUF" -L "$criteriaLF" -o "$tmp_dir/spring_opt.dev" "$tmp_dir/spring_opt"
+  deviation_opt_files="$deviation_opt_files $tmp_dir/spring_opt.dev"
   midpointS_spr="$(echo "$criteriaUS $criteriaLS" | awk '{print(($1+$2)/2.0)}')"
   midpointF_spr="$(echo "$criteriaUF $criteriaLF" | awk '{print(($1+$2)/2.0)}')"
 fi
 if "$summer"; then
-  deviation_opt="$deviation_opt $(awk -v criteriaU="$opt_criteria_max_sum" -v criteriaL="$opt_criteria_min_sum" -f "$script_dir/get_deviation_upAndLow.awk" "$tmp_dir/summer_opt")"
+  "$common_dir/res-analysis/res-analysis.py" deviation -u "$opt_criteria_max_sum" -l "$opt_criteria_min_sum" -o "$tmp_dir/summer_opt.dev" "$tmp_dir/summer_opt"
+  deviation_opt_files="$deviation_opt_files $tmp_dir/summer_opt.dev"
   midpoint_sum="$(echo "$opt_criteria_max_sum $opt_criteria_min_sum" | awk '{print(($1+$2)/2.0)}')"
 fi
 if "$autumn"; then
 
 # See comments for spring above.
   if [ "$simS_JD" -le "$AS_JD" ] && [ "$simF_JD" -ge "$AF_JD" ]; then
-    nhead=4
-    i="$(awk 'END{print NR}' "$tmp_dir/autumn_opt")"
-    ndata="$((i-nhead))"
     criteriaUS="$opt_criteria_max_sum"
     criteriaLS="$opt_criteria_min_sum"
     criteriaUF="$opt_criteria_max_win"
@@ -2471,33 +2247,22 @@ if "$autumn"; then
       criteriaLF="$opt_criteria_min_win"
     fi
   fi
-  deviation_opt="$deviation_opt $(awk -v criteriaUS="$criteriaUS" -v criteriaLS="$criteriaLS" -v criteriaUF="$criteriaUF" -v criteriaLF="$criteriaLF" -v nhead="$nhead" -v ndata="$ndata" -f "$script_dir/get_deviation_upAndLow_linear.awk" "$tmp_dir/autumn_opt")"
+  "$common_dir/res-analysis/res-analysis.py" deviation -u "$criteriaUS" -l "$criteriaLS" -U "$criteriaUF" -L "$criteriaLF" -o "$tmp_dir/autumn_opt.dev" "$tmp_dir/autumn_opt"
+  deviation_opt_files="$deviation_opt_files $tmp_dir/autumn_opt.dev"
   midpointS_aut="$(echo "$criteriaUS $criteriaLS" | awk '{print(($1+$2)/2.0)}')"
   midpointF_aut="$(echo "$criteriaUF $criteriaLF" | awk '{print(($1+$2)/2.0)}')"
 fi
 if "$late_winter"; then
-  deviation_opt="$deviation_opt $(awk -v criteriaU="$opt_criteria_max_win" -v criteriaL="$opt_criteria_min_win" -f "$script_dir/get_deviation_upAndLow.awk" "$tmp_dir/late_winter_opt")"
+  "$common_dir/res-analysis/res-analysis.py" deviation -u "$opt_criteria_max_win" -l "$opt_criteria_min_win" -o "$tmp_dir/late_winter_opt.dev" "$tmp_dir/late_winter_opt"
+  deviation_opt_files="$deviation_opt_files $tmp_dir/late_winter_opt.dev"
   midpoint_win="$(echo "$opt_criteria_max_win $opt_criteria_min_win" | awk '{print(($1+$2)/2.0)}')"
 fi
 
-echo "$deviation_opt" > "$tmp_dir/deviation_opt.trace"
-
-# Deviation for other comfort metrics.
-deviation_floor="$(awk -v criteria="$floor_criteria" -f "$script_dir/get_deviation.awk" "$tmp_dir/floor_discomfort")"
-echo "$deviation_floor" > "$tmp_dir/deviation_floor.trace"
-deviation_ceiling="$(awk -v criteria="$asym_criteria" -f "$script_dir/get_deviation.awk" "$tmp_dir/ceiling_discomfort")"
-echo "$deviation_ceiling" > "$tmp_dir/deviation_ceiling.trace"
-deviation_wall="$(awk -v criteria="$asym_criteria" -f "$script_dir/get_deviation.awk" "$tmp_dir/wall_discomfort")"
-echo "$deviation_wall" > "$tmp_dir/deviation_wall.trace"
-if $is_CFDandMRT; then
-  deviation_vertdT="$(awk -v criteria="$vertdT_criteria" -f "$script_dir/get_deviation.awk" "$tmp_dir/vertdT_discomfort")"
-  echo "$deviation_vertdT" > "$tmp_dir/deviation_vertdT.trace"
-  deviation_draught="$(awk -v criteria="$draught_criteria" -f "$script_dir/get_deviation.awk" "$tmp_dir/draught_discomfort")"
-  echo "$deviation_draught" > "$tmp_dir/deviation_draught.trace"
-fi
+cat $deviation_opt_files > "$tmp_dir/deviation_opt.trace"
 
-# Find percentage of occupied time in discomfort (PTD).
-PTD_opt="$(echo "$deviation_opt" | awk -f "$script_dir/get_percentTimeDiscomfort.awk")"
+# Find percentage of occupied time in discomfort (PTD), and severity ratings.
+# Deviation, PTD and severity for the other comfort metrics are found below.
+eval "$("$common_dir/res-analysis/res-analysis.py" discomfort -d -n opt $deviation_opt_files)"
 array_PTD_opt=($PTD_opt)
 
 # Simulation period in days.
@@ -2556,13 +2321,12 @@ if [ "$simPeriod_days" -gt 1 ]; then
   deviation_optDDWD="$(awk -v criteria="$DMopt_daily_drift_criteria" -f "$script_dir/get_deviation_dailyTemperatureDrift_withDay.awk" "$tmp_dir/DMoptWO")"
   echo "$deviation_optDD" > "$tmp_dir/deviation_optDD.trace"
   echo "$deviation_optDDWD" > "$tmp_dir/deviation_optDDWD.trace"
-  PTD_optDD="$(echo "$deviation_optDD" | awk -f "$script_dir/get_percentTimeDiscomfort.awk")"
+  eval "$("$common_dir/res-analysis/res-analysis.py" discomfort -d -n optDD "$tmp_dir/deviation_optDD.trace")"
   echo "$PTD_optDD" > "$tmp_dir/PTD_optDD.trace"
   array_PTD_optDD=($PTD_optDD)
-  severity_optDD="$(echo "$PTD_optDD" | awk -f "$script_dir/get_severityRating.awk")"
   echo "$severity_optDD" > "$tmp_dir/severity_optDD.trace"
   array_severity_optDD=($severity_optDD)
-  DWD_optDD="$(echo "$deviation_optDDWD" | awk -f "$script_dir/get_dayWorstDiscomfort.awk")"
+  DWD_optDD="$("$common_dir/res-analysis/res-analysis.py" worst --day "$tmp_dir/deviation_optDDWD.trace")"
   echo "$DWD_optDD" > "$tmp_dir/DWD_optDD.trace"
   array_DWD_optDD=($DWD_optDD)
 
@@ -2572,13 +2336,12 @@ if [ "$simPeriod_days" -gt 1 ]; then
     echo "$deviation_optWD" > "$tmp_dir/deviation_optWD.trace"
     deviation_optWDWD="$(awk -v criteria="$DMopt_weekly_drift_criteria" -f "$script_dir/get_deviation_weeklyTemperatureDrift_withDay.awk" "$tmp_dir/DMoptWO")"
     echo "$deviation_optWDWD" > "$tmp_dir/deviation_optWDWD.trace"
-    PTD_optWD="$(echo "$deviation_optWD" | awk -f "$script_dir/get_percentTimeDiscomfort.awk")"
+    eval "$("$common_dir/res-analysis/res-analysis.py" discomfort -d -n optWD "$tmp_dir/deviation_optWD.trace")"
     echo "$PTD_optWD" > "$tmp_dir/PTD_optWD.trace"
     array_PTD_optWD=($PTD_optWD)
-    severity_optWD="$(echo "$PTD_optWD" | awk -f "$script_dir/get_severityRating.awk")"
     echo "$severity_optWD" > "$tmp_dir/severity_optWD.trace"
     array_severity_optWD=($severity_optWD)
-    DWD_optWD="$(echo "$deviation_optWDWD" | awk -f "$script_dir/get_dayWorstDiscomfort.awk")"
+    DWD_optWD="$("$common_dir/res-analysis/res-analysis.py" worst --day "$tmp_dir/deviation_optWDWD.trace")"
     echo "$DWD_optWD" > "$tmp_dir/DWD_optWD.trace"
     array_DWD_optWD=($DWD_optWD)
   fi
@@ -2593,7 +2356,7 @@ fi
 #   ((i++))
 # done
 
-# Assemble comma seperated list of number of floor surfaces for each zone, for awk call below.
+# Assemble comma seperated list of number of floor surfaces for each zone, for res-analysis call below.
 first=true
 for a in "${array_num_floor_surfaces[@]}"; do
   if $first; then
@@ -2604,17 +2367,19 @@ for a in "${array_num_floor_surfaces[@]}"; do
   fi
 done
 
-# Percentage time in discomfort for other metrics.
-PTD_floor="$(echo "$deviation_floor" | awk -v ncols="$num_floorCols" -f "$script_dir/get_variableMulticolumnPercentTimeDiscomfort.awk")"
+# Deviation, percentage time in discomfort and severity ratings for other
+# metrics. A time step is in discomfort for a zone if any of its floor
+# surfaces is, and for a sensor if any of its 4 walls is.
+eval "$("$common_dir/res-analysis/res-analysis.py" discomfort -c "$floor_criteria" -g "$num_floorCols" -t "$tmp_dir/deviation_floor.trace" -n floor "$tmp_dir/floor_discomfort")"
 array_PTD_floor=($PTD_floor)
-PTD_ceiling="$(echo "$deviation_ceiling" | awk -f "$script_dir/get_percentTimeDiscomfort.awk")"
+eval "$("$common_dir/res-analysis/res-analysis.py" discomfort -c "$asym_criteria" -t "$tmp_dir/deviation_ceiling.trace" -n ceiling "$tmp_dir/ceiling_discomfort")"
 array_PTD_ceiling=($PTD_ceiling)
-PTD_wall="$(echo "$deviation_wall" | awk -v ncols=4 -f "$script_dir/get_multicolumnPercentTimeDiscomfort.awk")"
+eval "$("$common_dir/res-analysis/res-analysis.py" discomfort -c "$asym_criteria" -g 4 -t "$tmp_dir/deviation_wall.trace" -n wall "$tmp_dir/wall_discomfort")"
 array_PTD_wall=($PTD_wall)
 if $is_CFDandMRT; then
-  PTD_vertdT="$(echo "$deviation_vertdT" | awk -f "$script_dir/get_percentTimeDiscomfort.awk")"
+  eval "$("$common_dir/res-analysis/res-analysis.py" discomfort -c "$vertdT_criteria" -t "$tmp_dir/deviation_vertdT.trace" -n vertdT "$tmp_dir/vertdT_discomfort")"
   array_PTD_vertdT=($PTD_vertdT)
-  PTD_draught="$(echo "$deviation_draught" | awk -f "$script_dir/get_percentTimeDiscomfort.awk")"
+  eval "$("$common_dir/res-analysis/res-analysis.py" discomfort -c "$draught_criteria" -t "$tmp_dir/deviation_draught.trace" -n draught "$tmp_dir/draught_discomfort")"
   array_PTD_draught=($PTD_draught)
 fi
 
@@ -2625,19 +2390,13 @@ echo "${array_PTD_wall[@]}" > "$tmp_dir/PTD_wall.trace"
 echo "${array_PTD_vertdT[@]}" > "$tmp_dir/PTD_vertdT.trace"
 echo "${array_PTD_draught[@]}" > "$tmp_dir/PTD_draught.trace"
 
-# Calculate severity ratings.
-severity_opt="$(echo "$PTD_opt" | awk -f "$script_dir/get_severityRating.awk")"
+# Severity ratings.
 array_severity_opt=($severity_opt)
-severity_floor="$(echo "$PTD_floor" | awk -v ncols="$num_floorCols" -f "$script_dir/get_severityRating.awk")"
 array_severity_floor=($severity_floor)
-severity_ceiling="$(echo "$PTD_ceiling" | awk -f "$script_dir/get_severityRating.awk")"
 array_severity_ceiling=($severity_ceiling)
-severity_wall="$(echo "$PTD_wall" | awk -f "$script_dir/get_severityRating.awk")"
 array_severity_wall=($severity_wall)
 if $is_CFDandMRT; then
-  severity_vertdT="$(echo "$PTD_vertdT" | awk -f "$script_dir/get_severityRating.awk")"
   array_severity_vertdT=($severity_vertdT)
-  severity_draught="$(echo "$PTD_draught" | awk -f "$script_dir/get_severityRating.awk")"
   array_severity_draught=($severity_draught)
 fi
 
@@ -2753,14 +2512,7 @@ if "$do_detailed_report"; then
     for i0_sen in "${array_sensor_indices[@]}"; do
       if [ "${array_severity_opt[i0_sen]}" -gt 0 ]; then
         i1_sen="$((i0_sen+1))"
-        i=1
-        output="$(awk -v zone="$i1_sen" -v recursion="$i" -f "$script_dir/get_singleZoneAllRecursive.awk" $opt_awk_input)"
-        while [ ! "X$output" == "X" ]; do
-          echo "$output" > "$tmp_dir/sen$i0_sen-opt-$i"
-          ((i++))    
-          output="$(awk -v zone="$i1_sen" -v recursion="$i" -f "$script_dir/get_singleZoneAllRecursive.awk" $opt_awk_input)"
-        done
-        array_num_opt_plotFiles[i0_sen]="$((i-1))"
+        array_num_opt_plotFiles[i0_sen]="$("$common_dir/res-analysis/res-analysis.py" runs -c "$i1_sen" -o "$tmp_dir/sen$i0_sen-opt-" $opt_awk_input)"
       else
         array_num_opt_plotFiles[i0_sen]=0
       fi
@@ -2801,14 +2553,7 @@ if "$do_detailed_report"; then
     for i0_sen in "${array_sensor_indices[@]}"; do
       if [ "${array_severity_ceiling[i0_sen]}" -gt 0 ]; then
         i1_sen="$((i0_sen+1))"
-        i=1
-        output="$(awk -v zone="$i1_sen" -v recursion="$i" -f "$script_dir/get_singleZoneAllRecursive.awk" "$tmp_dir/ceiling_discomfort")"
-        while [ ! "X$output" == "X" ]; do
-          echo "$output" > "$tmp_dir/sen$i0_sen-ceil-$i"
-          ((i++))    
-          output="$(awk -v zone="$i1_sen" -v recursion="$i" -f "$script_dir/get_singleZoneAllRecursive.awk" "$tmp_dir/ceiling_discomfort")"
-        done
-        array_num_ceil_plotFiles[i0_sen]="$((i-1))"
+        array_num_ceil_plotFiles[i0_sen]="$("$common_dir/res-analysis/res-analysis.py" runs -c "$i1_sen" -o "$tmp_dir/sen$i0_sen-ceil-" "$tmp_dir/ceiling_discomfort")"
       else
         array_num_ceil_plotFiles[i0_sen]=0
       fi
@@ -2850,14 +2595,7 @@ if "$do_detailed_report"; then
       for i0_sen in "${array_sensor_indices[@]}"; do
         if [ "${array_severity_vertdT[i0_sen]}" -gt 0 ]; then
           i1_sen="$((i0_sen+1))"
-          i=1
-          output="$(awk -v zone="$i1_sen" -v recursion="$i" -f "$script_dir/get_singleZoneAllRecursive.awk" $tmp_dir/vertdT_discomfort)"
-          while [ ! "X$output" == "X" ]; do
-            echo "$output" > "$tmp_dir/sen$i0_sen-vertdT-$i"
-            ((i++))    
-            output="$(awk -v zone="$i1_sen" -v recursion="$i" -f "$script_dir/get_singleZoneAllRecursive.awk" $tmp_dir/vertdT_discomfort)"
-          done
-          array_num_vertdT_plotFiles[i0_sen]="$((i-1))"
+          array_num_vertdT_plotFiles[i0_sen]="$("$common_dir/res-analysis/res-analysis.py" runs -c "$i1_sen" -o "$tmp_dir/sen$i0_sen-vertdT-" $tmp_dir/vertdT_discomfort)"
         else
           array_num_vertdT_plotFiles[i0_sen]=0
         fi
@@ -2869,14 +2607,7 @@ if "$do_detailed_report"; then
       for i0_sen in "${array_sensor_indices[@]}"; do
         if [ "${array_severity_draught[i0_sen]}" -gt 0 ]; then
           i1_sen="$((i0_sen+1))"
-          i=1
-          output="$(awk -v zone="$i1_sen" -v recursion="$i" -f "$script_dir/get_singleZoneAllRecursive.awk" $tmp_dir/draught_discomfort)"
-          while [ ! "X$output" == "X" ]; do
-            echo "$output" > "$tmp_dir/sen$i0_sen-draught-$i"
-            ((i++))    
-            output="$(awk -v zone="$i1_sen" -v recursion="$i" -f "$script_dir/get_singleZoneAllRecursive.awk" $tmp_dir/draught_discomfort)"
-          done
-          array_num_draught_plotFiles[i0_sen]="$((i-1))"
+          array_num_draught_plotFiles[i0_sen]="$("$common_dir/res-analysis/res-analysis.py" runs -c "$i1_sen" -o "$tmp_dir/sen$i0_sen-draught-" $tmp_dir/draught_discomfort)"
         else
           array_num_draught_plotFiles[i0_sen]=0
         fi
@@ -2896,14 +2627,7 @@ if "$do_detailed_report"; then
     for i0_sen in "${array_sensor_indices[@]}"; do
       if [ "${array_severity_optDD[i0_sen]}" -gt 0 ] || [ "${array_severity_optWD[i0_sen]}" -gt 0 ]; then
         i1_sen="$((i0_sen+1))"
-        i=1
-        output="$(awk -v zone="$i1_sen" -v recursion="$i" -f "$script_dir/get_singleZoneAllRecursive.awk" $DMopt_awk_input)"
-        while [ ! "X$output" == "X" ]; do
-          echo "$output" > "$tmp_dir/sen$i0_sen-DMopt-$i"
-          ((i++))    
-          output="$(awk -v zone="$i1_sen" -v recursion="$i" -f "$script_dir/get_singleZoneAllRecursive.awk" $DMopt_awk_input)"
-        done
-        array_num_DMopt_plotFiles[i0_sen]="$((i-1))"
+        array_num_DMopt_plotFiles[i0_sen]="$("$common_dir/res-analysis/res-analysis.py" runs -c "$i1_sen" -o "$tmp_dir/sen$i0_sen-DMopt-" $DMopt_awk_input)"
 
         # Also create coordinates for highlighting where comfort was violated.
         i3_col="$((i0_sen+3))"
@@ -2935,171 +2659,124 @@ if "$do_detailed_report"; then
 fi
 
 # Update progress file.
-echo '6' > "$tmp_dir/progress.txt"    
+setProgress "$tmp_dir" 6
 
 
 
 # *** Write JSON file ***
 
-echo '{' > "$JSON"
+json_records=""
 
 # If there is any discomfort, write directives.
 if [ "$performance_flag" -gt 0 ]; then
-  echo "  \"thermal discomfort\": [" >> "$JSON"
-  first2=true
   i1_floor=0
   i0_zone=-1
   for i0_sensor in "${array_sensor_indices[@]}"; do
     if [ "${array_sensor_severity[i0_sensor]}" -gt 0 ]; then
       ((count++))
-      if $first2; then
-        first2=false
-      else
-        echo "," >> "$JSON"
-      fi
-      echo '    {' >> "$JSON"
       i1_floor="$i0_zone"
       i0_zone="$((array_sensor_zones[i0_sensor]-1))"
       i1_zone="$((i0_zone+1))"
       if [ "$i0_zone" -gt "$iz0prev" ]; then ((i1_floor++)); fi
       zone_name=${array_zone_names[i0_zone]}
-      echo "      \"area\": \"$zone_name\"," >> "$JSON"
+      json_records="$json_records
+thermal discomfort/+/area=$zone_name"
       sensor_name="${array_MRTsensor_names[i0_sensor]}"
-      echo "      \"location\": \"$sensor_name\"," >> "$JSON"
-      first=true    
+      json_records="$json_records
+thermal discomfort/-/location=$sensor_name"
       if [ "${array_severity_opt[i0_sensor]}" -gt 0 ]; then
-        if $first; then
-          first=false
-        else
-          echo "," >> "$JSON"
-        fi
-        echo "      \"operative temperature\": {" >> "$JSON"
-        echo "        \"frequency of occurrence (%)\": \"${array_PTD_opt[i0_sensor]}\"," >> "$JSON"
+        json_records="$json_records
+thermal discomfort/-/operative temperature/frequency of occurrence (%)=${array_PTD_opt[i0_sensor]}"
         x="$(awk -v zoneName=$zone_name -v sensorName=$sensor_name -f "$script_dir/get_sensorStats.awk" "$tmp_dir/all_opt_summary")"
         a=($x)
         s="${a[0]}/${a[1]}/$year @ ${a[2]}"
-        echo "        \"worst time\": \"$s\"" >> "$JSON"
-        printf "      }" >> "$JSON"
+        json_records="$json_records
+thermal discomfort/-/operative temperature/worst time=$s"
       fi
       if [ "${array_severity_floor[i0_zone]}" -gt 0 ]; then
-        if $first; then
-          first=false
-        else
-          echo "," >> "$JSON"
-        fi
-        echo "      \"floor temperature\": {" >> "$JSON"
-        echo "        \"frequency of occurrence (%)\": \"${array_PTD_floor[i0_zone]}\"," >> "$JSON"
+        json_records="$json_records
+thermal discomfort/-/floor temperature/frequency of occurrence (%)=${array_PTD_floor[i0_zone]}"
         x="$(awk -v entryNum="$i1_zone" -f "$script_dir/get_sensorStats.awk" "$tmp_dir/floor_summary")"
         a=($x)
         s="${a[0]}/${a[1]}/$year @ ${a[2]}"
-        echo "        \"worst time\": \"$s\"" >> "$JSON"
-        printf "      }" >> "$JSON"
+        json_records="$json_records
+thermal discomfort/-/floor temperature/worst time=$s"
       fi
       if [ "${array_severity_ceiling[i0_sensor]}" -gt 0 ]; then
-        if $first; then
-          first=false
-        else
-          echo "," >> "$JSON"
-        fi
-        echo "      \"radiant asymmetry (ceiling)\": {" >> "$JSON"
-        echo "        \"frequency of occurrence (%)\": \"${array_PTD_ceiling[i0_sensor]}\"," >> "$JSON"
+        json_records="$json_records
+thermal discomfort/-/radiant asymmetry (ceiling)/frequency of occurrence (%)=${array_PTD_ceiling[i0_sensor]}"
         x="$(awk -v zoneName=$zone_name -v sensorName=$sensor_name -f "$script_dir/get_sensorStats.awk" "$tmp_dir/ceiling_summary")"
         a=($x)
         s="${a[0]}/${a[1]}/$year @ ${a[2]}"
-        echo "        \"worst time\": \"$s\"" >> "$JSON"
-        printf "      }" >> "$JSON"
+        json_records="$json_records
+thermal discomfort/-/radiant asymmetry (ceiling)/worst time=$s"
       fi
       if [ "${array_severity_wall[i0_sensor]}" -gt 0 ]; then
-        if $first; then
-          first=false
-        else
-          echo "," >> "$JSON"
-        fi
-        echo "      \"radiant asymmetry (wall)\": {" >> "$JSON"
-        echo "        \"frequency of occurrence (%)\": \"${array_PTD_wall[i0_sensor]}\"," >> "$JSON"
+        json_records="$json_records
+thermal discomfort/-/radiant asymmetry (wall)/frequency of occurrence (%)=${array_PTD_wall[i0_sensor]}"
         x="$(awk -v zoneName=$zone_name -v sensorName=$sensor_name -f "$script_dir/get_sensorStats.awk" "$tmp_dir/wall_summary")"
         a=($x)
         s="${a[0]}/${a[1]}/$year @ ${a[2]}"
-        echo "        \"worst time\": \"$s\"" >> "$JSON"
-        printf "      }" >> "$JSON"
+        json_records="$json_records
+thermal discomfort/-/radiant asymmetry (wall)/worst time=$s"
       fi
       if $is_CFDandMRT; then
         if [ "${array_severity_draught[i0_sensor]}" -gt 0 ]; then
-          if $first; then
-            first=false
-          else
-            echo "," >> "$JSON"
-          fi
-          echo "      \"draught\": {" >> "$JSON"
-          echo "        \"frequency of occurrence (%)\": \"${array_PTD_draught[i0_sensor]}\"," >> "$JSON"
+          json_records="$json_records
+thermal discomfort/-/draught/frequency of occurrence (%)=${array_PTD_draught[i0_sensor]}"
           x="$(awk -v zoneName=$zone_name -v sensorName=$sensor_name -f "$script_dir/get_sensorStats.awk" "$tmp_dir/draught_summary")"
           a=($x)
           s="${a[0]}/${a[1]}/$year @ ${a[2]}"
-          echo "        \"worst time\": \"$s\"" >> "$JSON"
-          printf "      }" >> "$JSON"
+          json_records="$json_records
+thermal discomfort/-/draught/worst time=$s"
         fi
         if [ "${array_severity_vertdT[i0_sensor]}" -gt 0 ]; then
-          if $first; then
-            first=false
-          else
-            echo "," >> "$JSON"
-          fi
-          echo "      \"vertical air temperature difference\": {" >> "$JSON"
-          echo "        \"frequency of occurrence (%)\": \"${array_PTD_vertdT[i0_sensor]}\"," >> "$JSON"
+          json_records="$json_records
+thermal discomfort/-/vertical air temperature difference/frequency of occurrence (%)=${array_PTD_vertdT[i0_sensor]}"
           x="$(awk -v zoneName=$zone_name -v sensorName=$sensor_name -f "$script_dir/get_sensorStats.awk" "$tmp_dir/vertdT_summary")"
           a=($x)
           s="${a[0]}/${a[1]}/$year @ ${a[2]}"
-          echo "        \"worst time\": \"$s\"" >> "$JSON"
-          printf "      }" >> "$JSON"
+          json_records="$json_records
+thermal discomfort/-/vertical air temperature difference/worst time=$s"
         fi
       fi
       if [ "$simPeriod_days" -gt 1 ]; then
         if [ "${array_severity_optDD[i0_sensor]}" -gt 0 ]; then
-          if $first; then
-            first=false
-          else
-            echo "," >> "$JSON"
-          fi
-          echo "      \"daily temperature drift\": {" >> "$JSON"
-          echo "        \"frequency of occurrence (%)\": \"${array_PTD_optDD[i0_sensor]}\"," >> "$JSON"
+          json_records="$json_records
+thermal discomfort/-/daily temperature drift/frequency of occurrence (%)=${array_PTD_optDD[i0_sensor]}"
           JD2DM "$((array_DWD_optDD[i0_sensor]-1))"
           s="${dayMonth% *}/${dayMonth#* }/${year}"
           JD2DM "${array_DWD_optDD[i0_sensor]}"
           s2="$s - ${dayMonth% *}/${dayMonth#* }/${year}"
-          echo "        \"worst time\": \"$s2\"" >> "$JSON"
-          printf "      }" >> "$JSON"
+          json_records="$json_records
+thermal discomfort/-/daily temperature drift/worst time=$s2"
         fi
       fi
       if [ "$simPeriod_days" -ge 7 ]; then
         if [ "${array_severity_optWD[i0_sensor]}" -gt 0 ]; then
-          if $first; then
-            first=false
-          else
-            echo "," >> "$JSON"
-          fi
-          echo "      \"weekly temperature drift\": {" >> "$JSON"
-          echo "        \"frequency of occurrence (%)\": \"${array_PTD_optWD[i0_sensor]}\"," >> "$JSON"
+          json_records="$json_records
+thermal discomfort/-/weekly temperature drift/frequency of occurrence (%)=${array_PTD_optWD[i0_sensor]}"
           JD2DM "$((array_DWD_optWD[i0_sensor]-6))"
           s="${dayMonth% *}/${dayMonth#* }/${year}"
           JD2DM "${array_DWD_optWD[i0_sensor]}"
           s2="$s - ${dayMonth% *}/${dayMonth#* }/${year}"
-          echo "        \"worst time\": \"$s2\"" >> "$JSON"
-          printf "      }" >> "$JSON"
+          json_records="$json_records
+thermal discomfort/-/weekly temperature drift/worst time=$s2"
         fi
       fi
-      echo '' >> "$JSON"
-      printf '    }' >> "$JSON"
     fi
   done
-  echo '' >> "$JSON"
-  echo '  ],' >> "$JSON"
 fi
-echo '  "report": "",' >> "$JSON"
-echo '  "results libraries": ""' >> "$JSON"
-echo '}' >> "$JSON"
+json_records="$json_records
+report=
+results libraries="
+
+"$common_dir/json-report/json-report.py" -o "$JSON" <<~
+${json_records}
+~
 
 # Check json file exists.
-if ! [ -f "$JSON" ]; then
+if [ "$?" -ne 0 ] || ! [ -f "$JSON" ]; then
   echo "Error: failed to write json output." >&2
   exit 110
 fi
@@ -3107,7 +2784,7 @@ fi
 
 
 # Update progress file.
-echo '8' > "$tmp_dir/progress.txt"
+setProgress "$tmp_dir" 8
 
 # *** Write report - latex ***
 echo '\nonstopmode' > "$report"
@@ -34,6 +34,9 @@ do_detailed_report=false
 script_dir="$(dirname "$(readlink -f "$0")")"
 common_dir="$script_dir/../../common"
 
+# Progress reporting.
+source "$common_dir/progress.sh"
+
 # Parse command line.
 while getopts ":hvf:p:t:s:d:r:R:j:c:P:U" opt; do
   case "$opt" in
@@ -212,7 +215,7 @@ if [ ! -d "$tmp_dir" ]; then
 fi
 
 # Create progress file.
-echo '2' > "$tmp_dir/progress.txt"
+setProgress "$tmp_dir" 2
 
 # ESP-r seems to have problems if locations have a dot in
 # front of them; check for this and remove it.
@@ -223,6 +226,11 @@ if [ "${tmp_dir:0:2}" == "./" ] && ! [ "$tmp_dir" == "./" ]; then
   tmp_dir="${tmp_dir:2}"
 fi
 
+# res-analysis parses each exported table only once, and keeps the arrays
+# here for later calls.
+export RESANALYSIS_CACHE_DIR="$(readlink -f "$tmp_dir")/res-analysis"
+mkdir -p "$RESANALYSIS_CACHE_DIR"
+
 # Currently, res asks a question if the cfg file is not in the directory from
 # which it is called. Unless this is accounted for, it will break
 # scripted results recovery if it happens. We get around this by forcing
@@ -463,7 +471,7 @@ fi
 if $do_simulation; then
 
   # Update progress file.
-  echo '3' > "$tmp_dir_tmp/progress.txt"
+  setProgress "$tmp_dir_tmp" 3
 
   # Make sure there is no existing results library or ACC-actions file. 
   # Suppress output in case there isn't to prevent chatter.
@@ -593,7 +601,7 @@ fi
 # *** EXTRACT RESULTS ***
 
 # Update progress file.
-echo '4' > "$tmp_dir/progress.txt"
+setProgress "$tmp_dir" 4
 
 # Run res to get occupied hours.
 if ! [ "X$up_one" == "X" ]; then
@@ -2288,7 +2296,7 @@ fi
 # *** POST PROCESSING ***
 
 # Update progress file.
-echo '5' > "$tmp_dir/progress.txt"
+setProgress "$tmp_dir" 5
 
 # Define function to convert "day month" string to julian day.
 function DM2JD {
@@ -2598,14 +2606,7 @@ if "$do_detailed_report"; then
     for i0_sen in "${array_sensor_indices[@]}"; do
       if [ "${array_severity_opt[i0_sen]}" -gt 0 ]; then
         i1_sen="$((i0_sen+1))"
-        i=1
-        output="$(awk -v zone="$i1_sen" -v recursion="$i" -f "$script_dir/get_singleZoneAllRecursive.awk" $opt_awk_input)"
-        while [ ! "X$output" == "X" ]; do
-          echo "$output" > "$tmp_dir/sen$i0_sen-opt-$i"
-          ((i++))    
-          output="$(awk -v zone="$i1_sen" -v recursion="$i" -f "$script_dir/get_singleZoneAllRecursive.awk" $opt_awk_input)"
-        done
-        array_num_opt_plotFiles[i0_sen]="$((i-1))"
+        array_num_opt_plotFiles[i0_sen]="$("$common_dir/res-analysis/res-analysis.py" runs -c "$i1_sen" -o "$tmp_dir/sen$i0_sen-opt-" $opt_awk_input)"
       else
         array_num_opt_plotFiles[i0_sen]=0
       fi
@@ -2646,14 +2647,7 @@ if "$do_detailed_report"; then
     for i0_sen in "${array_sensor_indices[@]}"; do
       if [ "${array_severity_ceiling[i0_sen]}" -gt 0 ]; then
         i1_sen="$((i0_sen+1))"
-        i=1
-        output="$(awk -v zone="$i1_sen" -v recursion="$i" -f "$script_dir/get_singleZoneAllRecursive.awk" "$tmp_dir/ceiling_discomfort")"
-        while [ ! "X$output" == "X" ]; do
-          echo "$output" > "$tmp_dir/sen$i0_sen-ceil-$i"
-          ((i++))    
-          output="$(awk -v zone="$i1_sen" -v recursion="$i" -f "$script_dir/get_singleZoneAllRecursive.awk" "$tmp_dir/ceiling_discomfort")"
-        done
-        array_num_ceil_plotFiles[i0_sen]="$((i-1))"
+        array_num_ceil_plotFiles[i0_sen]="$("$common_dir/res-analysis/res-analysis.py" runs -c "$i1_sen" -o "$tmp_dir/sen$i0_sen-ceil-" "$tmp_dir/ceiling_discomfort")"
       else
         array_num_ceil_plotFiles[i0_sen]=0
       fi
@@ -2695,14 +2689,7 @@ if "$do_detailed_report"; then
       for i0_sen in "${array_sensor_indices[@]}"; do
         if [ "${array_severity_vertdT[i0_sen]}" -gt 0 ]; then
           i1_sen="$((i0_sen+1))"
-          i=1
-          output="$(awk -v zone="$i1_sen" -v recursion="$i" -f "$script_dir/get_singleZoneAllRecursive.awk" $tmp_dir/vertdT_discomfort)"
-          while [ ! "X$output" == "X" ]; do
-            echo "$output" > "$tmp_dir/sen$i0_sen-vertdT-$i"
-            ((i++))    
-            output="$(awk -v zone="$i1_sen" -v recursion="$i" -f "$script_dir/get_singleZoneAllRecursive.awk" $tmp_dir/vertdT_discomfort)"
-          done
-          array_num_vertdT_plotFiles[i0_sen]="$((i-1))"
+          array_num_vertdT_plotFiles[i0_sen]="$("$common_dir/res-analysis/res-analysis.py" runs -c "$i1_sen" -o "$tmp_dir/sen$i0_sen-vertdT-" $tmp_dir/vertdT_discomfort)"
         else
           array_num_vertdT_plotFiles[i0_sen]=0
         fi
@@ -2714,14 +2701,7 @@ if "$do_detailed_report"; then
       for i0_sen in "${array_sensor_indices[@]}"; do
         if [ "${array_severity_draught[i0_sen]}" -gt 0 ]; then
           i1_sen="$((i0_sen+1))"
-          i=1
-          output="$(awk -v zone="$i1_sen" -v recursion="$i" -f "$script_dir/get_singleZoneAllRecursive.awk" $tmp_dir/draught_discomfort)"
-          while [ ! "X$output" == "X" ]; do
-            echo "$output" > "$tmp_dir/sen$i0_sen-draught-$i"
-            ((i++))    
-            output="$(awk -v zone="$i1_sen" -v recursion="$i" -f "$script_dir/get_singleZoneAllRecursive.awk" $tmp_dir/draught_discomfort)"
-          done
-          array_num_draught_plotFiles[i0_sen]="$((i-1))"
+          array_num_draught_plotFiles[i0_sen]="$("$common_dir/res-analysis/res-analysis.py" runs -c "$i1_sen" -o "$tmp_dir/sen$i0_sen-draught-" $tmp_dir/draught_discomfort)"
         else
           array_num_draught_plotFiles[i0_sen]=0
         fi
@@ -2731,137 +2711,100 @@ if "$do_detailed_report"; then
 fi
 
 # Update progress file.
-echo '6' > "$tmp_dir/progress.txt"    
+setProgress "$tmp_dir" 6
 
 
 
 # *** Write JSON file ***
 
-echo '{' > "$JSON"
+json_records=""
 
 # If there is any discomfort, write directives.
 if [ "$performance_flag" -gt 0 ]; then
-  echo "  \"thermal discomfort\": [" >> "$JSON"
-  first2=true
   i1_floor=0
   i0_zone=-1
   for i0_sensor in "${array_sensor_indices[@]}"; do
     if [ "${array_sensor_severity[i0_sensor]}" -gt 0 ]; then
       ((count++))
-      if $first2; then
-        first2=false
-      else
-        echo "," >> "$JSON"
-      fi
-      echo '    {' >> "$JSON"
       i1_floor="$i0_zone"
       i0_zone="$((array_sensor_zones[i0_sensor]-1))"
       i1_zone="$((i0_zone+1))"
       if [ "$i0_zone" -gt "$iz0prev" ]; then ((i1_floor++)); fi
       zone_name=${array_zone_names[i0_zone]}
-      echo "      \"area\": \"$zone_name\"," >> "$JSON"
+      json_records="$json_records
+thermal discomfort/+/area=$zone_name"
       sensor_name="${array_MRTsensor_names[i0_sensor]}"
-      echo "      \"location\": \"$sensor_name\"," >> "$JSON"
-      first=true    
+      json_records="$json_records
+thermal discomfort/-/location=$sensor_name"
       if [ "${array_severity_opt[i0_sensor]}" -gt 0 ]; then
-        if $first; then
-          first=false
-        else
-          echo "," >> "$JSON"
-        fi
-        echo "      \"operative temperature\": {" >> "$JSON"
-        echo "        \"frequency of occurrence (%)\": \"${array_PTD_opt[i0_sensor]}\"," >> "$JSON"
+        json_records="$json_records
+thermal discomfort/-/operative temperature/frequency of occurrence (%)=${array_PTD_opt[i0_sensor]}"
         x="$(awk -v zoneName=$zone_name -v sensorName=$sensor_name -f "$script_dir/get_sensorStats.awk" "$tmp_dir/all_opt_summary")"
         a=($x)
         s="${a[0]}/${a[1]}/$year @ ${a[2]}"
-        echo "        \"worst time\": \"$s\"" >> "$JSON"
-        printf "      }" >> "$JSON"
+        json_records="$json_records
+thermal discomfort/-/operative temperature/worst time=$s"
       fi
       if [ "${array_severity_floor[i0_zone]}" -gt 0 ]; then
-        if $first; then
-          first=false
-        else
-          echo "," >> "$JSON"
-        fi
-        echo "      \"floor temperature\": {" >> "$JSON"
-        echo "        \"frequency of occurrence (%)\": \"${array_PTD_floor[i0_zone]}\"," >> "$JSON"
+        json_records="$json_records
+thermal discomfort/-/floor temperature/frequency of occurrence (%)=${array_PTD_floor[i0_zone]}"
         x="$(awk -v entryNum="$i1_zone" -f "$script_dir/get_sensorStats.awk" "$tmp_dir/floor_summary")"
         a=($x)
         s="${a[0]}/${a[1]}/$year @ ${a[2]}"
-        echo "        \"worst time\": \"$s\"" >> "$JSON"
-        printf "      }" >> "$JSON"
+        json_records="$json_records
+thermal discomfort/-/floor temperature/worst time=$s"
       fi
       if [ "${array_severity_ceiling[i0_sensor]}" -gt 0 ]; then
-        if $first; then
-          first=false
-        else
-          echo "," >> "$JSON"
-        fi
-        echo "      \"radiant asymmetry (ceiling)\": {" >> "$JSON"
-        echo "        \"frequency of occurrence (%)\": \"${array_PTD_ceiling[i0_sensor]}\"," >> "$JSON"
+        json_records="$json_records
+thermal discomfort/-/radiant asymmetry (ceiling)/frequency of occurrence (%)=${array_PTD_ceiling[i0_sensor]}"
         x="$(awk -v zoneName=$zone_name -v sensorName=$sensor_name -f "$script_dir/get_sensorStats.awk" "$tmp_dir/ceiling_summary")"
         a=($x)
         s="${a[0]}/${a[1]}/$year @ ${a[2]}"
-        echo "        \"worst time\": \"$s\"" >> "$JSON"
-        printf "      }" >> "$JSON"
+        json_records="$json_records
+thermal discomfort/-/radiant asymmetry (ceiling)/worst time=$s"
       fi
       if [ "${array_severity_wall[i0_sensor]}" -gt 0 ]; then
-        if $first; then
-          first=false
-        else
-          echo "," >> "$JSON"
-        fi
-        echo "      \"radiant asymmetry (wall)\": {" >> "$JSON"
-        echo "        \"frequency of occurrence (%)\": \"${array_PTD_wall[i0_sensor]}\"," >> "$JSON"
+        json_records="$json_records
+thermal discomfort/-/radiant asymmetry (wall)/frequency of occurrence (%)=${array_PTD_wall[i0_sensor]}"
         x="$(awk -v zoneName=$zone_name -v sensorName=$sensor_name -f "$script_dir/get_sensorStats.awk" "$tmp_dir/wall_summary")"
         a=($x)
         s="${a[0]}/${a[1]}/$year @ ${a[2]}"
-        echo "        \"worst time\": \"$s\"" >> "$JSON"
-        printf "      }" >> "$JSON"
+        json_records="$json_records
+thermal discomfort/-/radiant asymmetry (wall)/worst time=$s"
       fi
       if $is_CFDandMRT; then
         if [ "${array_severity_draught[i0_sensor]}" -gt 0 ]; then
-          if $first; then
-            first=false
-          else
-            echo "," >> "$JSON"
-          fi
-          echo "      \"draught\": {" >> "$JSON"
-          echo "        \"frequency of occurrence (%)\": \"${array_PTD_draught[i0_sensor]}\"," >> "$JSON"
+          json_records="$json_records
+thermal discomfort/-/draught/frequency of occurrence (%)=${array_PTD_draught[i0_sensor]}"
           x="$(awk -v zoneName=$zone_name -v sensorName=$sensor_name -f "$script_dir/get_sensorStats.awk" "$tmp_dir/draught_summary")"
           a=($x)
           s="${a[0]}/${a[1]}/$year @ ${a[2]}"
-          echo "        \"worst time\": \"$s\"" >> "$JSON"
-          printf "      }" >> "$JSON"
+          json_records="$json_records
+thermal discomfort/-/draught/worst time=$s"
         fi
         if [ "${array_severity_vertdT[i0_sensor]}" -gt 0 ]; then
-          if $first; then
-            first=false
-          else
-            echo "," >> "$JSON"
-          fi
-          echo "      \"vertical air temperature difference\": {" >> "$JSON"
-          echo "        \"frequency of occurrence (%)\": \"${array_PTD_vertdT[i0_sensor]}\"," >> "$JSON"
+          json_records="$json_records
+thermal discomfort/-/vertical air temperature difference/frequency of occurrence (%)=${array_PTD_vertdT[i0_sensor]}"
           x="$(awk -v zoneName=$zone_name -v sensorName=$sensor_name -f "$script_dir/get_sensorStats.awk" "$tmp_dir/vertdT_summary")"
           a=($x)
           s="${a[0]}/${a[1]}/$year @ ${a[2]}"
-          echo "        \"worst time\": \"$s\"" >> "$JSON"
-          printf "      }" >> "$JSON"
+          json_records="$json_records
+thermal discomfort/-/vertical air temperature difference/worst time=$s"
         fi
       fi
-      echo '' >> "$JSON"
-      printf '    }' >> "$JSON"
     fi
   done
-  echo '' >> "$JSON"
-  echo '  ],' >> "$JSON"
 fi
-echo '  "report": "",' >> "$JSON"
-echo '  "results libraries": ""' >> "$JSON"
-echo '}' >> "$JSON"
+json_records="$json_records
+report=
+results libraries="
+
+"$common_dir/json-report/json-report.py" -o "$JSON" <<~
+${json_records}
+~
 
 # Check json file exists.
-if ! [ -f "$JSON" ]; then
+if [ "$?" -ne 0 ] || ! [ -f "$JSON" ]; then
   echo "Error: failed to write json output." >&2
   exit 110
 fi
@@ -2869,7 +2812,7 @@ fi
 
 
 # Update progress file.
-echo '8' > "$tmp_dir/progress.txt"
+setProgress "$tmp_dir" 8
 
 # *** Write report - latex ***
 echo '\nonstopmode' > "$report"
@@ -34,6 +34,9 @@ do_detailed_report=false
 script_dir="$(dirname "$(readlink -f "$0")")"
 common_dir="$script_dir/../../common"
 
+# Progress reporting.
+source "$common_dir/progress.sh"
+
 # Get current directory.
 current_dir="$PWD"
 
@@ -195,7 +198,7 @@ if [ ! -d "$tmp_dir" ]; then
 fi
 
 # Create progress file.
-echo '2' > "$tmp_dir/progress.txt"
+setProgress "$tmp_dir" 2
 
 # ESP-r seems to have problems if locations have a dot in
 # front of them; check for this and remove it.
@@ -206,6 +209,11 @@ if [ "${tmp_dir:0:2}" == "./" ] && ! [ "$tmp_dir" == "./" ]; then
   tmp_dir="${tmp_dir:2}"
 fi
 
+# res-analysis parses each exported table only once, and keeps the arrays
+# here for later calls.
+export RESANALYSIS_CACHE_DIR="$(readlink -f "$tmp_dir")/res-analysis"
+mkdir -p "$RESANALYSIS_CACHE_DIR"
+
 # Currently, res asks a question if the cfg file is not in the directory from
 # which it is called. Unless this is accounted for, it will break
 # scripted results recovery if it happens. We get around this by forcing
@@ -392,7 +400,7 @@ fi
 if $do_simulation; then
 
   # Update progress file.
-  echo '3' > "$tmp_dir_tmp/progress.txt"
+  setProgress "$tmp_dir_tmp" 3
 
   # Make sure there is no existing results library or ACC-actions file. 
   # Suppress output in case there isn't to prevent chatter.
@@ -497,7 +505,7 @@ fi
 # *** EXTRACT RESULTS ***
 
 # Update progress file.
-echo '4' > "$tmp_dir/progress.txt"
+setProgress "$tmp_dir" 4
 
 # Run res to get occupied hours.
 if ! [ "X$up_one" == "X" ]; then
@@ -604,7 +612,7 @@ fi
 # *** POST PROCESSING ***
 
 # Update progress file.
-echo '5' > "$tmp_dir/progress.txt"
+setProgress "$tmp_dir" 5
 
 # Define function to convert "day month" string to julian day.
 function DM2JD {
@@ -949,7 +957,7 @@ fi
 # done
 
 # Update progress file.
-echo '7' > "$tmp_dir/progress.txt"
+setProgress "$tmp_dir" 7
 
 # Generate array of zone and viewpoint codes for each sensor.
 i0_sensor=0
@@ -1010,14 +1018,7 @@ if "$do_detailed_report"; then
       sensor_name="${array_MRTsensor_names[i0_sensor]}"
       if [ "${array_severity[i0_result]}" -gt 0 ]; then
         i1_result="$((i0_result+1))"
-        i=1
-        output="$(awk -v zone="$i1_result" -v recursion="$i" -f "$script_dir/get_singleZoneAllRecursive.awk" "$tmp_dir/UGR.txt")"
-        while [ ! "X$output" == "X" ]; do
-          echo "$output" > "$tmp_dir/res$i1_result-$i"
-          ((i++))    
-          output="$(awk -v zone="$i1_result" -v recursion="$i" -f "$script_dir/get_singleZoneAllRecursive.awk" "$tmp_dir/UGR.txt")"
-        done
-        array_num_plotFiles[i0_result]="$((i-1))"
+        array_num_plotFiles[i0_result]="$("$common_dir/res-analysis/res-analysis.py" runs -c "$i1_result" -o "$tmp_dir/res$i1_result-" "$tmp_dir/UGR.txt")"
 
         # Also, grab a screenshot of glare sources at the worst time.
         zvcode="${array_sensor_zvcodes[i0_sensor]}"
@@ -1039,18 +1040,16 @@ if "$do_detailed_report"; then
 fi
 
 # Update progress file.
-echo '8' > "$tmp_dir/progress.txt"
+setProgress "$tmp_dir" 8
 
 
 
 # *** Write JSON file ***
 
-echo '{' > "$JSON"
+json_records=""
 
 # If there is any discomfort, write directives.
 if [ "$performance_flag" -gt 0 ]; then
-  echo "  \"visual discomfort\": [" >> "$JSON"
-  first=true
   i0_result=0
   for i0_sensor in "${array_sensor_indices[@]}"; do
     i0_zone="$((array_sensor_zones[i0_sensor]-1))"
@@ -1059,35 +1058,29 @@ if [ "$performance_flag" -gt 0 ]; then
       zone_name="${array_zone_names[i0_zone]}"
       sensor_name="${array_MRTsensor_names[i0_sensor]}"
       if [ "${array_severity[i0_result]}" -gt 0 ]; then          
-        if $first; then
-          first=false
-        else
-          echo "," >> "$JSON"
-        fi
-        echo '    {' >> "$JSON"
-        echo "      \"area\": \"$zone_name\"," >> "$JSON"
-        echo "      \"location\": \"$sensor_name\"," >> "$JSON"
-        echo "      \"glare\": {" >> "$JSON"
-        echo "        \"frequency of occurrence (%)\": \"${array_PTD[i0_result]}\"," >> "$JSON"
         JD="${array_TWD[i0_result]%_*}"
         JD2DM "$JD"
         s="${dayMonth#* }-${dayMonth% *} ${array_TWD[i0_result]#*_}"
-        echo "        \"worst time\": \"$s\"" >> "$JSON"
-        echo "      }" >> "$JSON"
-        printf '    }' >> "$JSON"
+        json_records="$json_records
+visual discomfort/+/area=$zone_name
+visual discomfort/-/location=$sensor_name
+visual discomfort/-/glare/frequency of occurrence (%)=${array_PTD[i0_result]}
+visual discomfort/-/glare/worst time=$s"
       fi
       ((i0_result++))
     fi
   done
-  echo '' >> "$JSON"
-  echo '  ],' >> "$JSON"
 fi
-echo '  "report": "",' >> "$JSON"
-echo '  "results libraries": ""' >> "$JSON"
-echo '}' >> "$JSON"
+json_records="$json_records
+report=
+results libraries="
+
+"$common_dir/json-report/json-report.py" -o "$JSON" <<~
+${json_records}
+~
 
 # Check json file exists.
-if ! [ -f "$JSON" ]; then
+if [ "$?" -ne 0 ] || ! [ -f "$JSON" ]; then
   echo "Error: failed to write json output." >&2
   exit 110
 fi
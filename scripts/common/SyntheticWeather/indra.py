@@ -43,6 +43,7 @@ import wfileio as wf
 
 from petites import setseed
 import resampling as resampling
+import modelstore
 
 # Custom functions to calculate error metrics - not currently used.
 # import losses.
@@ -59,7 +60,8 @@ def indra(train=False, station_code="abc", n_samples=10,
           cc_scenario='rcp85', epoch=None,
           randseed=None, year=0, variant=0,
           arma_params=None,
-          bounds=None):
+          bounds=None, n_jobs=1, model_store=None, model_store_gb=1.0,
+          n_out=None):
 
     # Reassign defaults if incoming list params are None
     # (i.e., nothing passed.)
@@ -122,6 +124,11 @@ def indra(train=False, station_code="abc", n_samples=10,
         # uses the current time, in seconds since some past year, which
         # differs between Unix and Windows. Anyhow, this is saved in the
         # model output in case the results need to be reproduced.
+        # A model trained with a time seed can be reused from the model
+        # store by any run that does not specify a seed either, so the
+        # seed is only part of the store key if it was given; a reused
+        # model keeps the seed it was trained with.
+        store_seed = randseed
         if randseed is None:
             randseed = int(time.time())
 
@@ -129,6 +136,31 @@ def indra(train=False, station_code="abc", n_samples=10,
         # assigned just before.
         setseed(randseed)
 
+        # If this model has been trained before, with the same seed data
+        # and parameters, copy it and its samples from the model store
+        # instead of training it again (see modelstore).
+        store_key = None
+        if (model_store and not climate_change and
+                epoch is None and os.path.isfile(path_file_in)):
+            store_key = modelstore.get_key(
+                path_file_in, file_type, station_code, n_samples,
+                arma_params, bounds, store_seed)
+            store_files = {
+                'model.p': path_model_save, 'syn.p': path_syn_save,
+                'syn.npy': resampling.samples_path(path_syn_save)}
+            key_lock = modelstore.lock_key(model_store, store_key)
+            if modelstore.fetch(model_store, store_key, store_files):
+                key_lock.close()
+                with open(path_model_save, "rb") as open_file:
+                    randseed = pickle.load(open_file)['randseed']
+                csave = dict(n_samples=n_samples, randseed=randseed,
+                             counter=0)
+                pickle.dump(csave, open(path_counter_save, "wb"))
+                print(("I've found the model for station '{0}' in the "
+                       "model store. You can now ask me for samples in "
+                       "folder '{1}'.\r\n").format(station_code, store_path))
+                return
+
         # See accompanying script "wfileio".
         # try:
         if os.path.isfile(path_file_in):
@@ -200,7 +232,7 @@ def indra(train=False, station_code="abc", n_samples=10,
             xy_train, n_samples=n_samples,
             picklepath=path_syn_save,
             arma_params=arma_params,
-            bounds=bounds, cc_data=cc_data)
+            bounds=bounds, cc_data=cc_data, n_jobs=n_jobs)
 
         # The non-seasonal order of the model. This exists in both
         # ARIMA and SARIMAX models, so it has to exist in the output
@@ -239,6 +271,12 @@ def indra(train=False, station_code="abc", n_samples=10,
         # with open(path_counter_save, "wb") as open_file:
         pickle.dump(csave, open(path_counter_save, "wb"))
 
+        # Add the model to the model store for later runs.
+        if store_key is not None:
+            modelstore.publish(model_store, store_key, store_files,
+                               model_store_gb)
+            key_lock.close()
+
         print(("I've saved the model for station '{0}'. "
                "You can now ask me for samples in folder '{1}'."
                "\r\n").format(station_code, store_path))
@@ -259,24 +297,34 @@ def indra(train=False, station_code="abc", n_samples=10,
         csave = pickle.load(open(path_counter_save, 'rb'))
 
         if climate_change:
-            sample = resampling.sampler(
-                picklepath=path_syn_save, year=year, n=variant)
+            samples = [resampling.sampler(
+                picklepath=path_syn_save, year=year, n=variant)]
 
         else:
-            # Sample number has not exceeded number of samples.
-            if csave['counter'] < csave['n_samples']:
-                sample = resampling.sampler(
-                    picklepath=path_syn_save, counter=csave['counter'])
-                csave['counter'] += 1
-                pickle.dump(csave, open(path_counter_save, "wb"))
-            else:
-                print('You are asking me for more samples than I have.' +
-                      'You generated {:d} '.format(csave['n_samples']) +
-                      'samples, I have given you ' +
-                      '{:d} samples.'.format(csave['counter']))
-                print('Next call will restart from the first sample.')
-                csave['counter'] = 0
-                pickle.dump(csave, open(path_counter_save, "wb"))
+            # Load the samples once, then hand out the next n_out of
+            # them (or just the next one if n_out is None), as if indra
+            # had been called n_out times.
+            xout = resampling.SampleSet.load(path_syn_save)
+            samples = list()
+
+            for _ in range(0, 1 if n_out is None else n_out):
+                # Sample number has not exceeded number of samples.
+                if csave['counter'] < csave['n_samples']:
+                    samples.append(resampling.sampler(
+                        picklepath=xout, counter=csave['counter']))
+                    csave['counter'] += 1
+                else:
+                    print('You are asking me for more samples than I have.' +
+                          'You generated {:d} '.format(csave['n_samples']) +
+                          'samples, I have given you ' +
+                          '{:d} samples.'.format(csave['counter']))
+                    print('Next call will restart from the first sample.')
+                    csave['counter'] = 0
+                    break
+
+            pickle.dump(csave, open(path_counter_save, "wb"))
+
+            if len(samples) == 0:
                 return
 
         if os.path.isdir(path_file_in):
@@ -291,10 +339,18 @@ def indra(train=False, station_code="abc", n_samples=10,
         _, locdata, header = wf.get_weather(
             station_code, list_wfiles[0], file_type)
 
-        # Save / write-out synthetic time series.
-        wf.give_weather(sample, locdata, station_code, header,
+        # Save / write-out synthetic time series, all in one call. If n_out
+        # was given, number them from 1 before the file extension.
+        if n_out is None:
+            paths_sample_out = [path_file_out]
+        else:
+            paths_sample_out = [
+                "{0}_{2:d}{1}".format(*os.path.splitext(path_file_out),
+                                      sidx+1)
+                for sidx in range(0, len(samples))]
+        wf.give_weather(samples, locdata, station_code, header,
                         file_type=file_type,
-                        path_file_out=path_file_out,
+                        path_file_out=paths_sample_out,
                         masterfile=list_wfiles[0])
 
 
@@ -318,6 +374,13 @@ PARSER.add_argument("--station_code", type=str, default="abc",
                     " of the saved model.")
 PARSER.add_argument("--n_samples", type=int, default=10,
                     help="How many samples do you want out?")
+PARSER.add_argument("--n_out", type=int, default=None,
+                    help=("How many samples do you want written, in "
+                          "sampling mode? If given, they are numbered "
+                          "from 1 before the extension of path_file_out, "
+                          "e.g. wf_out_1.a, wf_out_2.a. This is faster "
+                          "than calling me once for each. By default, "
+                          "one sample is written to path_file_out."))
 PARSER.add_argument("--path_file_in", type=str, help="Path to a weather " +
                     "file (seed file).", default="wf_in.a")
 PARSER.add_argument("--path_file_out", type=str, help="Path to where the " +
@@ -365,6 +428,29 @@ PARSER.add_argument("--arma_params", type=str, default="[2,2,1,1,24]",
                           "don't worry. The default is 2,2,1,1,24. "
                           "The default frequency of Indra is hours, so "
                           "seasonality should be declared in hours."))
+PARSER.add_argument("--n_jobs", type=int,
+                    default=int(os.environ.get("MARATHON_JOB_CPUS", "1")),
+                    help=("Number of worker processes used to fit the "
+                          "SARMA models when training; 0 uses one per "
+                          "available CPU. The default is taken from the "
+                          "environment variable MARATHON_JOB_CPUS (this "
+                          "job's share of the CPUs); if that is not set, "
+                          "it is 1. The same model is selected whatever "
+                          "the number."))
+PARSER.add_argument("--model_store", type=str,
+                    default=os.environ.get("INDRA_MODEL_STORE"),
+                    help=("Path to a folder where trained models are kept "
+                          "and shared between runs. If a model has been "
+                          "trained before from the same seed file with the "
+                          "same parameters, it is reused instead of being "
+                          "trained again. The default is taken from the "
+                          "environment variable INDRA_MODEL_STORE; if that "
+                          "is not set, no store is used."))
+PARSER.add_argument("--model_store_gb", type=float,
+                    default=float(os.environ.get("INDRA_MODEL_STORE_GB",
+                                                 "1")),
+                    help=("Size limit of the model store in GB. The least "
+                          "recently used models are removed beyond this."))
 PARSER.add_argument("--bounds", type=str, default="[1,99]",
                     help=("Lower and upper bound percentile values to "
                           "use for cleaning the synthetic data. Input "
@@ -390,6 +476,10 @@ randseed = ARGS.randseed
 arma_params = [int(x.strip("[").strip("]"))
                for x in ARGS.arma_params.split(",")]
 bounds = [float(x.strip("[").strip("]")) for x in ARGS.bounds.split(",")]
+n_jobs = ARGS.n_jobs
+model_store = ARGS.model_store
+model_store_gb = ARGS.model_store_gb
+n_out = ARGS.n_out
 
 if ARGS.epochs is None and climate_change:
     epochs = [2051, 2060]
@@ -418,4 +508,8 @@ if __name__ == "__main__":
           path_cc_file=path_cc_file,
           randseed=randseed,
           arma_params=arma_params,
-          bounds=bounds)
+          bounds=bounds,
+          n_jobs=n_jobs,
+          model_store=model_store,
+          model_store_gb=model_store_gb,
+          n_out=n_out)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared store of trained indra models.
+
+Training (the Fourier fits and the SARMA model search) gives the same
+result every time for the same seed weather file, parameters and random
+seed, so trained models are kept in a store shared by all runs on this
+machine. Runs that give no random seed share one entry for each seed
+weather file and set of parameters, as any trained model is as good as
+another for them. Each entry in the store is a directory named by the key
+computed in get_key, holding the trained model ("model.p"), the synthetic
+samples generated with it ("syn.p" and its sample data "syn.npy"), and the
+size of the entry in bytes ("size").
+The modification time of an entry is updated whenever it is used, and the
+least recently used entries are removed when the store grows too large.
+
+Concurrent runs are handled with file locks. The store lock (".lock") is
+held shared while an entry is copied out, and exclusively while entries are
+added or removed. A key lock ("<key>.lock") is held while a model is
+trained for that key, so that runs needing the same model wait for the
+first one to finish training instead of training it again.
+"""
+
+import os
+import re
+import fcntl
+import shutil
+import hashlib
+from glob import glob
+
+# Change this if the contents of model.p or syn.p change, so that old
+# entries are no longer used.
+STORE_VERSION = "4"
+
+
+def get_key(path_file_in, file_type, station_code, n_samples, arma_params,
+            bounds, randseed):
+    '''Key of the store entry for training from seed weather file
+    path_file_in with these parameters. The file is keyed by its contents,
+    not its name. randseed is None if no random seed was given, so that
+    runs without one share the same entry.'''
+
+    md5 = hashlib.md5()
+    with open(path_file_in, 'rb') as open_file:
+        for chunk in iter(lambda: open_file.read(1024**2), b''):
+            md5.update(chunk)
+    md5.update(repr((STORE_VERSION, file_type, station_code, n_samples,
+                     list(arma_params), list(bounds), randseed)).encode())
+
+    return md5.hexdigest()
+
+
+def lock_store(store, exclusive):
+    '''Lock the store, exclusively or shared. Returns the lock file; close
+    it to release the lock.'''
+
+    os.makedirs(store, exist_ok=True)
+    lock_file = open(os.path.join(store, '.lock'), 'a')
+    fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+    return lock_file
+
+
+def lock_key(store, key):
+    '''Lock one key of the store exclusively, waiting for any run that is
+    training the same model. Returns the lock file; close it to release
+    the lock (this also happens if the run exits).'''
+
+    os.makedirs(store, exist_ok=True)
+    lock_file = open(os.path.join(store, key + '.lock'), 'a')
+    fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+    return lock_file
+
+
+def fetch(store, key, files):
+    '''Copy the files of entry key, if the entry exists. files is a
+    dictionary of the paths to copy each file in the entry to, by name
+    ("model.p", ...). Returns True if they were copied.'''
+
+    entry = os.path.join(store, key)
+    lock_file = lock_store(store, False)
+
+    try:
+        if not os.path.isdir(entry):
+            return False
+        for name in files:
+            shutil.copyfile(os.path.join(entry, name), files[name])
+        os.utime(entry)
+    except OSError:
+        return False
+    finally:
+        lock_file.close()
+
+    return True
+
+
+def publish(store, key, files, max_gb):
+    '''Add files (a dictionary of the paths of the files, by their names
+    in the entry, as in fetch) to the store as entry key, then evict the
+    least recently used entries until the store is no larger than max_gb
+    GB. The entry is assembled under a temporary name and renamed into
+    place, so that other runs never see a partial entry. Failures are
+    ignored, as the store is only an optimisation.'''
+
+    entry = os.path.join(store, key)
+    entry_tmp = entry + '.part' + str(os.getpid())
+
+    try:
+        if os.path.isdir(entry_tmp):
+            shutil.rmtree(entry_tmp)
+        os.makedirs(entry_tmp)
+        for name in files:
+            shutil.copyfile(files[name], os.path.join(entry_tmp, name))
+        size = sum(os.path.getsize(os.path.join(entry_tmp, x))
+                   for x in files)
+        with open(os.path.join(entry_tmp, 'size'), 'w') as open_file:
+            open_file.write(str(size) + '\n')
+    except OSError:
+        shutil.rmtree(entry_tmp, ignore_errors=True)
+        return
+
+    lock_file = lock_store(store, True)
+
+    try:
+        if os.path.isdir(entry):
+            # Another run got there first.
+            shutil.rmtree(entry_tmp, ignore_errors=True)
+        else:
+            os.rename(entry_tmp, entry)
+        evict(store, max_gb)
+    except OSError:
+        pass
+    finally:
+        lock_file.close()
+
+
+def evict(store, max_gb):
+    '''Remove the least recently used entries from the store until it is
+    no larger than max_gb GB. The store must be locked exclusively.'''
+
+    entries = list()
+
+    for entry in glob(os.path.join(store, '*')):
+        if not re.fullmatch('[0-9a-f]{32}', os.path.basename(entry)):
+            continue
+        try:
+            with open(os.path.join(entry, 'size'), 'r') as open_file:
+                size = int(open_file.readline().strip())
+        except (OSError, ValueError):
+            size = 0
+        entries.append((os.stat(entry).st_mtime, size, entry))
+
+    entries.sort(reverse=True)
+
+    total = 0
+    for _, size, entry in entries:
+        total += size
+        if total > max_gb * 1024**3:
+            shutil.rmtree(entry, ignore_errors=True)
@@ -32,40 +32,77 @@ def setseed(randseed):
 # ----------- END setseed function. -----------
 
 
-def quantilecleaner(datain, xy_train, var, bounds=None):
+def interp_nans(data):
+    '''Replace the NaNs in each column of 2-D array data by linear
+       interpolation between the valid values either side, or by the
+       nearest valid value at the ends of the column (as pandas interpolate
+       followed by bfill and ffill). Columns with no valid values are left
+       as they are. Changes data in place and returns it.'''
+
+    positions = np.arange(data.shape[0])
+
+    for col in range(0, data.shape[1]):
+        nans = np.isnan(data[:, col])
+        if nans.any() and not nans.all():
+            data[nans, col] = np.interp(
+                positions[nans], positions[~nans], data[~nans, col])
+
+    return data
+
+# ----------- END interp_nans function. -----------
+
+
+def monthly_quantiles(xy_train, var, bounds=None):
+    '''Lower and upper quantiles (percentiles bounds) of variable var in
+       each month of the training data xy_train, as a 12 x 2 array. Compute
+       these once for each training set and pass them to quantilecleaner.'''
+
+    if bounds is None:
+        bounds = [0.01, 99.9]
+
+    months = xy_train.index.month
+    values = xy_train[var].values
+
+    return np.asarray([np.percentile(values[months == this_month], bounds)
+                       for this_month in range(1, 13)])
+
+# ----------- END monthly_quantiles function. -----------
+
+
+def quantilecleaner(datain, xy_train, var, bounds=None, quantiles=None,
+                    months=None):
     '''Generic cleaner based on quantiles. Needs a time series / dataset
        and cut-off quantiles. Also needs the name of the variable (var) in
        the incoming dataframe. This function will censor the data outside
        those quantiles and interpolate the missing values using linear
-       interpolation.'''
+       interpolation.
 
-    if bounds is None:
-        bounds = [0.01, 99.9]
+       datain may also be a 2-D array with one column for each sample, in
+       which case months gives the month of each row. The monthly quantiles
+       are calculated from xy_train, var and bounds (see monthly_quantiles)
+       unless they are passed in quantiles.'''
 
-    dataout = pd.DataFrame(datain)
+    if quantiles is None:
+        quantiles = monthly_quantiles(xy_train, var, bounds)
 
-    for this_month in range(1, 13):
+    if months is None:
+        months = datain.index.month
 
-        idx_this_month_rec = xy_train.index.month == this_month
-        idx_this_month_syn = datain.index.month == this_month
+    dataout = np.array(datain, dtype=float)
+    if dataout.ndim == 1:
+        dataout = dataout[:, np.newaxis]
 
-        rec_quantiles = np.percentile(
-            xy_train[var].iloc[idx_this_month_rec], bounds)
+    # Bounds of each row, from the month it is in.
+    months = np.asarray(months) - 1
+    lower = quantiles[months, 0][:, np.newaxis]
+    upper = quantiles[months, 1][:, np.newaxis]
 
-        # import ipdb; ipdb.set_trace()
+    dataout[np.logical_or(dataout < lower, dataout > upper)] = np.NaN
 
-        dataout = dataout.mask(
-            np.logical_and(
-                idx_this_month_syn,
-                np.squeeze(np.logical_or(dataout < rec_quantiles[0],
-                                         dataout > rec_quantiles[1]))),
-            other=np.NaN)
+    dataout = interp_nans(dataout)
 
-        dataout = dataout.interpolate(
-            method='linear').fillna(method='bfill').fillna(method='ffill')
-
-    # Pass back values with only one dimension.
-    return np.squeeze(dataout.values)
+    # Pass back values with only one dimension if there is only one sample.
+    return np.squeeze(dataout)
 
 # ----------- END quantilecleaner function. -----------
 
@@ -96,39 +133,35 @@ def rhcleaner(rh):
 
     '''RH values cannot be more than 100 or less than 0.'''
 
-    rhout = pd.DataFrame(rh)
+    rhout = np.array(rh, dtype=float)
+    if rhout.ndim == 1:
+        rhout = rhout[:, np.newaxis]
 
-    rhout = rhout.mask(rhout >= 99, other=np.NaN).mask(
-        rhout <= 10, other=np.NaN).mask(
-        np.isnan(rhout), other=np.NaN)
+    rhout[np.logical_or(rhout >= 99, rhout <= 10)] = np.NaN
 
-    rhout = rhout.interpolate(method='linear')
-    rhout = rhout.fillna(method='bfill')
+    rhout = interp_nans(rhout)
 
-    return np.squeeze(rhout.values)
+    return np.squeeze(rhout)
 
 # ----------- END rhcleaner function. -----------
 
 
 def tdpcleaner(tdp, tdb):
 
-    if not isinstance(tdp, pd.DataFrame):
-        tdpout = pd.DataFrame(tdp)
+    tdpout = np.array(tdp, dtype=float)
+    if tdpout.ndim == 1:
+        tdpout = tdpout[:, np.newaxis]
 
-    else:
-        tdpout = tdp
+    tdb = np.array(tdb, dtype=float)
+    if tdb.ndim == 1:
+        tdb = tdb[:, np.newaxis]
 
-    tdpout = tdpout.mask(np.squeeze(tdp) >= np.squeeze(tdb),
-                         other=np.NaN)
-    tdpout = tdpout.mask(
-        np.logical_or(np.squeeze(tdp) >= 50, np.squeeze(tdp) <= -50),
-        other=np.NaN)
+    tdpout[np.logical_or.reduce(
+        (tdpout >= tdb, tdpout >= 50, tdpout <= -50))] = np.NaN
 
-    if ((np.isnan(tdpout.values)).any()):
-        tdpout = tdpout.interpolate(method='linear')
-        tdpout = tdpout.fillna(method='bfill').fillna(method='ffill')
+    tdpout = interp_nans(tdpout)
 
-    return np.squeeze(tdpout.values)
+    return np.squeeze(tdpout)
 
 # ----------- END rhcleaner function. -----------
 
@@ -9,8 +9,8 @@ Translating, as faithfully as possible, the resampling method first proposed
 in (Rastogi, 2016, EPFL).
 """
 
+import os
 import pickle
-import copy
 
 from tqdm import tqdm
 
@@ -21,7 +21,7 @@ from scipy.optimize import curve_fit
 from sklearn.preprocessing import StandardScaler
 
 import fourier
-from ts_models import select_models
+from ts_models import select_models_multi, simulate_models
 # Useful small functions like solarcleaner.
 import petites as petite
 
@@ -53,8 +53,134 @@ cc_cols = [["tdb", "tas"], ["rh", None], ["atmpr", "ps"],
            ["wspd", "sfcWind"], ["ghi", "rsds"]]
 
 
-def trainer(xy_train, n_samples, picklepath, arma_params, bounds, cc_data):
-    """Train the model with this function."""
+def samples_path(picklepath):
+    """Path of the file holding the sample data of the SampleSet saved at
+    picklepath."""
+
+    return os.path.splitext(picklepath)[0] + '.npy'
+
+
+def year_index(year):
+    """Hourly time index of year, without the leap day."""
+
+    index = pd.date_range(start=str(year) + "-01-01 00:00:00",
+                          end=str(year) + "-12-31 23:00:00", freq='1H')
+
+    return index[~((index.month == 2) & (index.day == 29))]
+
+
+class SampleSet(object):
+    """Compact set of synthetic weather samples. All the samples share one
+    base table of recorded weather, and only the synthesised columns (tdb,
+    rh, tdp, solar, ...) are kept for each sample, in data: a dictionary of
+    arrays with one row per hour and one column per sample. Samples can
+    have their own year (years) and climate change model (models);
+    otherwise they have the index of the base table.
+
+    A full DataFrame of a sample is only made when it is needed, by
+    indexing the set (xout[sidx]) or calling frame. Sets are saved with
+    save and opened with load, which memory maps the sample data so that
+    only the samples that are used are read from disk."""
+
+    def __init__(self, base, data, years=None, models=None):
+
+        self.base = base
+        self.data = data
+
+        if years is None:
+            years = [None] * next(iter(data.values())).shape[1]
+        self.years = list(years)
+
+        if models is None:
+            models = [None] * len(self.years)
+        self.models = list(models)
+
+    @classmethod
+    def load(cls, picklepath):
+        """Open the set saved at picklepath."""
+
+        with open(picklepath, 'rb') as open_file:
+            saved = pickle.load(open_file)
+
+        samples = np.load(samples_path(picklepath), mmap_mode='r')
+        data = {col: samples[:, :, cidx].T
+                for cidx, col in enumerate(saved['columns'])}
+
+        return cls(saved['base'], data, years=saved['years'],
+                   models=saved['models'])
+
+    def save(self, picklepath):
+        """Save the set. The base table, years and models are pickled to
+        picklepath, and the sample data are saved in one array, with all
+        the rows and columns of each sample together, in the file given
+        by samples_path."""
+
+        columns = list(self.data)
+
+        np.save(samples_path(picklepath),
+                np.stack([self.data[col].T for col in columns], axis=2))
+
+        with open(picklepath, 'wb') as open_file:
+            pickle.dump(dict(base=self.base, columns=columns,
+                             years=self.years, models=self.models),
+                        open_file)
+
+    def __len__(self):
+
+        return len(self.years)
+
+    def __getitem__(self, sidx):
+
+        return self.frame(sidx)
+
+    def column(self, col):
+        """Array of column col for all samples. Columns that have not been
+        synthesised yet start as a copy of the base table, and can then be
+        changed in place."""
+
+        if col not in self.data:
+            self.data[col] = np.tile(
+                np.asarray(self.base[col], dtype=float)[:, np.newaxis],
+                [1, len(self)])
+
+        return self.data[col]
+
+    def index(self, sidx):
+        """Time index of sample sidx."""
+
+        if self.years[sidx] is None:
+            return self.base.index
+
+        return year_index(self.years[sidx])
+
+    def year(self, sidx):
+        """Year of sample sidx."""
+
+        if self.years[sidx] is None:
+            return np.unique(self.base.index.year)[0]
+
+        return self.years[sidx]
+
+    def frame(self, sidx):
+        """Full DataFrame of sample sidx."""
+
+        frame = self.base.copy()
+
+        if self.years[sidx] is not None:
+            frame.index = self.index(sidx)
+            frame['year'] = frame.index.year
+
+        for col in self.data:
+            frame[col] = self.data[col][:, sidx]
+
+        return frame
+
+
+def trainer(xy_train, n_samples, picklepath, arma_params, bounds, cc_data,
+            n_jobs=1):
+    """Train the model with this function. n_jobs is the number of worker
+    processes used to fit and simulate the ARIMA models (0 for one per
+    CPU)."""
 
     # Save a copy of all data to calculate quantiles later.
     xy_train_all = xy_train
@@ -126,28 +252,28 @@ def trainer(xy_train, n_samples, picklepath, arma_params, bounds, cc_data):
                            axis=1)
     sans_means.index = xy_train.index
 
-    # Fit ARIMA models.
+    # Fit ARIMA models. The candidate models for both variables are
+    # fitted together, in parallel if n_jobs is not 1.
 
     selmdl = list()
     resid = np.zeros([sans_means["tdb"].shape[0], NUM_VARS])
 
-    for idx, ser in enumerate(sans_means):
-        mdl_temp, resid[:, idx] = select_models(
-            arma_params, sans_means[ser])
+    selected = select_models_multi(
+        arma_params, [sans_means[ser] for ser in sans_means], n_jobs=n_jobs)
+
+    for idx, (mdl_temp, resid[:, idx]) in enumerate(selected):
         selmdl.append(mdl_temp)
 
     print(("Done with fitting models to TDB and RH.\r\n"
            "Simulating the learnt model to get synthetic noise series. "
            "This might take some time.\r\n"))
 
-    resampled = np.zeros([STD_LEN_OUT, NUM_VARS, n_samples])
-
-    for midx, mdl in enumerate(selmdl):
-        for sample_num in range(0, n_samples):
-            resampled_temp = mdl.simulate(nsimulations=STD_LEN_OUT)
-            resampled[:, midx, sample_num] = ((resampled_temp-np.mean(resampled_temp))/np.std(resampled_temp))*np.std(resid) + np.mean(resid)
-        # End n for loop.
-    # End mdl for loop.
+    # Simulate all samples of both models together, then rescale each
+    # sample to the mean and standard deviation of the residuals.
+    resampled = simulate_models(selmdl, STD_LEN_OUT, n_samples,
+                                n_jobs=n_jobs)
+    resampled = ((resampled - np.mean(resampled, axis=0)) /
+                 np.std(resampled, axis=0)) * np.std(resid) + np.mean(resid)
 
     # Add the resampled time series back to the fourier series.
 
@@ -159,7 +285,15 @@ def trainer(xy_train, n_samples, picklepath, arma_params, bounds, cc_data):
     else:
 
         cc_models = set(cc_data.index.get_level_values(0))
-        xout = list()  # ([xy_train] * n_samples)
+
+        # Synthesised columns, year and cc model of each sample.
+        syn = {var: list() for var in [x[0] for x in cc_cols] + ['tdp']}
+        years = list()
+        models = list()
+
+        # Monthly quantiles of each variable for the quantile cleaner.
+        quantiles = {var: petite.monthly_quantiles(xy_train, var)
+                     for var in syn}
 
         for model in tqdm(cc_models):
 
@@ -179,72 +313,79 @@ def trainer(xy_train, n_samples, picklepath, arma_params, bounds, cc_data):
                 if cctable.shape[0] < 365:
                     continue
 
-                for nidx in range(0, n_samples):
+                future_index = year_index(future_year)
 
-                    xout_temp = copy.deepcopy(xy_train)
+                # The cc model outputs are the same for every sample.
+                ccvars = dict()
 
-                    future_index = pd.date_range(
-                        start=str(future_year) + "-01-01 00:00:00",
-                        end=str(future_year) + "-12-31 23:00:00",
-                        freq='1H')
-                    # Remove leap days.
-                    future_index = future_index[
-                        ~((future_index.month == 2) &
-                          (future_index.day == 29))]
-                    xout_temp.index = future_index
-                    xout_temp['year'] = future_index.year
+                for var in cc_cols:
 
-                    for idx, var in enumerate(cc_cols):
+                    if var[0] == "rh":
+                        huss = cctable["huss"].values
+                        # Convert specific humifity to humidity ratio.
+                        w = -huss / (huss - 1)
 
-                        if var[0] == "rh":
-                            huss = cctable["huss"].values
-                            # Convert specific humifity to humidity ratio.
-                            w = -huss / (huss - 1)
+                        # Convert humidity ratio (w) to
+                        # Relative Humidity (RH).
+                        rh = petite.w2rh(
+                            w, cctable["tas"].values,
+                            cctable["ps"].values)
 
-                            # Convert humidity ratio (w) to
-                            # Relative Humidity (RH).
-                            rh = petite.w2rh(
-                                w, cctable["tas"].values,
-                                cctable["ps"].values)
+                        # Is there some way to replace the fourier fit at
+                        # a finer grain instead of repeating the daily
+                        # mean value 24 times?
+                        ccvars[var[0]] = np.repeat(rh, [24], axis=0)
 
-                            # Is there some way to replace the fourier fit at
-                            # a finer grain instead of repeating the daily
-                            # mean value 24 times?
-                            ccvar = np.repeat(rh, [24], axis=0)
+                    elif var[0] == "tdb":
+                        ccvars[var[0]] = np.repeat(
+                            cctable[var[1]].values - 273.15, [24], axis=0)
 
-                        elif var[0] == "tdb":
-                            ccvar = np.repeat(
-                                cctable[var[1]].values - 273.15, [24],
-                                axis=0)
+                    else:
+                        ccvars[var[0]] = np.repeat(
+                            cctable[var[1]].values, [24], axis=0)
 
-                        else:
-                            ccvar = np.repeat(
-                                cctable[var[1]].values, [24], axis=0)
+                for nidx in range(0, n_samples):
+
+                    sample = dict()
+
+                    for idx, var in enumerate(cc_cols):
 
                         # Add the resampled time series to the high-frequency
                         # fourier fit and the cc model output.
 
                         if var[0] == 'tdb':
-                            xout_temp[var[0]] = (
+                            sample[var[0]] = (
                                 resampled[:, idx, nidx] + ffit_cc[1] -
-                                ffit_cc[0] + ccvar)
+                                ffit_cc[0] + ccvars[var[0]])
 
                         elif var[0] == 'rh':
-                            xout_temp[var[0]] = (
+                            sample[var[0]] = (
                                 resampled[:, idx, nidx] + ffit_cc[3] -
-                                ffit_cc[2] + ccvar)
+                                ffit_cc[2] + ccvars[var[0]])
                         else:
-                            xout_temp[var[0]] = ccvar
-
-                        xout_temp[var[0]] = petite.quantilecleaner(
-                            xout_temp[var[0]], xy_train, var[0])
-
-                    xout_temp['tdp'] = petite.calc_tdp(
-                        xout_temp["tdb"], xout_temp["rh"])
-                    xout_temp['tdp'] = petite.quantilecleaner(
-                        xout_temp['tdp'], xy_train, 'tdp')
-
-                    xout.append(xout_temp)
+                            sample[var[0]] = ccvars[var[0]]
+
+                        sample[var[0]] = petite.quantilecleaner(
+                            sample[var[0]], xy_train, var[0],
+                            quantiles=quantiles[var[0]],
+                            months=future_index.month)
+
+                    sample['tdp'] = petite.calc_tdp(
+                        pd.Series(sample["tdb"], index=future_index),
+                        pd.Series(sample["rh"], index=future_index))
+                    sample['tdp'] = petite.quantilecleaner(
+                        sample['tdp'], xy_train, 'tdp',
+                        quantiles=quantiles['tdp'],
+                        months=future_index.month)
+
+                    for var in syn:
+                        syn[var].append(sample[var])
+                    years.append(future_year)
+                    models.append(model)
+
+        xout = SampleSet(
+            xy_train, {var: np.stack(syn[var], axis=1) for var in syn},
+            years=years, models=models)
 
     # End for loop.
 
@@ -264,8 +405,8 @@ def trainer(xy_train, n_samples, picklepath, arma_params, bounds, cc_data):
     #         df["tdp"] = petite.tdpcleaner(df['tdp'], df['tdb'])
     #         xout[idx] = df
 
-    # Save the outputs as a pickle.
-    pickle.dump(xout, open(picklepath, 'wb'))
+    # Save the outputs (see SampleSet.save).
+    xout.save(picklepath)
 
     # End nidx loop.
 
@@ -273,18 +414,20 @@ def trainer(xy_train, n_samples, picklepath, arma_params, bounds, cc_data):
 
 
 def sampler(picklepath, year=0, n=0, counter=0):
-    """Only opens the pickle of saved samples and returns ONE sample."""
+    """Only opens the saved samples and returns ONE sample. The sample data
+    are memory mapped (see SampleSet.load), so the other samples are not
+    read."""
 
     try:
 
-        if isinstance(picklepath, list):
+        if isinstance(picklepath, SampleSet):
             xout = picklepath
         else:
-            xout = pickle.load(open(picklepath, 'rb'))
+            xout = SampleSet.load(picklepath)
 
         if np.logical_not(year == 0 and n == 0):
-            yidx = [idx for idx, x in enumerate(xout)
-                    if np.unique(x.index.year) == year]
+            yidx = [idx for idx in range(0, len(xout))
+                    if xout.year(idx) == year]
 
             sample = xout[yidx[n]]
 
@@ -301,9 +444,8 @@ def sampler(picklepath, year=0, n=0, counter=0):
 
 
 def create_future_no_cc(rec, sans_means, ffit, resampled, n_samples, bounds):
-    # First make the xout array using all variables. Variables other
-    # than RH and TDB are just repeated from the incoming files.
-    xout = list()
+    # First make the set of samples. Variables other than RH and TDB are
+    # just repeated from the incoming files.
 
     all_years = np.unique(rec.index.year)
 
@@ -330,27 +472,20 @@ def create_future_no_cc(rec, sans_means, ffit, resampled, n_samples, bounds):
     # Add the fourier fits from the training data to the
     # resampled/resimulated ARMA model outputs.
 
-    for nidx in range(0, n_samples):
+    # All samples of each variable are cleaned together, as one column
+    # per sample. Only these columns are kept for each sample; the others
+    # are taken from rec_year.
+    syn = dict()
 
-        # Copy the master datatable of all values.
-        xout_temp = copy.deepcopy(rec_year)
+    for idx, var in enumerate(sans_means[["tdb", "rh"]]):
 
-        for idx, var in enumerate(sans_means[["tdb", "rh"]]):
+        syn[var] = petite.quantilecleaner(
+            resampled[:, idx, 0:n_samples] +
+            np.asarray(ffit[idx])[:, np.newaxis],
+            rec, var, bounds=bounds,
+            months=year_index(2223).month).reshape(STD_LEN_OUT, -1)
 
-            syn = pd.Series(data=resampled[:, idx, nidx] + ffit[idx],
-                            index=pd.date_range(
-                                start="2223-01-01 00:00:00",
-                                end="2223-12-31 23:00:00",
-                                freq='1H'))
-
-            # Replace only var (tdb or rh).
-            # Also send it to the quantile cleaner.
-            xout_temp[var] = petite.quantilecleaner(
-                syn, rec, var, bounds=bounds)
-
-        xout.append(xout_temp)
-
-    return xout
+    return SampleSet(rec_year, syn)
 
 
 def nearest_neighbour(syn, rec, basevar, othervar):
@@ -359,9 +494,10 @@ def nearest_neighbour(syn, rec, basevar, othervar):
     mean_list = {basevar: list(), othervar: list()}
 
     for var in [basevar, othervar]:
-        for df in syn:
+        for sidx in range(0, len(syn)):
 
-            df_dm = df[var].resample('1D').mean()
+            df_dm = pd.Series(syn.column(var)[:, sidx],
+                              index=syn.index(sidx)).resample('1D').mean()
 
             if len(df_dm) > 365:
                 df_dm = petite.remove_leap_day(df_dm)
@@ -378,6 +514,9 @@ def nearest_neighbour(syn, rec, basevar, othervar):
         othervar_idx = [x for x, y in enumerate(rec)
                         if y in [othervar]]
 
+    # Month of each hour of each sample.
+    syn_months = [syn.index(sidx).month for sidx in range(0, len(syn))]
+
     # Number of nearest neighbours to keep when varying solar quantities.
     nn_top = 10
     # days_in_month = [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
@@ -424,35 +563,30 @@ def nearest_neighbour(syn, rec, basevar, othervar):
             scaler_syn.fit(syn_sample)
             syn_sample_scaled = scaler_syn.transform(syn_sample)
 
-            nearest_nbours = list()
-
-            for day_sample in syn_sample_scaled:
-
-                # Sort samples by Euclidean distance.
-                # argsort gives the arguments (indices) from sorting.
-                nbours = np.argsort(
-                    np.asarray([petite.euclidean(day_sample, x)
-                                for x in rec_means_scaled]))
-
-                # Keep only the first nn_top samples.
-                nbours = nbours[:nn_top]
-                # Select only one of those.
-                nbours = nbours[np.random.randint(0, len(nbours), size=1)]
-                # Save it as an integer.
-                nearest_nbours.append(int(nbours))
-
-            # Array to store the hourly samples.
-            othervar_samples = np.zeros([len(nearest_nbours),
-                                         24, len(othervar_idx)])
-
-            # Cycle through the nearest neighbours.
-            for ng_idx, nbour_idx in enumerate(nearest_nbours):
-                othervar_samples[ng_idx, :, :] = othervar_this_month[
-                    nbour_idx, :, :]
-
-            # Reshape solar samples to be continuous.
+            # Euclidean distance of every synthetic day from every
+            # recorded day, one row per synthetic day.
+            dists = np.sqrt(
+                (syn_sample_scaled[:, 0, np.newaxis] -
+                 rec_means_scaled[np.newaxis, :, 0]) ** 2 +
+                (syn_sample_scaled[:, 1, np.newaxis] -
+                 rec_means_scaled[np.newaxis, :, 1]) ** 2)
+
+            # Sort recorded days by distance and keep only the first
+            # nn_top. A full sort is used rather than a partition, so that
+            # ties are broken as they always have been.
+            nbours = np.argsort(dists, axis=1)[:, :nn_top]
+
+            # Select only one of those for each synthetic day.
+            nearest_nbours = nbours[
+                np.arange(nbours.shape[0]),
+                np.random.randint(0, nbours.shape[1], size=nbours.shape[0])]
+
+            # The hourly samples, reshaped to be continuous.
             othervar_samples = np.reshape(
-                othervar_samples, [-1, len(othervar_idx)])
+                othervar_this_month[nearest_nbours, :, :].astype(float),
+                [-1, len(othervar_idx)])
+
+            this_month_idx = (syn_months[sample_idx] == this_month)
 
             # Put the solar samples back in to syn.
             for sidx, othervar_col in enumerate(othervar_idx):
@@ -460,12 +594,8 @@ def nearest_neighbour(syn, rec, basevar, othervar):
                     pd.Series(othervar_samples[:, sidx]),
                     rec.iloc[:, othervar_col])
 
-                this_month_idx = [idx for idx, x in
-                                  enumerate(syn[sample_idx].index.month)
-                                  if x == this_month]
-
-                syn[sample_idx].iloc[this_month_idx,
-                                     othervar_col] = cleaned_solar.values
+                syn.column(rec.columns[othervar_col])[
+                    this_month_idx, sample_idx] = cleaned_solar.values
 
         # End syn_sample loop
 
@@ -6,32 +6,38 @@ Created on Sun Oct  8 20:29:16 2017
 """
 from sys import stdout
 from itertools import product
+from concurrent.futures import ProcessPoolExecutor
+import os
 import numpy as np
 from statsmodels.tsa.statespace.sarimax import SARIMAX
 # from tqdm import tqdm
 
 
-def select_models(arma_params, ts_in):
+def get_n_jobs(n_jobs):
+
+    '''Number of worker processes to use. Zero or None means one per
+    available CPU.'''
+
+    if not n_jobs:
+        try:
+            n_jobs = len(os.sched_getaffinity(0))
+        except AttributeError:
+            n_jobs = os.cpu_count() or 1
+
+    return max(1, n_jobs)
 
-    '''Select the most parsimonious SARMA model.'''
+
+def candidate_orders(arma_params):
+
+    '''List the (order, seasonal_order) pairs of all candidate models,
+    in the order in which they are compared.'''
 
     # Set ranges for various model parameters.
     # Each range is one more than what we are
     # interested in because range cuts off at end-1.
     # arma_params = [arp_ub, maq_ub, sarp_ub, smaq_ub, seasonality]
 
-    aic_curr = 0
-    selaic = np.infty
-    mod_fit_curr = None
-
-    counter = 0
-    # Total iterations expected.
-    # total_iters = np.prod([x+1 for x in arma_params[:-1]])
-    # print(total_iters)
-
-    # Loop through all possible combinations of ar, ma, sar, and sma lags.
-
-    print("Iteration number: ")
+    orders = list()
 
     for p, q, pp, qq in product(
             range(0, arma_params[0]+1), range(0, arma_params[1]+1),
@@ -40,39 +46,238 @@ def select_models(arma_params, ts_in):
         if p == 0 and q == 0:
             continue
 
-        model = SARIMAX(
-            ts_in, order=(p, 0, q),
-            seasonal_order=(pp, 0, qq, arma_params[4]),
-            trend=None)
+        orders.append(((p, 0, q), (pp, 0, qq, arma_params[4])))
 
-        try:
-            mod_fit_curr = model.fit(
-                disp=0, cov_type="robust",
-                full_output=True)
-            aic_curr = mod_fit_curr.aic
+    return orders
 
-            if np.isnan(aic_curr):
+
+def fit_model(ts_in, order, seasonal_order):
+
+    '''Fit one SARMA model. Returns None if the fit fails.'''
+
+    model = SARIMAX(
+        ts_in, order=order,
+        seasonal_order=seasonal_order,
+        trend=None)
+
+    try:
+        return model.fit(
+            disp=0, cov_type="robust",
+            full_output=True)
+    except Exception as err:
+        # print('fit threw an error')
+        return None
+
+
+def fit_aic(ts_in, order, seasonal_order):
+
+    '''Fit one SARMA model in a worker process and return only its AIC,
+    since the fitted results are too large to send back. NaN if the
+    fit fails.'''
+
+    mod_fit = fit_model(ts_in, order, seasonal_order)
+
+    if mod_fit is None:
+        return np.nan
+
+    return mod_fit.aic
+
+
+def select_models(arma_params, ts_in, n_jobs=1):
+
+    '''Select the most parsimonious SARMA model.'''
+
+    return select_models_multi(arma_params, [ts_in], n_jobs=n_jobs)[0]
+
+
+def select_models_multi(arma_params, ts_list, n_jobs=1):
+
+    '''Select the most parsimonious SARMA model for each series in
+    ts_list. With n_jobs other than 1, the candidate models for all
+    series are fitted together in a pool of worker processes (see
+    get_n_jobs). The model with the lowest AIC is chosen, with ties
+    going to the first in the order of candidate_orders, so the same
+    models are selected however many workers are used.
+
+    Returns a list of (selected model, residuals). Raises ValueError if
+    no candidate model can be fitted to a series.'''
+
+    orders = candidate_orders(arma_params)
+    n_jobs = get_n_jobs(n_jobs)
+
+    print("Iteration number: ")
+
+    # AIC of each candidate model of each series.
+    aics = np.full([len(ts_list), len(orders)], np.nan)
+    mod_fits = [[None] * len(orders) for ts_in in ts_list]
+
+    if n_jobs == 1:
+
+        counter = 0
+        for sidx, ts_in in enumerate(ts_list):
+            selaic = np.inf
+            for oidx, (order, seasonal_order) in enumerate(orders):
+                mod_fit_curr = fit_model(ts_in, order, seasonal_order)
+                if mod_fit_curr is None:
+                    continue
+                aics[sidx, oidx] = mod_fit_curr.aic
                 counter += 1
-                continue
+                # Only keep the best model so far, to save memory.
+                if aics[sidx, oidx] < selaic:
+                    selaic = aics[sidx, oidx]
+                    mod_fits[sidx] = [None] * len(orders)
+                    mod_fits[sidx][oidx] = mod_fit_curr
+                # Print out a heartbeat.
+                print("{0} ...".format(counter))
+
+    else:
+
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            futures = dict()
+            for sidx, ts_in in enumerate(ts_list):
+                for oidx, (order, seasonal_order) in enumerate(orders):
+                    futures[(sidx, oidx)] = pool.submit(
+                        fit_aic, ts_in, order, seasonal_order)
+            for counter, key in enumerate(futures, start=1):
+                aics[key] = futures[key].result()
+                # Print out a heartbeat.
+                print("{0} ...".format(counter))
+                stdout.flush()
+
+    selected = list()
 
-            # if counter > 0:
+    for sidx, ts_in in enumerate(ts_list):
+
+        # Loop through all candidates in order, as if fitted one
+        # after another.
+        selaic = np.inf
+        selidx = None
+        for oidx, aic_curr in enumerate(aics[sidx]):
+            if np.isnan(aic_curr):
+                continue
             if aic_curr < selaic:
-                [selaic, selmdl] = [aic_curr, mod_fit_curr]
+                [selaic, selidx] = [aic_curr, oidx]
 
-            # elif counter == 0:
-            #     [selaic, selmdl] = [aic_curr, mod_fit_curr]
+        if selidx is None:
+            ser_name = getattr(ts_in, "name", None)
+            if ser_name is None:
+                ser_name = "number {:d}".format(sidx + 1)
+            raise ValueError(
+                ("None of the {0:d} candidate SARMA models could be fitted "
+                 "to series {1}.").format(len(orders), ser_name))
 
-            counter += 1
+        selmdl = mod_fits[sidx][selidx]
+        if selmdl is None:
+            # Fitted in a worker; fit it again here.
+            selmdl = fit_model(ts_in, *orders[selidx])
 
-        except Exception as err:
-            # print('fit threw an error')
-            continue
+        selected.append((selmdl, selmdl.resid))
+
+    return selected
+
+
+def state_space(mdl):
+
+    '''State space matrices of fitted SARMA model mdl, and the mean and
+    covariance of its initial state, which is where simulations start.
+    The models have no exogenous variables or trend, so the matrices do
+    not vary with time.'''
+
+    res = mdl.filter_results
+
+    return {'design': res.design[:, :, 0],
+            'obs_cov': res.obs_cov[:, :, 0],
+            'transition': res.transition[:, :, 0],
+            'selection': res.selection[:, :, 0],
+            'state_cov': res.state_cov[:, :, 0],
+            'initial_state': res.predicted_state[:, 0],
+            'initial_state_cov': res.predicted_state_cov[:, :, 0]}
+
+
+def draw_shocks(ssm, nsimulations, n_samples, random_state):
+
+    '''Draw the initial states and the measurement and state shocks
+    for n_samples simulations of state space ssm (see state_space).'''
+
+    initial_states = random_state.multivariate_normal(
+        ssm['initial_state'], ssm['initial_state_cov'], size=n_samples)
+
+    state_shocks = random_state.multivariate_normal(
+        np.zeros(ssm['state_cov'].shape[0]), ssm['state_cov'],
+        size=(nsimulations, n_samples))
+
+    if np.any(ssm['obs_cov']):
+        measurement_shocks = random_state.multivariate_normal(
+            np.zeros(ssm['obs_cov'].shape[0]), ssm['obs_cov'],
+            size=(nsimulations, n_samples))
+    else:
+        measurement_shocks = None
+
+    return initial_states, measurement_shocks, state_shocks
+
+
+def simulate_state_space(ssm, initial_states, measurement_shocks,
+                         state_shocks):
+
+    '''Run the state space recursions of ssm (see state_space) for all
+    samples at once, from the initial states and shocks given by
+    draw_shocks. Returns the simulated series as an array of shape
+    (nsimulations, n_samples).'''
+
+    design = ssm['design'].T
+    transition = ssm['transition'].T
+    selection = ssm['selection'].T
+
+    nsimulations = state_shocks.shape[0]
+    sim = np.zeros([nsimulations, initial_states.shape[0]])
+
+    # One row of state for each sample.
+    state = initial_states
+
+    for t in range(0, nsimulations):
+        sim[t, :] = (state @ design)[:, 0]
+        state = state @ transition + state_shocks[t] @ selection
+
+    if measurement_shocks is not None:
+        sim += measurement_shocks[:, :, 0]
+
+    return sim
+
+
+def simulate_models(models, nsimulations, n_samples, random_state=None,
+                    n_jobs=1):
+
+    '''Simulate n_samples series of length nsimulations from each of the
+    fitted SARMA models in models, in one vectorised pass per model rather
+    than one call of simulate per sample. This gives series with the same
+    distribution as simulate, anchored at the start of the sample.
+
+    random_state is the stream of random numbers used: a
+    numpy.random.RandomState, a seed for one, or None for numpy's global
+    stream (as seeded by petites.setseed). All random numbers are drawn
+    from it before any simulation is run, so the results are the same with
+    any number of workers. With n_jobs other than 1, the models are
+    simulated in parallel worker processes (see get_n_jobs).
+
+    Returns an array of shape (nsimulations, len(models), n_samples).'''
+
+    if random_state is None:
+        random_state = np.random.mtrand._rand
+    elif not isinstance(random_state, np.random.RandomState):
+        random_state = np.random.RandomState(random_state)
 
-        # Print out a heartbeat.
-        print("{0} ...".format(counter))
+    jobs = list()
+    for mdl in models:
+        ssm = state_space(mdl)
+        jobs.append((ssm,) + draw_shocks(
+            ssm, nsimulations, n_samples, random_state))
 
-    # End p, q, pp, qq nested loops.
+    n_jobs = min(get_n_jobs(n_jobs), len(jobs))
 
-    resid = selmdl.resid
+    if n_jobs == 1:
+        sims = [simulate_state_space(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            sims = list(pool.map(simulate_state_space, *zip(*jobs)))
 
-    return selmdl, resid
+    return np.stack(sims, axis=1)
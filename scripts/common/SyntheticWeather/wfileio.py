@@ -1,7 +1,6 @@
 import os
 import numpy as np
 import pandas as pd
-import csv
 import re
 from scipy import interpolate
 
@@ -237,11 +236,11 @@ m_days = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
 
 def day_of_year(month, day):
 
-    month = month.astype(int) - 1
-    doy = np.zeros_like(day, dtype=int)
+    # Day of year at the end of each previous month.
+    month_ends = np.cumsum((0,) + m_days)
 
-    for m, mon in enumerate(month):
-        doy[m] = (day[m] + np.sum(m_days[0:mon])).astype(int)
+    month = np.asarray(month).astype(int) - 1
+    doy = (np.asarray(day) + month_ends[month]).astype(int)
 
     return doy
 
@@ -251,32 +250,24 @@ def day_of_year(month, day):
 
 def day_of_month(day):
 
-    month = np.zeros_like(day, dtype=int)
-    dom = np.zeros_like(day, dtype=int)
-
-    for d, doy in enumerate(day):
-
-        rem = doy
-        prev_ndays = 0
+    # Day of year at the end of each month, from the end of "month 0".
+    month_ends = np.cumsum((0,) + m_days)
 
-        for m, ndays in enumerate(m_days):
-            # The iterator "m" starts at zero.
+    day = np.asarray(day)
 
-            if rem <= 0:
-                # Iterator has now reached the incomplete month.
+    # The first month that ends on or after the day.
+    month = np.searchsorted(month_ends, day, side="left")
 
-                # The previous month is the correct month.
-                # Not subtracting 1 because the iterator starts at 0.
-                month[d] = m
+    # Days outside the year are returned as they always have been, with
+    # month 0 and the day unchanged before the year and set to 0 after it.
+    before = month == 0
+    after = month == len(month_ends)
+    month[after] = 0
 
-                # Add the negative remainder to the previous month"s days.
-                dom[d] = rem + prev_ndays
-                break
-
-            # Subtract number of days in this month from the day.
-            rem -= ndays
-            # Store number of days from previous month.
-            prev_ndays = ndays
+    dom = np.zeros_like(day, dtype=int)
+    inside = ~(before | after)
+    dom[inside] = day[inside] - month_ends[month[inside] - 1]
+    dom[before] = day[before]
 
     return month, dom
 
@@ -459,74 +450,62 @@ def read_espr(fpath):
 
     del content
 
-    # Find the lines with day tags.
-    daylines = [[idx, line] for [idx, line] in enumerate(body)
-                if "day" in line]
-
-    dataout = np.zeros([8760, 11])
-
-    dcount = 0
-
-    for idx, day in daylines:
-
-        # Get the next 24 lines.
-        daylist = np.asarray(body[idx+1:idx+25])
-
-        # Split each line of the current daylist into separate strings.
-        if "," in daylist[0]:
-            splitlist = [element.split(",") for element in daylist]
-        else:
-            splitlist = [element.split() for element in daylist]
+    # Find the lines with day tags. The 24 hourly lines after each tag
+    # are the data.
+    dayidx = np.asarray([idx for idx, line in enumerate(body)
+                         if "day" in line], dtype=int)
+    ndays = len(dayidx)
 
-        # Convert each element to a integer, then convert the resulting
-        # list to a numpy array.
-        daydata = np.asarray([list(map(int, x)) for x in splitlist])
+    datalines = (dayidx[:, np.newaxis] + np.arange(1, 25)).ravel()
 
-        # Today"s time slice.
-        dayslice = range(dcount, dcount+24, 1)
+    # Parse all the data in one go. Values can be separated by commas or
+    # blanks.
+    daydata = np.fromstring(
+        " ".join([body[idx] for idx in datalines]).replace(",", " "),
+        dtype=int, sep=" ").reshape([ndays * 24, -1])
 
-        # This will split the day-month header line on the gaps.
-        if "," in day:
-            splitday = day.split(",")
-        else:
-            splitday = day.split(" ")
+    # This will split the day-month header lines on the gaps, removing
+    # blanks.
+    splitdays = [[x for x in body[idx].split("," if "," in body[idx] else " ")
+                  if x not in ("", " ")] for idx in dayidx]
 
-        # Remove blanks.
-        splitday = [x for x in splitday if x != ""]
-        splitday = [x for x in splitday if x != " "]
+    dataout = np.zeros([8760, 11])
 
-        # Month.
-        dataout[dayslice, 0] = np.repeat(int(splitday[-1]), len(dayslice))
+    # Today"s time slices.
+    dayslice = range(0, ndays * 24)
 
-        # Day of month.
-        dataout[dayslice, 1] = np.repeat(int(splitday[2]), len(dayslice))
+    # Month.
+    dataout[dayslice, 0] = np.repeat(
+        [int(splitday[-1]) for splitday in splitdays], 24)
 
-        # Hour (of day).
-        dataout[dayslice, 2] = np.arange(0, 24, 1)
+    # Day of month.
+    dataout[dayslice, 1] = np.repeat(
+        [int(splitday[2]) for splitday in splitdays], 24)
 
-        # tdb, input is in deci-degrees, convert to degrees.
-        dataout[dayslice, 3] = daydata[:, tdbcol]/10
+    # Hour (of day).
+    dataout[dayslice, 2] = np.tile(np.arange(0, 24, 1), ndays)
 
-        # tdp is calculated after this loop.
+    # tdb, input is in deci-degrees, convert to degrees.
+    dataout[dayslice, 3] = daydata[:, tdbcol]/10
 
-        # rh, in percent.
-        dataout[dayslice, 5] = daydata[:, rhcol]
+    # tdp is calculated after this.
 
-        # ghi is calculated after this loop.
+    # rh, in percent.
+    dataout[dayslice, 5] = daydata[:, rhcol]
 
-        # dni, in W/m2.
-        dataout[dayslice, 7] = daydata[:, dnicol]
+    # ghi is calculated after this.
 
-        # dhi, in W/m2.
-        dataout[dayslice, 8] = daydata[:, dhicol]
+    # dni, in W/m2.
+    dataout[dayslice, 7] = daydata[:, dnicol]
 
-        # wspd, input is in deci-m/s.
-        dataout[dayslice, 9] = daydata[:, wspdcol]/10
+    # dhi, in W/m2.
+    dataout[dayslice, 8] = daydata[:, dhicol]
 
-        # wdr, clockwise deg from north.
-        dataout[dayslice, 10] = daydata[:, wdrcol]
+    # wspd, input is in deci-m/s.
+    dataout[dayslice, 9] = daydata[:, wspdcol]/10
 
-        dcount += 24
+    # wdr, clockwise deg from north.
+    dataout[dayslice, 10] = daydata[:, wdrcol]
 
     # tdp, calculated from tdb and rh.
     dataout[:, 4] = petite.calc_tdp(dataout[:, 3], dataout[:, 5])
@@ -558,9 +537,37 @@ def read_espr(fpath):
 # ----------- END read_espr function -----------
 
 
+def format_rows(values, fmt, delimiter):
+    """Format all the rows of 2-D array values in one go, as np.savetxt
+    does with the list of column formats fmt."""
+
+    row_fmt = delimiter.join(fmt) + "\n"
+
+    return (row_fmt * values.shape[0]) % tuple(values.ravel())
+
+# ----------- END format_rows function -----------
+
+
 def give_weather(df, locdata, stcode, header,
                  masterfile="GEN_IWEC.epw", file_type="epw",
-                 path_file_out=".", std_cols=None):
+                 path_file_out=".", std_cols=None, masters=None):
+    """Write out weather data df, in the format of masterfile. df can also
+    be a list of samples, with path_file_out a list of the files to write
+    them to, so that several samples are written in one call and the
+    master file is only read once. masters is a dictionary in which the
+    master file is kept once read, for those calls."""
+
+    if isinstance(df, list):
+        masters = dict()
+        for df_sample, path_sample_out in zip(df, path_file_out):
+            give_weather(df_sample, locdata, stcode, header,
+                         masterfile=masterfile, file_type=file_type,
+                         path_file_out=path_sample_out, std_cols=std_cols,
+                         masters=masters)
+        return
+
+    if masters is None:
+        masters = dict()
 
     file_type = file_type.lower()
 
@@ -614,7 +621,9 @@ def give_weather(df, locdata, stcode, header,
 
     if file_type == "espr":
 
-        esp_master, locdata, header, esp_columns = read_espr(masterfile)
+        if file_type not in masters:
+            masters[file_type] = read_espr(masterfile)
+        esp_master, locdata, header, esp_columns = masters[file_type]
 
         # Replace the year in the header.
         yline = [line for line in header if "year" in line]
@@ -622,58 +631,35 @@ def give_weather(df, locdata, stcode, header,
         yline[0] = yline[0].replace(yval[0], str(year))
         header = [yline[0] if "year" in line else line
                   for line in header]
-        # Cut out the last new-line character since numpy savetxt
-        # puts in a newline character after the header anyway.
+        # Cut out the last new-line character since a newline character
+        # is put in after the header anyway.
         header[-1] = header[-1][:-1]
 
-        for col in esp_columns:
-            esp_master.loc[:, col] = df[col].values
-            if col in ["tdb", "wspd"]:
-                # Deci-degrees and deci-m/s respectively.
-                esp_master.loc[:, col] *= 10
-        # Create a datetime index for this year.
-        esp_master.index = pd.date_range(
-            start='{:04d}-01-01 00:00:00'.format(year),
-            end='{:04d}-12-31 23:00:00'.format(year),
-            freq='1H')
-
-        # Save month and day to write out to file as separate rows.
-        monthday = (esp_master.loc[:, ["day", "month"]]).astype(int)
-
-        # Drop those columns that will not be written out.
-        esp_master = esp_master.drop(
-            ["year", "month", "day", "hour", "ghi", "tdp"],
-            axis=1)
-        # Re-arrange the columns into the espr clm file order.
-        esp_master = esp_master[esp_columns]
-        # Convert all data to int.
-        esp_master = esp_master.astype(int)
-
-        master_aslist = esp_master.values.tolist()
-
-        md_master = 0
-        for md in range(0, monthday.shape[0], 24):
-            md_list = [str("* day {0} month {1}".format(
-                monthday["day"][md], monthday["month"][md]))]
-            master_aslist.insert(md_master, md_list)
-            md_master += 25
-
-        # Write the header to file - though the delimiter is
-        # mostly meaningless in this case.
+        # The data in the espr clm file order, as integers, with tdb and
+        # wspd in deci-degrees and deci-m/s respectively.
+        esp_data = np.column_stack(
+            [np.asarray(df[col].values, dtype=float) *
+             (10 if col in ["tdb", "wspd"] else 1)
+             for col in esp_columns]).astype(int)
+
+        # Day and month of each day, to write out as separate rows.
+        ndays = esp_data.shape[0] // 24
+        monthday = esp_master.loc[:, ["day", "month"]].values[::24]
+        monthday = monthday[0:ndays].astype(int)
+
+        # Format all the days at once: the day tag, then 24 rows of data.
+        # The layout, with a blank at the start of every line after the
+        # first, the blanks in the day tags doubled and a blank line at the
+        # end, is that of the csv writer previously used.
+        day_fmt = ("*  day  %d  month  %d\n " +
+                   (",".join(["%d"] * len(esp_columns)) + "\n ") * 24)
+        days = np.concatenate(
+            (monthday, esp_data[0:ndays*24].reshape([ndays, -1])), axis=1)
+        body = (day_fmt * ndays) % tuple(days.ravel().tolist())
+
+        # Write the header and data to file.
         with open(filepath, "w") as f:
-            f.write(''.join(header)+'\n')
-
-            spamwriter = csv.writer(f, delimiter=",", quotechar="",
-                                    quoting=csv.QUOTE_NONE,
-                                    escapechar=" ",
-                                    lineterminator="\n ")
-            for line in master_aslist[:-1]:
-                spamwriter.writerow(line)
-
-            spamwriter = csv.writer(f, delimiter=",", quotechar="",
-                                    quoting=csv.QUOTE_NONE,
-                                    lineterminator="\n\n")
-            spamwriter.writerow(master_aslist[-1])
+            f.write(''.join(header) + '\n' + body[:-1] + '\n')
 
         if os.path.isfile(filepath):
             success = True
@@ -691,10 +677,13 @@ def give_weather(df, locdata, stcode, header,
                    ((np.repeat("%5.2f", len(epw_colnames) - (6 + 3))
                      ).tolist()))
 
-        epw_master, locdata, header = read_epw(masterfile)
-        # Cut out the last new-line character since numpy savetxt
-        # puts in a newline character after the header anyway.
-        header[-1] = header[-1][:-1]
+        if file_type not in masters:
+            masters[file_type] = read_epw(masterfile)
+        epw_master, locdata, header = masters[file_type]
+        epw_master = epw_master.copy()
+        # Cut out the last new-line character since a newline character
+        # is put in after the header anyway.
+        header = header[:-1] + [header[-1][:-1]]
 
 
         # These columns will be replaced.
@@ -709,9 +698,10 @@ def give_weather(df, locdata, stcode, header,
 
 
 
-        np.savetxt(filepath, df.values, fmt=epw_fmt,
-                   delimiter=",", header="".join(header),
-                   comments="")
+        # Write the header and data to file, as np.savetxt would.
+        with open(filepath, "w", encoding="latin1") as f:
+            f.write("".join(header) + "\n" +
+                    format_rows(df.values, epw_fmt, ","))
 
         if os.path.isfile(filepath):
             success = True
@@ -724,10 +714,12 @@ def give_weather(df, locdata, stcode, header,
         if filepath.split(".")[-1] != "fin4":
             filepath = filepath + "fin4"
 
-        _, _, header = read_fin4(masterfile)
+        if file_type not in masters:
+            masters[file_type] = read_fin4(masterfile)
+        _, _, header = masters[file_type]
 
         # Strip the last end-of-line character.
-        header[-1] = header[-1].strip('\r').strip('\n')
+        header = header[:-1] + [header[-1].strip('\r').strip('\n')]
 
         # Convert pressure to millibars.
         df['atmpr'] = df['atmpr'] / 100
@@ -740,10 +732,11 @@ def give_weather(df, locdata, stcode, header,
                    ((np.repeat("%6.1f", len(df.columns) - (4))
                      ).tolist()))
 
+        # Write the header and data to file, as np.savetxt would.
         with open(filepath, 'wb') as openfile:
-            np.savetxt(openfile, df.values, fmt=fin_fmt,
-                       delimiter=" ", header="".join(header),
-                       comments="")
+            openfile.write(("".join(header) + "\n" +
+                            format_rows(df.values, fin_fmt, " ")
+                            ).encode("latin1"))
 
         # import ipdb; ipdb.set_trace()
 
@@ -5,147 +5,43 @@
 # esp-query.py
 # Script to query an ESP-r model for various data.
 # "./esp-query.py -h" for help.
+# This is the command line interface to the espquery library (espquery.py,
+# in the same directory as this script), which does the work.
 
-from pathlib import Path
+import sys,argparse,hashlib,json,shlex
+from os import path,environ,walk,stat,getpid,rename
+from datetime import datetime
 
-# FUNCTION getLine
-# Get the nth line down in file f, return in list split by whitespace.
-def getLine(f,n):
-    for i in range(0,n):
-        s_line=f.readline()
-    s_line=s_line.strip()
-    ls_line=s_line.split()
-    return ls_line
-# END FUNCTION
+sys.path.insert(0,path.dirname(path.realpath(__file__)))
+from espquery import ls_outputs,ls_zoneOutputs,query_model,EspQueryError
 
 
-# FUNCTION get_zone_setpoints
-# Scan control file for zone control setpoints.
-def get_zone_setpoints(f_ctl,i_numDayTypes):
-    
-    s='zone_setpoints:'    
-    s=s+'\n  number_of_calender_daytypes='+str(i_numDayTypes)
-    i_numDayTypesInp=i_numDayTypes
+# FUNCTION formatJSON
+# Returns the outputs held in ModelInfo object info as a JSON object.
+def formatJSON(info):
+    return json.dumps({a:info.value(a) for a in info.outputs},indent=2)
+# END FUNCTION
 
-    while True:
-        ls_line=getLine(f_ctl,1)
-        if ls_line[0:2]==['*','Building']:
-            break
-    
-    ls_line=getLine(f_ctl,2)
-    i_numFuncs=int(ls_line[0])
-    s=s+'\n  number_of_functions='+str(i_numFuncs)
 
-    for i_func in range(0,i_numFuncs):
-        s=s+'\n  function#'+str(i_func+1)+':'
-        ls_line=getLine(f_ctl,6)
-        s_dayTypes=ls_line[0]
-        if s_dayTypes=='0': 
-            s_dayTypes='follows_calender'
-            i_numDayTypes=i_numDayTypesInp
-        elif s_dayTypes=='1': 
-            s_dayTypes='all'
-            i_numDayTypes=1
+# FUNCTION formatShell
+# Returns the outputs held in ModelInfo object info as bash assignments, for
+# "eval" or "source" in the assessment scripts. Single values are assigned
+# as strings, and lists as arrays. For outputs with a list for each zone,
+# the array has a comma separated string for each zone.
+def formatShell(info):
+    ls=[]
+    for s_output in info.outputs:
+        value=info.value(s_output)
+        if s_output in ls_zoneOutputs:
+            value=[','.join(a) for a in value]
+        if isinstance(value,list):
+            ls.append(s_output+'=('+' '.join(shlex.quote(a) for a in value)+')')
         else:
-            sys.stderr.write('esp-query error: unrecognised daytypes flag: '+s_dayTypes+'\n')
-            print(ls_line)
-            sys.exit(1)
-        s=s+'\n    day_types='+s_dayTypes
-
-        for i_dayType in range(0,i_numDayTypes):
-            if not s_dayTypes=='all':
-                s=s+'\n    daytype#'+str(i_dayType+1)+':'
-                xtra='  '
-            else:
-                xtra=''
-            ls_line=getLine(f_ctl,1)
-            s=s+'\n'+xtra+'    validity_start_day='+ls_line[0]
-            s=s+'\n'+xtra+'    validity_end_day='+ls_line[1]
-            ls_line=getLine(f_ctl,1)
-            i_numPer=int(ls_line[0])
-            #print(i_numPer)
-            s=s+'\n'+xtra+'    number_of_periods='+str(i_numPer)
-
-            for i_per in range(0,i_numPer):
-                s=s+'\n'+xtra+'    period#'+str(i_per+1)+':'
-                ls_line=getLine(f_ctl,1)
-                s_ctlType=ls_line[1]
-                #print(ls_line)
-                if s_ctlType=='1':
-                    s=s+'\n'+xtra+'      control_type=basic'
-                elif s_ctlType=='2':
-                    s=s+'\n'+xtra+'      control_type=none'
-                elif s_ctlType=='11':
-                    s=s+'\n'+xtra+'      control_type=match multi-sensor (ideal)'
-# TODO - other ESP-r control types
-                else:
-#                    sys.stderr.write('esp-query error: unrecognised control type: '+s_ctlType+'\n')
-#                    sys.exit(1)
-                    ls_line=getLine(f_ctl,2)
-                    continue
-                s=s+'\n'+xtra+'      starting_at_hour='+ls_line[2]
-                if s_ctlType=='2':
-                    ls_line=getLine(f_ctl,1)
-                else:
-                    ls_line=getLine(f_ctl,2)
-                    skip=False
-                    if s_ctlType=='1':
-                        i_hs=4
-                        i_cs=5
-                    elif s_ctlType=='11':
-                        skip=True
-# TODO - other ESP-r control types
-                    if skip:
-                        s=s+'\n'+xtra+'      heating_setpoint=n/a'
-                        s=s+'\n'+xtra+'      cooling_setpoint=n/a'
-                    else:
-                        s=s+'\n'+xtra+'      heating_setpoint='+ls_line[i_hs]
-                        s=s+'\n'+xtra+'      cooling_setpoint='+ls_line[i_cs]
-
-    ls_line=getLine(f_ctl,2)
-    s=s+'\n  function_zone_mappings='+ls_line[0]
-    
-    f_ctl.close()
-    return s
+            ls.append(s_output+'='+shlex.quote(value))
+    return '\n'.join(ls)
 # END FUNCTION
 
 
-import sys,argparse
-from os import path
-from datetime import datetime
-
-# OUTPUT MAPPINGS
-# New outputs must be added here (also add help text in the parser below).
-#            0            1              2             3                4                   5            6
-ls_outputs=['model_name','number_zones','CFD_domains','zone_setpoints','model_description','zone_names','MRT_sensors',
-#            7                  8                9           10               11            12            13
-            'zone_floor_surfs','rad_viewpoints','rad_scene','zone_win_surfs','afn_network','ctm_network','number_ctm',
-#            14               15                 16             17                 18                 19
-            'afn_zone_nodes','afn_zon_nod_nums','zone_control','CFD_contaminants','CFD_domain_files','MRT_sensor_names',
-#            20          21              22              23            24              25                   26
-            'tdfa_file','tdfa_timestep','tdfa_startday','tdfa_endday','tdfa_entities','uncertainties_file','number_presets',
-#            27             28          29                 30             31             32                33
-            'weather_file','QA_report','total_floor_area','total_volume','zone_volumes','FMI_config_file','FMU_names',
-#            34               35               36               37                38                 39
-            'number_toilets','number_urinals','number_showers','number_printers','number_photocopy','is_building',
-#            40              41                 42
-            'plant_network','plant_components','plant_comp_names']
-# Prerequisites.
-#            0  1  2      3    4  5   6   
-lli_needs= [ [],[],[1,18],[16],[],[1],[1],
-#            7   8  9  10  11 12 13  
-             [1],[],[],[1],[],[],[12],
-#            14   15        16 17     18  19    
-             [11],[11,14,1],[],[1,18],[1],[1,6],
-#            20 21   22   23   24   25 26
-             [],[20],[20],[20],[20],[],[],
-#            27 28 29   30   31   32 33
-             [],[],[28],[28],[28],[],[32],
-#            34  35  36  37  38  39
-             [1],[1],[1],[1],[1],[],
-#            40 41   42
-             [],[40],[40] ]
-
 # Argument parser and help text.
 parser=argparse.ArgumentParser(description='Script to query an ESP-r model for various data.\n'
                                            'Assumes default model directory setup.\n'
@@ -153,6 +49,13 @@ parser=argparse.ArgumentParser(description='Script to query an ESP-r model for v
                                formatter_class=argparse.RawTextHelpFormatter)
 parser.add_argument('-o','--output-file',
                     help='write outputs to OUTPUT_FILE instead of stdout')
+parser.add_argument('-f','--format',
+                    choices=['text','json','shell'],
+                    default='text',
+                    help='output format:\n'
+                         ' text  = identifier=value lines (default)\n'
+                         ' json  = a JSON object of identifier:value, with lists as arrays\n'
+                         ' shell = bash assignments, with lists as arrays, to be loaded with "source" or "eval"')
 parser.add_argument('CFG_FILE',
                     help='the .cfg file of the model to be queried')
 parser.add_argument('OUTPUTS',
@@ -211,950 +114,72 @@ args=parser.parse_args()
 s_outputFile=args.output_file
 s_inCfgFile=args.CFG_FILE
 ls_inOutputs=args.OUTPUTS
+s_format=args.format
 
 # Open output file if required.
 curDateTime=datetime.now()
 s_dateTime=curDateTime.strftime('%a %b %d %X %Y')
 s='*** esp-query output for model "'+s_inCfgFile+'" @ '+s_dateTime+' ***\n'   
+if s_format=='shell': s='# '+s
 if s_outputFile: 
     f_output=open(s_outputFile,'w')
-    f_output.write(s+'\n')
-else:
+    if not s_format=='json': f_output.write(s+'\n')
+elif not s_format=='json':
     print(s)
 
-# Set arrays for required outputs.
-i_numOutputs=len(ls_outputs)
-lb_outputs=[False]*i_numOutputs
-lb_display=[False]*i_numOutputs
-li_order=[0]*i_numOutputs
-for i,s_output in enumerate(ls_outputs):
-    if s_output in ls_inOutputs: 
-        lb_outputs[i]=True
-        lb_display[i]=True
-        if len(lli_needs[i])>0:
-            for i_need in lli_needs[i]:
-                lb_outputs[i_need]=True
-        li_order[i]=ls_inOutputs.index(s_output)
-ls_outputVals=['']*i_numOutputs
-ls_outputText=['']*len(ls_inOutputs)
-
-# Get path to model files and open cfg file.
-s_cfgPath,s_cfgFile=path.split(s_inCfgFile)
-if s_cfgPath=='': s_cfgPath='.'
-f_cfg=open(s_cfgPath+'/'+s_cfgFile,'r')
-
-# Initialise.
-if lb_outputs[5]: i_numZonesDone=0
-
-# Scan cfg file.
-i_countdown=-1
-i_countdown2=-1
-b_ctl=False
-b_vwf=False
-b_cfd=False
-i_afn=0
-i_plant=0
-i_pcomp=0
-i_numZonesDone=0
-for s_line in f_cfg:
-    s_line=s_line.strip()
-    ls_line=s_line.split()
-
-    if i_countdown>=0: i_countdown=i_countdown-1
-    if i_countdown2>=0: i_countdown2=i_countdown2-1
-
-    # Get model name.
-    i_ind=0
-    if lb_outputs[i_ind]:
-        if ls_line[0]=='*root':
-            s=ls_outputs[i_ind]+'='+ls_line[1]
-            ls_outputVals[i_ind]=s
-            lb_outputs[i_ind]=False
-
-    # Get number of zones.
-    i_ind=1
-    if lb_outputs[i_ind]:
-        if ls_line[0:2]==['*','Building']:
-            i_countdown=2
-        elif i_countdown==0:
-            s=ls_outputs[i_ind]+'='+ls_line[0]
-            ls_outputVals[i_ind]=s
-            lb_outputs[i_ind]=False
-
-    # Get model description.
-    i_ind=4
-    if lb_outputs[i_ind]:
-        if ls_line[0:2]==['*','Building']:
-            i_countdown2=1
-        elif i_countdown2==0:
-            s=ls_outputs[i_ind]+'='+' '.join(ls_line)
-            ls_outputVals[i_ind]=s
-            lb_outputs[i_ind]=False
-
-    # Keep track of how many zones we've scanned and the zone index.
-    # These should be the same.
-    if ls_line[0]=='*zon':
-        i_numZonesDone+=1
-        s_zonInd=ls_line[1]
-        assert int(s_zonInd)==i_numZonesDone
-
-    # Get zone names.
-    # Assumes that we already have number of zones.
-    i_ind=5
-    if lb_outputs[i_ind]:
-        if ls_line[0]=='*geo':
-            s_geo=s_cfgPath+'/'+ls_line[1]
-            f_geo=open(s_geo,'r')
-            s='#'
-            while s[0]=='#':
-                s=f_geo.readline()            
-            f_geo.close()
-            s=s.strip()
-            s=s.split('#')[0]
-            s_tmp=s.split()[0]
-            if s_tmp=='*Geometry':
-                # old geo file            
-                s=s.split(',')[2]
-            elif s_tmp=='GEN':
-                # new geo file
-                s=s.split()[1]
-            else:
-                sys.stderr.write('esp-query error: unrecognised format in file '+s_geo+'\n')
-                sys.exit(1)
-            s=s.strip()
-            if i_numZonesDone==1:
-                ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+s
-            else:
-                ls_outputVals[i_ind]=ls_outputVals[i_ind]+','+s
-            if i_numZonesDone==int(ls_outputVals[lli_needs[i_ind][0]].split('=')[1]): lb_outputs[i_ind]=False
-
-    # Get zone floor surface numbers.
-    # Assumes that we already have number of zones.
-    i_ind=7
-    if lb_outputs[i_ind]:
-        if ls_line[0]=='*geo':
-            s_geo=s_cfgPath+'/'+ls_line[1]
-            f_geo=open(s_geo,'r')
-            s='#'
-            while not s[0:10]=='*base_list':
-                try:
-                    s=f_geo.readline()
-                    if s=='':
-                        sys.stderr.write('esp-query error: could not find base list in file '+s_geo+'\n')
-                        sys.exit(1)
-                except:
-                    sys.stderr.write('esp-query error: unrecognised format in file '+s_geo+'\n')
-                    sys.exit(1)
-            f_geo.close()
-            s=s.strip()
-            s=s.split('#')[0]
-            ls=s.split(',')
-            if ls[1]=='0':
-                sys.stderr.write('esp-query warning: unable to find floor surface for zone '+str(i_numZonesDone)+'\n')
-                s='0'
-            else:
-                s=','.join(ls[2:2+int(ls[1])])
-
-            if i_numZonesDone==1: ls_outputVals[i_ind]=ls_outputs[i_ind]+':\n'
-            ls_outputVals[i_ind]=ls_outputVals[i_ind]+'  zone#'+str(i_numZonesDone)+'='+s+'\n'
-            if i_numZonesDone==int(ls_outputVals[lli_needs[i_ind][0]].split('=')[1]): lb_outputs[i_ind]=False
-
-    # Get number of MRT sensors.
-    # Assumes that we already have number of zones.
-    i_ind=6
-    if lb_outputs[i_ind]:
-        if ls_line[0]=='*zon':
-            b_vwf=True
-        elif b_vwf and ls_line[0]=='*ivf':
-            f_vwf=open(s_cfgPath+'/'+ls_line[1],'r')
-            ls=getLine(f_vwf,5)
-            f_vwf.close()
-            s=ls[0]
-            if i_numZonesDone==1:
-                ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+s
-            else:
-                ls_outputVals[i_ind]=ls_outputVals[i_ind]+','+s
-            if i_numZonesDone==int(ls_outputVals[lli_needs[i_ind][0]].split('=')[1]): lb_outputs[i_ind]=False
-
-            # Get MRT sensor names.
-            ii_ind=19
-            if lb_outputs[ii_ind]:
-                f_vwf=open(s_cfgPath+'/'+ls_line[1],'r')
-                i=0
-                i_countdown1=0
-                i_countdown2=0
-                active1=0
-                active2=0
-                ls2=[]
-                j=0
-                ls3=[]
-                for s_line in f_vwf:
-                    i+=1
-                    if i_countdown1>0:
-                        i_countdown1-=1
-                        if i_countdown1==0: active1=1
-                    if i_countdown2>0:
-                        i_countdown2-=1
-                        if i_countdown2==0: active2=1
-                    if i==5:
-                        ls=s_line.strip().split()
-                        i_nsen=int(ls[0])
-                        i_nsur=int(ls[1])
-                    elif s_line.strip()=='*MRT_SENSOR':
-                        i_countdown1=2
-                    elif active1:
-                        ls=s_line.strip().split()
-                        ls2.append(ls[8])
-                        if len(ls2)==i_nsen: 
-                            break
-                        active1=0
-                    elif s_line.strip()=='*MRTVIEW':
-                        i_countdown2=1
-                    elif active2:
-                        ls4=s_line.strip().split(',')
-                        if ls4[-1]=='': 
-                            ls4.pop()
-                        ls3+=ls4
-                        if len(ls3)==i_nsur:
-                            ls3=[]
-                            j+=1
-                            if j==6: 
-                                active1=1
-                                active2=0
-                                j=0
-
-                f_vwf.close()
-                s2=','.join(ls2)
-                if i_numZonesDone==1: ls_outputVals[ii_ind]=ls_outputs[ii_ind]+':\n'
-                ls_outputVals[ii_ind]=ls_outputVals[ii_ind]+'  zone#'+str(i_numZonesDone)+'='+s2+'\n'
-                if i_numZonesDone==int(ls_outputVals[lli_needs[ii_ind][0]].split('=')[1]): lb_outputs[ii_ind]=False
-
-            b_vwf=False
-
-        elif b_vwf and ls_line[0]=='*zend':
-            s='0'
-            if i_numZonesDone==1:
-                ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+s
-            else:
-                ls_outputVals[i_ind]=ls_outputVals[i_ind]+','+s
-            if i_numZonesDone==int(ls_outputVals[lli_needs[i_ind][0]].split('=')[1]): lb_outputs[i_ind]=False
-
-            ii_ind=19
-            if lb_outputs[ii_ind]:
-                s2=''
-                if i_numZonesDone==1: ls_outputVals[ii_ind]=ls_outputs[ii_ind]+':\n'
-                ls_outputVals[ii_ind]=ls_outputVals[ii_ind]+'  zone#'+str(i_numZonesDone)+'='+s2+'\n'
-                if i_numZonesDone==int(ls_outputVals[lli_needs[ii_ind][0]].split('=')[1]): lb_outputs[ii_ind]=False
-
-            b_vwf=False
-
-    # Get CFD domain files.
-    i_ind=18
-    if lb_outputs[i_ind]:       
-        if ls_line[0]=='*zon':
-            b_cfd=True
-        elif b_cfd and ls_line[0]=='*cfd':
-            s=s_cfgPath+'/'+ls_line[1]
-            if i_numZonesDone==1:
-                ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+s
-            else:
-                ls_outputVals[i_ind]=ls_outputVals[i_ind]+','+s
-            if i_numZonesDone==int(ls_outputVals[lli_needs[i_ind][0]].split('=')[1]): lb_outputs[i_ind]=False
-            b_cfd=False
-        elif b_cfd and ls_line[0]=='*zend':
-            s=''
-            if i_numZonesDone==1:
-                ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+s
-            else:
-                ls_outputVals[i_ind]=ls_outputVals[i_ind]+','+s
-            if i_numZonesDone==int(ls_outputVals[lli_needs[i_ind][0]].split('=')[1]): lb_outputs[i_ind]=False
-            b_cfd=False
-
-    # Get CFD domain indicators.
-    i_ind=2
-    if lb_outputs[i_ind]:  
-        if not lb_outputs[lli_needs[i_ind][1]]:
-            ls_outputVals[i_ind]=ls_outputs[i_ind]+'='
-            s=''
-            for s_cfd in ls_outputVals[lli_needs[i_ind][1]].split('=')[1].split(','):
-                if len(s_cfd)==0:
-                    s='0'
-                else:
-                    f_cfd=open(s_cfd,'r')
-                    ls=getLine(f_cfd,2)
-                    f_cfd.close()
-                    if ls[1]=='0': s='1'
-                    else: s='2'
-                ls_outputVals[i_ind]=ls_outputVals[i_ind]+s+','
-            if len(s)>0: ls_outputVals[i_ind]=ls_outputVals[i_ind][:-1]
-            lb_outputs[i_ind]=False
-
-    # Get CFD contaminants.
-    i_ind=17
-    if lb_outputs[i_ind]:  
-        if not lb_outputs[lli_needs[i_ind][1]]:
-            ls_outputVals[i_ind]=ls_outputs[i_ind]+':\n'
-            i_zn=0
-            for s_cfd in ls_outputVals[lli_needs[i_ind][1]].split('=')[1].split(','):
-                i_zn+=1
-                if len(s_cfd)==0:
-                    s=''
-                else:
-                    f_cfd=open(s_cfd,'r')
-                    i_numContam=0
-                    s=''
-                    for s_cfdLine in f_cfd:
-                        ls_cfdLine=s_cfdLine.strip().split()
-                        if ls_cfdLine[0]=='*contaminants(':
-                            i_numContam=int(ls_cfdLine[1])
-                            if i_numContam==0: 
-                                s='none'
-                                break
-                        elif i_numContam>0:
-                            s=s+ls_cfdLine[0]+','
-                            i_numContam-=1
-                            if i_numContam==0:
-                                s=s[:-1]
-                                break
-                    f_cfd.close()
-                ls_outputVals[i_ind]=ls_outputVals[i_ind]+'  zone#'+str(i_zn)+'='+s+'\n'
-            lb_outputs[i_ind]=False
-
-    # Get radiance viewpoint names.
-    i_ind=8
-    if lb_outputs[i_ind]:
-        if ls_line[0]=='*rif':
-            s_rcf=ls_line[1]
-            f_rcf=open(s_cfgPath+'/'+s_rcf,'r')
-            ls=getLine(f_rcf,5)
-            f_rcf.close()
-            assert ls[0]=='*rnm'
-            f_rif=open(s_cfgPath+'/'+path.split(s_rcf)[0]+'/'+ls[1],'r')
-            first=1
-            for s_line in f_rif:
-                ls=s_line.split()
-                if ls[0]=='view=':
-                    if first:
-                        ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+ls[1]
-                        first=0
-                    else:                        
-                        ls_outputVals[i_ind]=ls_outputVals[i_ind]+','+ls[1]
-            f_rif.close()
-            lb_outputs[i_ind]=False
-
-    # Get radiance scene name.
-    i_ind=9
-    if lb_outputs[i_ind]:
-        if ls_line[0]=='*rif':
-            s_rcf=ls_line[1]
-            f_rcf=open(s_cfgPath+'/'+s_rcf,'r')
-            ls=getLine(f_rcf,7)
-            f_rcf.close()
-            assert ls[0]=='*srt'
-            ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+ls[1]
-            lb_outputs[i_ind]=False
-
-    # Get window constructions.
-    i_ind=10
-    if lb_outputs[i_ind]:
-        if ls_line[0]=='*geo':
-            s_geo=s_cfgPath+'/'+ls_line[1]
-            f_geo=open(s_geo,'r')
-            s='#'
-            while not s[0:5]=='*surf':
-                try:
-                    s=f_geo.readline()
-                    if s=='':
-                        sys.stderr.write('esp-query: could not find surfaces in file '+s_geo+'\n')
-                        sys.exit(1)
-                except:
-                    sys.stderr.write('esp-query error: unrecognised format in file '+s_geo+'\n')
-                    sys.exit(1)
-
-            i_surf=0
-            first=1
-            if i_numZonesDone==1:
-                ls_outputVals[i_ind]=ls_outputs[i_ind]+':\n'
-            s2=s
-            while True:
-                i_surf+=1
-                if s2[0:5]!='*surf': break
-                s=s2.strip()
-                s=s.split('#')[0]
-                ls=s.split(',')
-                s2=f_geo.readline()
-                if ls[7]=='OPAQUE' or ls[8]!='EXTERIOR': continue
-                s=str(i_surf)
-
-                if first:
-                    first=0
-                    ls_outputVals[i_ind]=ls_outputVals[i_ind]+'  zone#'+str(i_numZonesDone)+'='+s
-                else:
-                    ls_outputVals[i_ind]=ls_outputVals[i_ind]+','+s    
-
-            if first:
-                ls_outputVals[i_ind]=ls_outputVals[i_ind]+'  zone#'+str(i_numZonesDone)+'=none'
-
-            ls_outputVals[i_ind]=ls_outputVals[i_ind]+'\n'
-
-            if i_numZonesDone==int(ls_outputVals[lli_needs[i_ind][0]].split('=')[1]): 
-                lb_outputs[i_ind]=False
-
-            f_geo.close()
-
-    # Get air flow network.
-    i_ind=11
-    if lb_outputs[i_ind]:
-        if ls_line[0]=='*cnn':
-            i_afn=1
-        elif i_afn==1:
-            if ls_line[0]=='0':
-                ls_outputVals[i_ind]=ls_outputs[i_ind]+'='
-                lb_outputs[i_ind]=False
-            elif ls_line[0]=='1':
-                i_afn=2
-                i_afntyp=1
-            elif ls_line[0]=='3':
-                i_afn=2
-                i_afntyp=3
-        elif i_afn==2:
-            ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+ls_line[0]
-            lb_outputs[i_ind]=False
-
-    # Get contaminant network.
-    i_ind=12
-    if lb_outputs[i_ind]:
-        if ls_line[0]=='*ctm':
-            ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+ls_line[1]
-            lb_outputs[i_ind]=False
-
-    # Get number of contaminants.
-    i_ind=13
-    if lb_outputs[i_ind]:
-        if not lb_outputs[lli_needs[i_ind][0]]:
-            s_ctm=s_cfgPath+'/'+ls_outputVals[lli_needs[i_ind][0]].split('=')[1]
-            f_ctm=open(s_ctm,'r')
-            ls=getLine(f_ctm,5)
-            f_ctm.close()
-            ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+ls[0]
-            lb_outputs[i_ind]=False
-
-    # Get AFN zone node names.
-    i_ind=14
-    if lb_outputs[i_ind]:
-        if not lb_outputs[lli_needs[i_ind][0]]:
-            if i_afn==2:
-                i_afn=3
-            elif i_afn==3:
-                ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+ls_line[0]
-                i_afn+=1
-            elif i_afn>3:
-                ls_outputVals[i_ind]=ls_outputVals[i_ind]+ls_line[0]
-
-    # Get AFN zone node indices.
-    i_ind=15
-    if lb_outputs[i_ind]:
-        if i_afn>3:
-            ls_afnNods=ls_outputVals[lli_needs[i_ind][1]].split('=')[1].split(',')
-            s_afn=s_cfgPath+'/'+ls_outputVals[lli_needs[i_ind][0]].split('=')[1]
-            f_afn=open(s_afn,'r')
-            i_numNods=len(ls_afnNods)
-            ls_nodNums=['0']*i_numNods
-            ls_afnNods_tmp=ls_afnNods[:]
-            if i_afntyp==1:
-                i_nodNum=0
-                for s_line2 in f_afn:
-                    if s_line2[0:70]==' Node         Fld. Type   Height    Temperature    Data_1       Data_2':
-                        i_nodNum=1
-    #                elif s_line2[0:36]==' Component    Type C+ L+ Description':
-    #                    sys.stderr.write('esp-query error: could not find all AFN zone nodes in network\n')
-    #                    sys.exit(1)                    
-                    elif i_nodNum:
-                        ls_line2=s_line2.strip().split()
-                        if ls_line2[0] in ls_afnNods_tmp:
-                            ls_nodNums[ls_afnNods.index(ls_line2[0])]=(str(i_nodNum))
-                            ls_afnNods_tmp.remove(ls_line2[0])
-                            if len(ls_afnNods_tmp)==0:
-                                ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+','.join(ls_nodNums)
-                                break
-                        i_nodNum+=1
-            elif i_afntyp==3:
-                i_nodNum=1
-                for s_line2 in f_afn:
-                    if s_line2[0:5]=='*node':
-                        ls_line2=s_line2.strip().split(',')
-                        if ls_line2[1] in ls_afnNods_tmp:
-                            ls_nodNums[ls_afnNods.index(ls_line2[1])]=(str(i_nodNum))
-                            ls_afnNods_tmp.remove(ls_line2[1])
-                            if len(ls_afnNods_tmp)==0:
-                                ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+','.join(ls_nodNums)
-                                break
-                        i_nodNum+=1
-
-            f_afn.close()
-
-    # Get zone control flag.
-    i_ind=16
-    if lb_outputs[i_ind]:
-        if ls_line[0]=='*ctl':
-            s_ctl=s_cfgPath+'/'+ls_line[1]
-            ls_outputVals[i_ind]=ls_outputs[i_ind]+'=1'
-            lb_outputs[i_ind]=False
-        
-
-    # Get zone control setpoints.
-    i_ind=3
-    if lb_outputs[i_ind]:
-        if not lb_outputs[lli_needs[i_ind][0]] and ls_outputVals[lli_needs[i_ind][0]].split('=')[1]=='1':
-            if ls_line[0]=='*list':
-                i_numDayTypes=int(ls_line[1])
-                f_ctl=open(s_ctl,'r')
-                s=get_zone_setpoints(f_ctl,i_numDayTypes)
-                ls_outputVals[i_ind]=s
-                lb_outputs[i_ind]=False
-
-    # Get tdfa file.
-    i_ind=20
-    if lb_outputs[i_ind]:
-        if ls_line[0]=='*tdf':
-            s_tdfa=s_cfgPath+'/'+ls_line[1]
-            ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+ls_line[1]
-            lb_outputs[i_ind]=False
-
-    # Get tdfa time step.
-    i_ind=21
-    if lb_outputs[i_ind]:
-        if not lb_outputs[lli_needs[i_ind][0]]:
-            f_tdfa=open(s_tdfa,'r')
-            ls_tdfa=getLine(f_tdfa,3)
-            ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+ls_tdfa[2]
-            lb_outputs[i_ind]=False
-            f_tdfa.close()
-
-    # Get tdfa start day.
-    i_ind=22
-    if lb_outputs[i_ind]:
-        if not lb_outputs[lli_needs[i_ind][0]]:
-            f_tdfa=open(s_tdfa,'r')
-            ls_tdfa=getLine(f_tdfa,3)
-            ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+ls_tdfa[4]
-            lb_outputs[i_ind]=False
-            f_tdfa.close()
-
-    # Get tdfa end day.
-    i_ind=23
-    if lb_outputs[i_ind]:
-        if not lb_outputs[lli_needs[i_ind][0]]:
-            f_tdfa=open(s_tdfa,'r')
-            ls_tdfa=getLine(f_tdfa,3)
-            ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+ls_tdfa[5]
-            lb_outputs[i_ind]=False
-            f_tdfa.close()
-
-    # Get number of tdfa entities.
-    i_ind=24
-    if lb_outputs[i_ind]:
-        if not lb_outputs[lli_needs[i_ind][0]]:
-            f_tdfa=open(s_tdfa,'r')
-            ls_tdfa=getLine(f_tdfa,3)
-            ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+ls_tdfa[1]
-            lb_outputs[i_ind]=False
-            f_tdfa.close()
-
-    # Get uncertainties file.
-    i_ind=25
-    if lb_outputs[i_ind]:
-        if ls_line[0]=='*ual':
-            s_ual=s_cfgPath+'/'+ls_line[1]
-            ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+ls_line[1]
-            lb_outputs[i_ind]=False
-
-    # Get number of simulation presets.
-    i_ind=26
-    if lb_outputs[i_ind]:
-        if ls_line[0]=='*sps':
-            ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+ls_line[1]
-            lb_outputs[i_ind]=False
-
-    # Get weather file.
-    i_ind=27
-    if lb_outputs[i_ind]:
-        if ls_line[0]=='*clm':
-            ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+ls_line[1]
-            lb_outputs[i_ind]=False
-        elif ls_line[0]=='*stdclm':
-            # Get climate location from .esprc file.
-            f_esprc=open(Path.home() / '.esprc','r')
-            for s_line2 in f_esprc:
-                ls_line2=s_line2.strip().split(',')
-                if ls_line2[0]=='*db_climates':
-                    s_clmpath=str(Path(ls_line2[2]).parent)
-                    break
-            f_esprc.close()
-            ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+s_clmpath+'/'+ls_line[1]
-            lb_outputs[i_ind]=False
-
-    # Get QA file.
-    i_ind=28
-    if lb_outputs[i_ind]:
-        if ls_line[0]=='*contents':
-            s_QA=s_cfgPath+'/'+ls_line[1]
-            ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+ls_line[1]
-            lb_outputs[i_ind]=False
-
-    # Get total floor area.
-    i_ind=29
-    if lb_outputs[i_ind]:
-        if not lb_outputs[lli_needs[i_ind][0]]:
-            f_QA=open(s_QA,'r')
-            b=False
-            for s_line2 in f_QA:
-                s_line2=s_line2.strip()
-                if s_line2=='Name         m^3   | No. Opaque  Transp  ~Floor':
-                    b=True
-                elif b:
-                    ls_line2=s_line2.split()
-                    if ls_line2[0]=='all':
-                        ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+ls_line2[5]
-                        lb_outputs[i_ind]=False
-                        break
-            f_QA.close()
-
-    # Get total volume.
-    i_ind=30
-    if lb_outputs[i_ind]:
-        if not lb_outputs[lli_needs[i_ind][0]]:
-            f_QA=open(s_QA,'r')
-            b=False
-            for s_line2 in f_QA:
-                s_line2=s_line2.strip()
-                if s_line2=='Name         m^3   | No. Opaque  Transp  ~Floor':
-                    b=True
-                elif b:
-                    ls_line2=s_line2.split()
-                    if ls_line2[0]=='all':
-                        ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+ls_line2[1]
-                        lb_outputs[i_ind]=False
-                        break            
-            f_QA.close()
-
-    # Get zone volumes.
-    i_ind=31
-    if lb_outputs[i_ind]:
-        if not lb_outputs[lli_needs[i_ind][0]]:
-            f_QA=open(s_QA,'r')
-            b=False
-            ls=[]
-            for s_line2 in f_QA:
-                s_line2=s_line2.strip()
-                if s_line2=='Name         m^3   | No. Opaque  Transp  ~Floor':
-                    b=True
-                elif b:
-                    ls_line2=s_line2.split()
-                    if ls_line2[0]=='all':
-                        ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+','.join(ls)
-                        lb_outputs[i_ind]=False
-                        break
-                    else:
-                        ls.append(ls_line2[2])            
-            f_QA.close()
-
-    # Get FMI config file.
-    i_ind=32
-    if lb_outputs[i_ind]:
-        if ls_line[0]=='*FMI':
-            s_FMI=s_cfgPath+'/'+ls_line[1]
-            ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+ls_line[1]
-            lb_outputs[i_ind]=False
-
-    # Get FMU names.
-    i_ind=33
-    if lb_outputs[i_ind]:
-        if not lb_outputs[lli_needs[i_ind][0]]:
-            f_FMI=open(s_FMI,'r')
-            b_first=True
-            for s_line2 in f_FMI:
-                ls_line2=s_line2.strip().split()
-                if ls_line2[0]=='*FileName':
-                    if b_first:
-                        ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+ls_line2[1]
-                        b_first=False
-                    else:
-                        ls_outputVals[i_ind]=ls_outputs[i_ind]+','+ls_line2[1]
-            lb_outputs[i_ind]=False
-            f_FMI.close()
-
-    # Get number of toilets in each zone.
-    # Assumes that we already have number of zones.
-    i_ind=34
-    if lb_outputs[i_ind]:
-        if ls_line[0]=='*zon':
-            b_toilet=True
-
-        elif b_toilet and ls_line[0]=='*geo':
-            f_toilet=open(s_cfgPath+'/'+ls_line[1],'r')
-            i_toilet=0
-            for s_line2 in f_toilet:
-                ls_line2=s_line2.strip().split(',')
-                if ls_line2[0]=='*vobject':
-                    if 'toilet' in ls_line2[1]: i_toilet+=1
-            f_toilet.close()
-            s=str(i_toilet)
-            if i_numZonesDone==1:
-                ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+s
-            else:
-                ls_outputVals[i_ind]=ls_outputVals[i_ind]+','+s
-            if i_numZonesDone==int(ls_outputVals[lli_needs[i_ind][0]].split('=')[1]): lb_outputs[i_ind]=False
-            b_toilet=False
-
-        elif b_toilet and ls_line[0]=='*zend':
-            s='0'
-            if i_numZonesDone==1:
-                ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+s
-            else:
-                ls_outputVals[i_ind]=ls_outputVals[i_ind]+','+s
-            if i_numZonesDone==int(ls_outputVals[lli_needs[i_ind][0]].split('=')[1]): lb_outputs[i_ind]=False
-            b_toilet=False
-
-    # Get number of urinals in each zone.
-    # Assumes that we already have number of zones.
-    i_ind=35
-    if lb_outputs[i_ind]:
-        if ls_line[0]=='*zon':
-            b_urinal=True
-            
-        elif b_urinal and ls_line[0]=='*geo':
-            f_urinal=open(s_cfgPath+'/'+ls_line[1],'r')
-            i_urinal=0
-            for s_line2 in f_urinal:
-                ls_line2=s_line2.strip().split(',')
-                if ls_line2[0]=='*vobject':
-                    if 'urinal' in ls_line2[1]: i_urinal+=1
-            f_urinal.close()
-            s=str(i_urinal)
-            if i_numZonesDone==1:
-                ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+s
-            else:
-                ls_outputVals[i_ind]=ls_outputVals[i_ind]+','+s
-            if i_numZonesDone==int(ls_outputVals[lli_needs[i_ind][0]].split('=')[1]): lb_outputs[i_ind]=False
-            b_urinal=False
-
-        elif b_urinal and ls_line[0]=='*zend':
-            s='0'
-            if i_numZonesDone==1:
-                ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+s
-            else:
-                ls_outputVals[i_ind]=ls_outputVals[i_ind]+','+s
-            if i_numZonesDone==int(ls_outputVals[lli_needs[i_ind][0]].split('=')[1]): lb_outputs[i_ind]=False
-            b_urinal=False
-
-    # Get number of showers in each zone.
-    # Assumes that we already have number of zones.
-    i_ind=36
-    if lb_outputs[i_ind]:
-        if ls_line[0]=='*zon':
-            b_shower=True
-            
-        elif b_shower and ls_line[0]=='*geo':
-            f_shower=open(s_cfgPath+'/'+ls_line[1],'r')
-            i_shower=0
-            for s_line2 in f_shower:
-                ls_line2=s_line2.strip().split(',')
-                if ls_line2[0]=='*vobject':
-                    if 'shower' in ls_line2[1]: i_shower+=1
-            f_shower.close()
-            s=str(i_shower)
-            if i_numZonesDone==1:
-                ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+s
-            else:
-                ls_outputVals[i_ind]=ls_outputVals[i_ind]+','+s
-            if i_numZonesDone==int(ls_outputVals[lli_needs[i_ind][0]].split('=')[1]): lb_outputs[i_ind]=False
-            b_shower=False
-
-        elif b_shower and ls_line[0]=='*zend':
-            s='0'
-            if i_numZonesDone==1:
-                ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+s
-            else:
-                ls_outputVals[i_ind]=ls_outputVals[i_ind]+','+s
-            if i_numZonesDone==int(ls_outputVals[lli_needs[i_ind][0]].split('=')[1]): lb_outputs[i_ind]=False
-            b_shower=False
-
-    # Get number of printers in each zone.
-    # Assumes that we already have number of zones.
-    i_ind=37
-    if lb_outputs[i_ind]:
-        if ls_line[0]=='*zon':
-            b_printer=True
-            
-        elif b_printer and ls_line[0]=='*geo':
-            f_printer=open(s_cfgPath+'/'+ls_line[1],'r')
-            i_printer=0
-            for s_line2 in f_printer:
-                ls_line2=s_line2.strip().split(',')
-                if ls_line2[0]=='*vobject':
-                    if 'printer' in ls_line2[1]: i_printer+=1
-            f_printer.close()
-            s=str(i_printer)
-            if i_numZonesDone==1:
-                ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+s
-            else:
-                ls_outputVals[i_ind]=ls_outputVals[i_ind]+','+s
-            if i_numZonesDone==int(ls_outputVals[lli_needs[i_ind][0]].split('=')[1]): lb_outputs[i_ind]=False
-            b_printer=False
-
-        elif b_printer and ls_line[0]=='*zend':
-            s='0'
-            if i_numZonesDone==1:
-                ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+s
-            else:
-                ls_outputVals[i_ind]=ls_outputVals[i_ind]+','+s
-            if i_numZonesDone==int(ls_outputVals[lli_needs[i_ind][0]].split('=')[1]): lb_outputs[i_ind]=False
-            b_printer=False
-
-    # Get number of photocopiers in each zone.
-    # Assumes that we already have number of zones.
-    i_ind=38
-    if lb_outputs[i_ind]:
-        if ls_line[0]=='*zon':
-            b_photocopy=True
-            
-        elif b_photocopy and ls_line[0]=='*geo':
-            f_photocopy=open(s_cfgPath+'/'+ls_line[1],'r')
-            i_photocopy=0
-            for s_line2 in f_photocopy:
-                ls_line2=s_line2.strip().split(',')
-                if ls_line2[0]=='*vobject':
-                    if 'photocopy' in ls_line2[1]: i_photocopy+=1
-            f_photocopy.close()
-            s=str(i_photocopy)
-            if i_numZonesDone==1:
-                ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+s
-            else:
-                ls_outputVals[i_ind]=ls_outputVals[i_ind]+','+s
-            if i_numZonesDone==int(ls_outputVals[lli_needs[i_ind][0]].split('=')[1]): lb_outputs[i_ind]=False
-            b_photocopy=False
-
-        elif b_photocopy and ls_line[0]=='*zend':
-            s='0'
-            if i_numZonesDone==1:
-                ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+s
-            else:
-                ls_outputVals[i_ind]=ls_outputVals[i_ind]+','+s
-            if i_numZonesDone==int(ls_outputVals[lli_needs[i_ind][0]].split('=')[1]): lb_outputs[i_ind]=False
-            b_photocopy=False
-
-    # Get building flag.
-    i_ind=39
-    if lb_outputs[i_ind]:
-        if ls_line[0:2]==['*','Building']:
-            ls_outputVals[i_ind]=ls_outputs[i_ind]+'=1'
-            lb_outputs[i_ind]=False
-
-    # Get plant network.
-    i_ind=40
-    if lb_outputs[i_ind]:
-        if ls_line[0:2]==['*','Plant']:
-            i_plant=1
-        elif i_plant==1:
-            s_plant=s_cfgPath+'/'+ls_line[0]
-            ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+s_plant
-            lb_outputs[i_ind]=False
-            i_plant=0
-
-    # Get plant components names and / or numbers.
-    i_ind=41
-    i_ind2=42
-    if lb_outputs[i_ind] or lb_outputs[i_ind2]:
-        if not lb_outputs[lli_needs[i_ind][0]]:
-            i_pcomp=-3
-            n_pcomp=0
-            b_pcomp=False
-            f_plant=open(s_plant,'r')
-            do_m=True
-            for s_line2 in f_plant:
-                ls_line2=s_line2.strip().split()
-                if s_line2[0]!='#': i_pcomp+=1
-                # print(i_pcomp,s_line2)
-                if do_m and i_pcomp==0:
-                    m_pcomp=int(ls_line2[0])
-                    do_m=False
-                elif ls_line2[0]=='#->':
-                    b_pcomp=True
-                    n_pcomp+=1
-                elif b_pcomp:
-                    b_pcomp=False
-                    if lb_outputs[i_ind]:
-                        if i_pcomp==1:
-                            ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+ls_line2[1]
-                        else:
-                            ls_outputVals[i_ind]=ls_outputVals[i_ind]+','+ls_line2[1]
-                    if lb_outputs[i_ind2]:
-                        if i_pcomp==1:
-                            ls_outputVals[i_ind2]=ls_outputs[i_ind2]+'='+ls_line2[0]
-                        else:
-                            ls_outputVals[i_ind2]=ls_outputVals[i_ind2]+','+ls_line2[0]
-                    if n_pcomp==m_pcomp:
-                        if lb_outputs[i_ind]: lb_outputs[i_ind]=False
-                        if lb_outputs[i_ind2]: lb_outputs[i_ind2]=False
-                        break
-            f_plant.close()
-
-
-
-f_cfg.close()
-
-# Function to add an entry if an item has not been found.
-# if "entry" is not defined, will add a blank entry.
-def addBlank(i_ind,s_entry=''):
-    if lb_outputs[i_ind]:
-        ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+s_entry
-        lb_outputs[i_ind]=False
-
-addBlank(12)
-addBlank(13)
-if lb_outputs[14]:
-    if ls_outputVals[14]=='':
-        addBlank(14)
-        if lb_outputs[15]: addBlank(15)
-    else:
-        lb_outputs[14]=False
-        if lb_outputs[15]: lb_outputs[15]=False
-        
-if lb_outputs[lli_needs[3][0]]: addBlank(3)
-addBlank(16,s_entry='0')
-addBlank(20)
-addBlank(21)
-addBlank(22)
-addBlank(23)
-addBlank(24)
-addBlank(25)
-addBlank(26,s_entry='0')
-addBlank(28)
-addBlank(29)
-addBlank(30)
-addBlank(31)
-addBlank(32)
-addBlank(33)
-addBlank(39,s_entry='0')
-addBlank(40)
-addBlank(41)
-addBlank(42)
-
-# If any booleans remain, something has not been found - throw an error.
-if True in lb_outputs:
-    sys.stderr.write('esp-query error: some information could not be retrieved -\n')
-    li_errors=[a for a,b in enumerate(lb_outputs) if b]
-    for i in li_errors:
-        sys.stderr.write(ls_outputs[i]+'\n')
+# If ESPQUERY_CACHE_DIR is set to an existing directory, outputs are cached
+# there. They are keyed by the output format, the requested outputs and the
+# cfg file name, and the names, sizes and modification times of all files in
+# the model, so the cache is missed if the model has been changed.
+s_cacheFile=None
+s_cacheDir=environ.get('ESPQUERY_CACHE_DIR','')
+if not s_cacheDir=='' and path.isdir(s_cacheDir):
+    s_cfgPath,s_cfgFile=path.split(s_inCfgFile)
+    if s_cfgPath=='': s_cfgPath='.'
+    s_modelDir=path.dirname(path.abspath(s_cfgPath))
+    md5=hashlib.md5(('\n'.join([s_format,s_cfgFile]+ls_inOutputs)+'\n').encode())
+    for s_root,ls_dirs,ls_files in walk(s_modelDir):
+        ls_dirs.sort()
+        for s_file in sorted(ls_files):
+            s_file=path.join(s_root,s_file)
+            st=stat(s_file)
+            md5.update('{} {:d} {:d}\n'.format(path.relpath(s_file,s_modelDir),st.st_size,st.st_mtime_ns).encode())
+    s_cacheFile=s_cacheDir+'/'+md5.hexdigest()+'.txt'
+    if path.isfile(s_cacheFile):
+        f_cache=open(s_cacheFile,'r')
+        s=f_cache.read()
+        f_cache.close()
+        if s_outputFile:
+            f_output.write(s)
+        else:
+            print(s)
+        sys.exit(0)
+
+# Query model.
+try:
+    info=query_model(s_inCfgFile,ls_inOutputs)
+except EspQueryError as e:
+    sys.stderr.write('esp-query error: '+str(e)+'\n')
     sys.exit(1)
-else:
-# Write output.
-    for i,b in enumerate(lb_display):
-        if b:
-            ls_outputText[li_order[i]]=ls_outputVals[i]
-    if s_outputFile:
-        f_output.write('\n\n'.join(ls_outputText))
-    else:
-        print('\n\n'.join(ls_outputText))
 
+# Write output.
+if s_format=='json':
+    s=formatJSON(info)
+elif s_format=='shell':
+    s=formatShell(info)
+else:
+    s=info.all_text()
+if s_outputFile:
+    f_output.write(s)
+else:
+    print(s)
+# Cache outputs if required. Written under a temporary name and renamed,
+# so that other processes never read a partial file.
+if s_cacheFile:
+    try:
+        f_cache=open(s_cacheFile+'.'+str(getpid()),'w')
+        f_cache.write(s)
+        f_cache.close()
+        rename(s_cacheFile+'.'+str(getpid()),s_cacheFile)
+    except OSError:
+        pass
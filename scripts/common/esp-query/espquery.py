@@ -0,0 +1,1075 @@
+#! /usr/bin/env python3
+
+# v2.1a ESRU 2017
+
+# espquery.py
+# Library to query an ESP-r model for various data. esp-query.py is the
+# command line interface to this library; Python tools can import it and
+# query models in-process instead:
+#   from espquery import query_model
+#   info=query_model('model/cfg/model.cfg',['model_name','zone_names'])
+#   info.name -> 'model'
+#   [zone.name for zone in info.zones] -> ['zone1','zone2']
+#   info.text('zone_names') -> 'zone_names=zone1,zone2'
+# The cfg file is scanned once into a ModelInfo object, which holds the
+# files referenced by the model, grouped by zone, air flow network, CFD,
+# plant, tdfa and QA report. Only the files needed for the requested outputs
+# are then read (each file only once, however many outputs need it), and
+# their data are stored in the same objects.
+
+import sys
+from os import path
+from pathlib import Path
+
+# OUTPUT MAPPINGS
+# New outputs must be added here (also add help text in esp-query.py).
+#            0            1              2             3                4                   5            6
+ls_outputs=['model_name','number_zones','CFD_domains','zone_setpoints','model_description','zone_names','MRT_sensors',
+#            7                  8                9           10               11            12            13
+            'zone_floor_surfs','rad_viewpoints','rad_scene','zone_win_surfs','afn_network','ctm_network','number_ctm',
+#            14               15                 16             17                 18                 19
+            'afn_zone_nodes','afn_zon_nod_nums','zone_control','CFD_contaminants','CFD_domain_files','MRT_sensor_names',
+#            20          21              22              23            24              25                   26
+            'tdfa_file','tdfa_timestep','tdfa_startday','tdfa_endday','tdfa_entities','uncertainties_file','number_presets',
+#            27             28          29                 30             31             32                33
+            'weather_file','QA_report','total_floor_area','total_volume','zone_volumes','FMI_config_file','FMU_names',
+#            34               35               36               37                38                 39
+            'number_toilets','number_urinals','number_showers','number_printers','number_photocopy','is_building',
+#            40              41                 42
+            'plant_network','plant_components','plant_comp_names']
+# Prerequisites.
+#            0  1  2      3    4  5   6
+lli_needs= [ [],[],[1,18],[16],[],[1],[1],
+#            7   8  9  10  11 12 13
+             [1],[],[],[1],[],[],[12],
+#            14   15        16 17     18  19
+             [11],[11,14,1],[],[1,18],[1],[1,6],
+#            20 21   22   23   24   25 26
+             [],[20],[20],[20],[20],[],[],
+#            27 28 29   30   31   32 33
+             [],[],[28],[28],[28],[],[32],
+#            34  35  36  37  38  39
+             [1],[1],[1],[1],[1],[],
+#            40 41   42
+             [],[40],[40] ]
+
+# Visual object types counted for outputs 34 to 38.
+ls_vobjects=['toilet','urinal','shower','printer','photocopy']
+
+# Outputs that are comma separated lists, and outputs that are comma
+# separated lists for each zone. Other outputs are single values.
+ls_listOutputs=['CFD_domains','zone_names','MRT_sensors','rad_viewpoints','afn_zone_nodes','afn_zon_nod_nums',
+                'CFD_domain_files','zone_volumes','FMU_names','number_toilets','number_urinals','number_showers',
+                'number_printers','number_photocopy','plant_components','plant_comp_names']
+ls_zoneOutputs=['zone_floor_surfs','zone_win_surfs','CFD_contaminants','MRT_sensor_names']
+
+
+# CLASS EspQueryError
+# Raised if information cannot be retrieved from the model. The message is
+# in the form used by the command line interface.
+class EspQueryError(Exception):
+    pass
+# END CLASS
+
+
+# CLASS Zone
+# A thermal zone, with the files referenced for it in the cfg file, and the
+# data retrieved from them. Data attributes are None unless retrieved.
+class Zone:
+    def __init__(self,i_index):
+        self.index=i_index
+        # Files (paths as given in the cfg file).
+        self.geo_file=None
+        self.ivf_file=None
+        self.cfd_file=None
+        # True if the zone's *geo, *ivf or *cfd line came before its *zend line.
+        self.b_geoFirst=False
+        self.b_ivf=False
+        self.b_cfd=False
+        self.b_zend=False
+        # Data.
+        self.name=None
+        self.floor_surfs=None
+        self.win_surfs=None
+        self.mrt_sensors=None
+        self.mrt_sensor_names=None
+        self.cfd_domain=None
+        self.cfd_contaminants=None
+        self.vobjects=dict()
+# END CLASS
+
+
+# CLASS AirFlowNetwork
+# The air flow network referenced in the cfg file. type is the network type
+# flag (0 for none, 1 for old format, 3 for graphic format).
+class AirFlowNetwork:
+    def __init__(self):
+        self.type=None
+        self.file=None
+        self.zone_nodes=None
+        self.zone_node_numbers=None
+        # First item of each cfg line after the network file.
+        self.ls_nodeItems=[]
+# END CLASS
+
+
+# CLASS ContaminantNetwork
+class ContaminantNetwork:
+    def __init__(self,s_file):
+        self.file=s_file
+        self.number=None
+# END CLASS
+
+
+# CLASS Control
+# The control file, and the number of calendar day types (from the first
+# *list line after the *ctl line).
+class Control:
+    def __init__(self,s_file):
+        self.file=s_file
+        self.ls_list=None
+        self.setpoints=None
+# END CLASS
+
+
+# CLASS Tdfa
+class Tdfa:
+    def __init__(self,s_file):
+        self.file=s_file
+        self.timestep=None
+        self.startday=None
+        self.endday=None
+        self.entities=None
+# END CLASS
+
+
+# CLASS QAReport
+class QAReport:
+    def __init__(self,s_file):
+        self.file=s_file
+        self.total_floor_area=None
+        self.total_volume=None
+        self.zone_volumes=None
+# END CLASS
+
+
+# CLASS FMIConfig
+class FMIConfig:
+    def __init__(self,s_file):
+        self.file=s_file
+        self.fmu_names=None
+# END CLASS
+
+
+# CLASS Radiance
+class Radiance:
+    def __init__(self,s_file):
+        self.file=s_file
+        self.viewpoints=None
+        self.scene=None
+# END CLASS
+
+
+# CLASS Plant
+class Plant:
+    def __init__(self,s_file):
+        self.file=s_file
+        self.components=None
+        self.comp_names=None
+# END CLASS
+
+
+# CLASS ModelInfo
+# Everything known about a model from its cfg file, and the data retrieved
+# for the requested outputs. Text for each retrieved output, in the format of
+# the command line interface, is held in dict_text.
+class ModelInfo:
+    def __init__(self,s_cfgFile):
+        self.cfg_file=s_cfgFile
+        s_cfgPath,s_file=path.split(s_cfgFile)
+        if s_cfgPath=='': s_cfgPath='.'
+        self.cfg_dir=s_cfgPath
+        self.outputs=[]
+        self.dict_text=dict()
+        # Files read so far (see getFile).
+        self.dict_files=dict()
+        # Cfg file lines, each split by whitespace.
+        self.lls_root=None
+        self.lls_building=None
+        self.ls_sps=None
+        self.ls_clm=None
+        self.ls_ual=None
+        # Data.
+        self.name=None
+        self.description=None
+        self.number_zones=None
+        self.is_building=None
+        self.zones=[]
+        self.afn=None
+        self.ctm=None
+        self.control=None
+        self.tdfa=None
+        self.qa=None
+        self.fmi=None
+        self.radiance=None
+        self.plant=None
+        self.uncertainties_file=None
+        self.number_presets=None
+        self.weather_file=None
+
+    # Returns the text of output s_output.
+    def text(self,s_output):
+        return self.dict_text[s_output]
+
+    # Returns the text of all requested outputs, in the order requested.
+    def all_text(self):
+        return '\n\n'.join(self.dict_text[a] for a in self.outputs)
+
+    # Returns the value of output s_output: a string, a list of strings for
+    # outputs in ls_listOutputs, or a list of lists of strings (one for each
+    # zone) for outputs in ls_zoneOutputs. Items are as in the text.
+    def value(self,s_output):
+        s=self.dict_text[s_output]
+        if s_output=='FMU_names':
+            # The text only holds the last name if there are several.
+            if self.fmi is None or self.fmi.fmu_names is None: return []
+            return self.fmi.fmu_names[:]
+        elif s_output in ls_zoneOutputs or s_output=='zone_setpoints':
+            if not s.startswith(s_output+':\n'): return [] if s_output in ls_zoneOutputs else ''
+            ls_lines=s.split('\n')[1:]
+            if s_output=='zone_setpoints': return '\n'.join(ls_lines)
+            return [a.split('=',1)[1].split(',') if not a.endswith('=') else [] for a in ls_lines if not a=='']
+        if s.startswith(s_output+'='):
+            s=s[len(s_output)+1:]
+        else:
+            s=''
+        if s_output in ls_listOutputs:
+            if s=='': return []
+            return s.split(',')
+        return s
+# END CLASS
+
+
+# FUNCTION getLine
+# Get the nth line down in file f, return in list split by whitespace.
+def getLine(f,n):
+    for i in range(0,n):
+        s_line=f.readline()
+    s_line=s_line.strip()
+    ls_line=s_line.split()
+    return ls_line
+# END FUNCTION
+
+
+# FUNCTION get_zone_setpoints
+# Scan control file for zone control setpoints.
+def get_zone_setpoints(f_ctl,i_numDayTypes):
+
+    s='zone_setpoints:'
+    s=s+'\n  number_of_calender_daytypes='+str(i_numDayTypes)
+    i_numDayTypesInp=i_numDayTypes
+
+    while True:
+        ls_line=getLine(f_ctl,1)
+        if ls_line[0:2]==['*','Building']:
+            break
+
+    ls_line=getLine(f_ctl,2)
+    i_numFuncs=int(ls_line[0])
+    s=s+'\n  number_of_functions='+str(i_numFuncs)
+
+    for i_func in range(0,i_numFuncs):
+        s=s+'\n  function#'+str(i_func+1)+':'
+        ls_line=getLine(f_ctl,6)
+        s_dayTypes=ls_line[0]
+        if s_dayTypes=='0':
+            s_dayTypes='follows_calender'
+            i_numDayTypes=i_numDayTypesInp
+        elif s_dayTypes=='1':
+            s_dayTypes='all'
+            i_numDayTypes=1
+        else:
+            raise EspQueryError('unrecognised daytypes flag: '+s_dayTypes+' (in line "'+' '.join(ls_line)+'")')
+        s=s+'\n    day_types='+s_dayTypes
+
+        for i_dayType in range(0,i_numDayTypes):
+            if not s_dayTypes=='all':
+                s=s+'\n    daytype#'+str(i_dayType+1)+':'
+                xtra='  '
+            else:
+                xtra=''
+            ls_line=getLine(f_ctl,1)
+            s=s+'\n'+xtra+'    validity_start_day='+ls_line[0]
+            s=s+'\n'+xtra+'    validity_end_day='+ls_line[1]
+            ls_line=getLine(f_ctl,1)
+            i_numPer=int(ls_line[0])
+            s=s+'\n'+xtra+'    number_of_periods='+str(i_numPer)
+
+            for i_per in range(0,i_numPer):
+                s=s+'\n'+xtra+'    period#'+str(i_per+1)+':'
+                ls_line=getLine(f_ctl,1)
+                s_ctlType=ls_line[1]
+                if s_ctlType=='1':
+                    s=s+'\n'+xtra+'      control_type=basic'
+                elif s_ctlType=='2':
+                    s=s+'\n'+xtra+'      control_type=none'
+                elif s_ctlType=='11':
+                    s=s+'\n'+xtra+'      control_type=match multi-sensor (ideal)'
+# TODO - other ESP-r control types
+                else:
+                    ls_line=getLine(f_ctl,2)
+                    continue
+                s=s+'\n'+xtra+'      starting_at_hour='+ls_line[2]
+                if s_ctlType=='2':
+                    ls_line=getLine(f_ctl,1)
+                else:
+                    ls_line=getLine(f_ctl,2)
+                    skip=False
+                    if s_ctlType=='1':
+                        i_hs=4
+                        i_cs=5
+                    elif s_ctlType=='11':
+                        skip=True
+# TODO - other ESP-r control types
+                    if skip:
+                        s=s+'\n'+xtra+'      heating_setpoint=n/a'
+                        s=s+'\n'+xtra+'      cooling_setpoint=n/a'
+                    else:
+                        s=s+'\n'+xtra+'      heating_setpoint='+ls_line[i_hs]
+                        s=s+'\n'+xtra+'      cooling_setpoint='+ls_line[i_cs]
+
+    ls_line=getLine(f_ctl,2)
+    s=s+'\n  function_zone_mappings='+ls_line[0]
+
+    f_ctl.close()
+    return s
+# END FUNCTION
+
+
+# FUNCTION parse_cfg
+# Scans cfg file s_cfgFile once, and returns a ModelInfo object holding the
+# files and settings it references. No other files are read.
+def parse_cfg(s_cfgFile):
+    info=ModelInfo(s_cfgFile)
+    f_cfg=open(s_cfgFile,'r')
+
+    i_building=-3
+    i_afn=0
+    i_plant=0
+    zone=None
+    for i_line,s_line in enumerate(f_cfg):
+        ls_line=s_line.strip().split()
+
+        # Network type and file, and zone nodes, follow the *cnn line.
+        if i_afn==1:
+            if ls_line[0]=='0':
+                info.afn.type=0
+                i_afn=0
+            elif ls_line[0]=='1' or ls_line[0]=='3':
+                info.afn.type=int(ls_line[0])
+                i_afn=2
+        elif i_afn==2:
+            info.afn.file=ls_line[0]
+            i_afn=3
+        elif i_afn==3:
+            info.afn.ls_nodeItems.append(ls_line[0])
+
+        # Plant network file follows the * Plant line.
+        if i_plant==1:
+            info.plant=Plant(info.cfg_dir+'/'+ls_line[0])
+            i_plant=2
+
+        # Building description and number of zones follow the * Building line.
+        if i_line==i_building+1:
+            info.lls_building.append(ls_line)
+        elif i_line==i_building+2:
+            info.lls_building.append(ls_line)
+
+        if ls_line[0]=='*root':
+            if info.lls_root is None: info.lls_root=ls_line
+        elif ls_line[0:2]==['*','Building']:
+            if info.lls_building is None:
+                info.lls_building=[]
+                i_building=i_line
+        elif ls_line[0:2]==['*','Plant']:
+            if i_plant==0: i_plant=1
+        elif ls_line[0]=='*zon':
+            # Keep track of the zone index. These should be in order.
+            zone=Zone(len(info.zones)+1)
+            assert int(ls_line[1])==zone.index
+            info.zones.append(zone)
+        elif ls_line[0]=='*zend':
+            if not zone is None: zone.b_zend=True
+        elif ls_line[0]=='*geo':
+            if not zone is None and zone.geo_file is None:
+                zone.geo_file=ls_line[1]
+                zone.b_geoFirst=not zone.b_zend
+        elif ls_line[0]=='*ivf':
+            if not zone is None and not zone.b_ivf and not zone.b_zend:
+                zone.ivf_file=ls_line[1]
+                zone.b_ivf=True
+        elif ls_line[0]=='*cfd':
+            if not zone is None and not zone.b_cfd and not zone.b_zend:
+                zone.cfd_file=ls_line[1]
+                zone.b_cfd=True
+        elif ls_line[0]=='*cnn':
+            if info.afn is None:
+                info.afn=AirFlowNetwork()
+                i_afn=1
+        elif ls_line[0]=='*ctm':
+            if info.ctm is None: info.ctm=ContaminantNetwork(ls_line[1])
+        elif ls_line[0]=='*ctl':
+            if info.control is None: info.control=Control(ls_line[1])
+        elif ls_line[0]=='*list':
+            if not info.control is None and info.control.ls_list is None: info.control.ls_list=ls_line
+        elif ls_line[0]=='*tdf':
+            if info.tdfa is None: info.tdfa=Tdfa(ls_line[1])
+        elif ls_line[0]=='*ual':
+            if info.ls_ual is None: info.ls_ual=ls_line
+        elif ls_line[0]=='*sps':
+            if info.ls_sps is None: info.ls_sps=ls_line
+        elif ls_line[0]=='*clm' or ls_line[0]=='*stdclm':
+            if info.ls_clm is None: info.ls_clm=ls_line
+        elif ls_line[0]=='*contents':
+            if info.qa is None: info.qa=QAReport(ls_line[1])
+        elif ls_line[0]=='*FMI':
+            if info.fmi is None: info.fmi=FMIConfig(ls_line[1])
+        elif ls_line[0]=='*rif':
+            if info.radiance is None: info.radiance=Radiance(ls_line[1])
+
+    f_cfg.close()
+    return info
+# END FUNCTION
+
+
+# FUNCTION zoneText
+# Assembles per-zone text for output s_output, from the value returned by
+# fn_value for each zone that has one (fn_value returns None if not). In
+# "list" form, the values are comma separated; in "block" form, each zone is
+# on a separate line. Returns None if the last zone has no value.
+def zoneText(info,s_output,fn_value,b_block):
+    s=''
+    s_value=None
+    for zone in info.zones[:info.number_zones]:
+        s_value=fn_value(zone)
+        if s_value is None: continue
+        if b_block:
+            if zone.index==1: s=s_output+':\n'
+            s=s+'  zone#'+str(zone.index)+'='+s_value+'\n'
+        elif zone.index==1:
+            s=s_output+'='+s_value
+        else:
+            s=s+','+s_value
+    if len(info.zones)<info.number_zones or s_value is None: return None
+    return s
+# END FUNCTION
+
+
+# CLASS TextFile
+# A model file, read once. ls_lines holds the lines of the file.
+class TextFile:
+    def __init__(self,s_file):
+        self.file=s_file
+        f=open(s_file,'r')
+        self.ls_lines=f.readlines()
+        f.close()
+
+    # Get the nth line of the file, return in list split by whitespace.
+    def line(self,n):
+        return self.ls_lines[n-1].strip().split()
+# END CLASS
+
+
+# CLASS GeoFile
+# A zone geometry file, read once and scanned for the items needed by any
+# output: the header line, the base list, the surface lines and the names of
+# the visual objects.
+class GeoFile:
+    def __init__(self,s_file):
+        self.file=s_file
+        self.s_header=None
+        self.ls_base=None
+        self.lls_surfs=[]
+        self.ls_vobjects=[]
+        f_geo=open(s_file,'r')
+        try:
+            ls_lines=f_geo.readlines()
+        except:
+            raise EspQueryError('unrecognised format in file '+s_file)
+        finally:
+            f_geo.close()
+        i_surf=0
+        for s_line in ls_lines:
+            if self.s_header is None and s_line[0]!='#':
+                self.s_header=s_line
+            if self.ls_base is None and s_line[0:10]=='*base_list':
+                self.ls_base=s_line.strip().split('#')[0].split(',')
+            # Surfaces are taken from the first block of *surf lines.
+            if s_line[0:5]=='*surf':
+                if i_surf<2:
+                    self.lls_surfs.append(s_line.strip().split('#')[0].split(','))
+                    i_surf=1
+            elif i_surf==1:
+                i_surf=2
+            ls_line=s_line.strip().split(',')
+            if ls_line[0]=='*vobject':
+                self.ls_vobjects.append(ls_line[1])
+# END CLASS
+
+
+# CLASS AfnFile
+# An air flow network file, read once. ls_nodes holds the items that can be
+# matched to zone node names, in node index order: for old format networks,
+# the first item of each line after the node table heading; for graphic
+# format networks, the names on the *node lines.
+class AfnFile:
+    def __init__(self,s_file,i_afntyp):
+        self.file=s_file
+        self.ls_nodes=[]
+        f_afn=open(s_file,'r')
+        if i_afntyp==1:
+            b_nodes=False
+            for s_line in f_afn:
+                if s_line[0:70]==' Node         Fld. Type   Height    Temperature    Data_1       Data_2':
+                    b_nodes=True
+                elif b_nodes:
+                    self.ls_nodes.append(s_line.strip().split()[0])
+        elif i_afntyp==3:
+            for s_line in f_afn:
+                if s_line[0:5]=='*node':
+                    self.ls_nodes.append(s_line.strip().split(',')[1])
+        f_afn.close()
+# END CLASS
+
+
+# FUNCTION getFile
+# Returns file s_file, read into an object of class cls (with any further
+# arguments). Files are cached in the ModelInfo object, so that each file is
+# read only once however many outputs and zones need it.
+def getFile(info,cls,s_file,*args):
+    t_key=(cls,path.normpath(s_file))+args
+    if not t_key in info.dict_files:
+        info.dict_files[t_key]=cls(s_file,*args)
+    return info.dict_files[t_key]
+# END FUNCTION
+
+
+# FUNCTION readGeoName
+# Reads the zone name from geometry file geo.
+def readGeoName(geo):
+    if geo.s_header is None:
+        raise EspQueryError('unrecognised format in file '+geo.file)
+    s=geo.s_header.strip()
+    s=s.split('#')[0]
+    s_tmp=s.split()[0]
+    if s_tmp=='*Geometry':
+        # old geo file
+        s=s.split(',')[2]
+    elif s_tmp=='GEN':
+        # new geo file
+        s=s.split()[1]
+    else:
+        raise EspQueryError('unrecognised format in file '+geo.file)
+    return s.strip()
+# END FUNCTION
+
+
+# FUNCTION readGeoFloor
+# Reads the floor (base) surfaces from geometry file geo, as a comma
+# separated string ('0' if there are none).
+def readGeoFloor(geo,i_zone):
+    ls=geo.ls_base
+    if ls is None:
+        raise EspQueryError('could not find base list in file '+geo.file)
+    if ls[1]=='0':
+        sys.stderr.write('esp-query warning: unable to find floor surface for zone '+str(i_zone)+'\n')
+        return '0'
+    return ','.join(ls[2:2+int(ls[1])])
+# END FUNCTION
+
+
+# FUNCTION readGeoWindows
+# Reads the indices of external transparent surfaces from geometry file geo.
+def readGeoWindows(geo):
+    if len(geo.lls_surfs)==0:
+        raise EspQueryError('could not find surfaces in file '+geo.file)
+    li_surfs=[]
+    for i_surf,ls in enumerate(geo.lls_surfs,start=1):
+        if ls[7]=='OPAQUE' or ls[8]!='EXTERIOR': continue
+        li_surfs.append(i_surf)
+    return li_surfs
+# END FUNCTION
+
+
+# FUNCTION readGeoVobjects
+# Counts visual objects with s_type in the name in geometry file geo.
+def readGeoVobjects(geo,s_type):
+    return len([a for a in geo.ls_vobjects if s_type in a])
+# END FUNCTION
+
+
+# FUNCTION readIvfSensorNames
+# Reads the names of MRT sensors from view factor file ivf.
+def readIvfSensorNames(ivf):
+    i=0
+    i_countdown1=0
+    i_countdown2=0
+    active1=0
+    active2=0
+    ls2=[]
+    j=0
+    ls3=[]
+    for s_line in ivf.ls_lines:
+        i+=1
+        if i_countdown1>0:
+            i_countdown1-=1
+            if i_countdown1==0: active1=1
+        if i_countdown2>0:
+            i_countdown2-=1
+            if i_countdown2==0: active2=1
+        if i==5:
+            ls=s_line.strip().split()
+            i_nsen=int(ls[0])
+            i_nsur=int(ls[1])
+        elif s_line.strip()=='*MRT_SENSOR':
+            i_countdown1=2
+        elif active1:
+            ls=s_line.strip().split()
+            ls2.append(ls[8])
+            if len(ls2)==i_nsen:
+                break
+            active1=0
+        elif s_line.strip()=='*MRTVIEW':
+            i_countdown2=1
+        elif active2:
+            ls4=s_line.strip().split(',')
+            if ls4[-1]=='':
+                ls4.pop()
+            ls3+=ls4
+            if len(ls3)==i_nsur:
+                ls3=[]
+                j+=1
+                if j==6:
+                    active1=1
+                    active2=0
+                    j=0
+    return ls2
+# END FUNCTION
+
+
+# FUNCTION readCfdContaminants
+# Reads contaminant names from CFD domain file cfd, as a comma separated
+# string ('none' if there are none).
+def readCfdContaminants(cfd):
+    i_numContam=0
+    s=''
+    for s_cfdLine in cfd.ls_lines:
+        ls_cfdLine=s_cfdLine.strip().split()
+        if ls_cfdLine[0]=='*contaminants(':
+            i_numContam=int(ls_cfdLine[1])
+            if i_numContam==0:
+                s='none'
+                break
+        elif i_numContam>0:
+            s=s+ls_cfdLine[0]+','
+            i_numContam-=1
+            if i_numContam==0:
+                s=s[:-1]
+                break
+    return s
+# END FUNCTION
+
+
+# FUNCTION readAfnNodeNumbers
+# Finds the indices of nodes ls_afnNods in air flow network file afn.
+# Returns a comma separated string, or None if they are not all found.
+def readAfnNodeNumbers(afn,ls_afnNods):
+    ls_nodNums=['0']*len(ls_afnNods)
+    ls_afnNods_tmp=ls_afnNods[:]
+    for i_nodNum,s_node in enumerate(afn.ls_nodes,start=1):
+        if s_node in ls_afnNods_tmp:
+            ls_nodNums[ls_afnNods.index(s_node)]=str(i_nodNum)
+            ls_afnNods_tmp.remove(s_node)
+            if len(ls_afnNods_tmp)==0:
+                return ','.join(ls_nodNums)
+    return None
+# END FUNCTION
+
+
+# FUNCTION readQA
+# Reads the zone table in QA report QA. Returns the "all" row split by
+# whitespace, and a list of the volumes of the rows before it, or None if
+# there is no "all" row.
+def readQA(QA):
+    b=False
+    ls=[]
+    ls_all=None
+    for s_line2 in QA.ls_lines:
+        s_line2=s_line2.strip()
+        if s_line2=='Name         m^3   | No. Opaque  Transp  ~Floor':
+            b=True
+        elif b:
+            ls_line2=s_line2.split()
+            if ls_line2[0]=='all':
+                ls_all=ls_line2
+                break
+            else:
+                ls.append(ls_line2[2])
+    return ls_all,ls
+# END FUNCTION
+
+
+# FUNCTION readPlant
+# Reads component numbers and names from plant network file plant.
+# Returns the text for outputs 41 and 42 (if lb_want[0] and lb_want[1]
+# respectively), or None if not all components are found.
+def readPlant(plant,lb_want):
+    ls_text=['','']
+    i_pcomp=-3
+    n_pcomp=0
+    b_pcomp=False
+    do_m=True
+    for s_line2 in plant.ls_lines:
+        ls_line2=s_line2.strip().split()
+        if s_line2[0]!='#': i_pcomp+=1
+        if do_m and i_pcomp==0:
+            m_pcomp=int(ls_line2[0])
+            do_m=False
+        elif ls_line2[0]=='#->':
+            b_pcomp=True
+            n_pcomp+=1
+        elif b_pcomp:
+            b_pcomp=False
+            for i in range(2):
+                if lb_want[i]:
+                    s_item=ls_line2[1-i]
+                    if i_pcomp==1:
+                        ls_text[i]=ls_outputs[41+i]+'='+s_item
+                    else:
+                        ls_text[i]=ls_text[i]+','+s_item
+            if n_pcomp==m_pcomp:
+                return ls_text
+    return None
+# END FUNCTION
+
+
+# FUNCTION query_model
+# Queries the ESP-r model with cfg file s_cfgFile for the outputs named in
+# ls_inOutputs (see ls_outputs), and returns a ModelInfo object holding the
+# data. Raises EspQueryError if any information cannot be retrieved.
+def query_model(s_cfgFile,ls_inOutputs):
+    for s_output in ls_inOutputs:
+        if not s_output in ls_outputs:
+            raise EspQueryError('unrecognised output: '+s_output)
+
+    # Set arrays for required outputs.
+    i_numOutputs=len(ls_outputs)
+    lb_outputs=[False]*i_numOutputs
+    for i,s_output in enumerate(ls_outputs):
+        if s_output in ls_inOutputs:
+            lb_outputs[i]=True
+            for i_need in lli_needs[i]:
+                lb_outputs[i_need]=True
+    ls_outputVals=[None]*i_numOutputs
+
+    info=parse_cfg(s_cfgFile)
+    info.outputs=list(ls_inOutputs)
+    s_cfgPath=info.cfg_dir
+
+    # Function to get an output if it is required, and store the text in
+    # ls_outputVals. fn_text returns the text, or None if the information
+    # could not be found.
+    def getOutput(i_ind,fn_text):
+        if lb_outputs[i_ind]:
+            ls_outputVals[i_ind]=fn_text()
+
+    # Function to set a blank entry if an item has not been found.
+    def addBlank(i_ind,s_entry=''):
+        if lb_outputs[i_ind] and ls_outputVals[i_ind] is None:
+            ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+s_entry
+
+    # Model name, description and number of zones.
+    if not info.lls_root is None:
+        getOutput(0,lambda: ls_outputs[0]+'='+info.lls_root[1])
+        if lb_outputs[0]: info.name=info.lls_root[1]
+    if not info.lls_building is None:
+        info.is_building=True
+        getOutput(39,lambda: ls_outputs[39]+'=1')
+        if len(info.lls_building)>0:
+            getOutput(4,lambda: ls_outputs[4]+'='+' '.join(info.lls_building[0]))
+            if lb_outputs[4]: info.description=' '.join(info.lls_building[0])
+        if len(info.lls_building)>1:
+            getOutput(1,lambda: ls_outputs[1]+'='+info.lls_building[1][0])
+    else:
+        info.is_building=False
+    if lb_outputs[1] and not ls_outputVals[1] is None:
+        info.number_zones=int(ls_outputVals[1].split('=')[1])
+
+    # Per-zone outputs, which assume that we already have number of zones.
+    if not info.number_zones is None:
+
+        # Zone names.
+        def fn(zone):
+            if zone.geo_file is None: return None
+            zone.name=readGeoName(getFile(info,GeoFile,s_cfgPath+'/'+zone.geo_file))
+            return zone.name
+        getOutput(5,lambda: zoneText(info,ls_outputs[5],fn,False))
+
+        # Zone floor surface numbers.
+        def fn(zone):
+            if zone.geo_file is None: return None
+            s=readGeoFloor(getFile(info,GeoFile,s_cfgPath+'/'+zone.geo_file),zone.index)
+            zone.floor_surfs=[int(a) for a in s.split(',') if not a=='0']
+            return s
+        getOutput(7,lambda: zoneText(info,ls_outputs[7],fn,True))
+
+        # Number and names of MRT sensors.
+        def fn(zone):
+            if zone.b_ivf:
+                s=getFile(info,TextFile,s_cfgPath+'/'+zone.ivf_file).line(5)[0]
+                zone.mrt_sensors=int(s)
+                return s
+            elif zone.b_zend:
+                zone.mrt_sensors=0
+                return '0'
+            return None
+        getOutput(6,lambda: zoneText(info,ls_outputs[6],fn,False))
+        def fn(zone):
+            if zone.b_ivf:
+                zone.mrt_sensor_names=readIvfSensorNames(getFile(info,TextFile,s_cfgPath+'/'+zone.ivf_file))
+                return ','.join(zone.mrt_sensor_names)
+            elif zone.b_zend:
+                zone.mrt_sensor_names=[]
+                return ''
+            return None
+        getOutput(19,lambda: zoneText(info,ls_outputs[19],fn,True))
+
+        # CFD domain files.
+        def fn(zone):
+            if zone.b_cfd:
+                return s_cfgPath+'/'+zone.cfd_file
+            elif zone.b_zend:
+                return ''
+            return None
+        getOutput(18,lambda: zoneText(info,ls_outputs[18],fn,False))
+
+        # Window surfaces.
+        def fn(zone):
+            if zone.geo_file is None: return None
+            zone.win_surfs=readGeoWindows(getFile(info,GeoFile,s_cfgPath+'/'+zone.geo_file))
+            if len(zone.win_surfs)==0: return 'none'
+            return ','.join(str(a) for a in zone.win_surfs)
+        getOutput(10,lambda: zoneText(info,ls_outputs[10],fn,True))
+
+        # Numbers of toilets, urinals, showers, printers and photocopiers.
+        for i_ind,s_type in enumerate(ls_vobjects,start=34):
+            def fn(zone,s_type=s_type):
+                if zone.b_geoFirst:
+                    zone.vobjects[s_type]=readGeoVobjects(getFile(info,GeoFile,s_cfgPath+'/'+zone.geo_file),s_type)
+                elif zone.b_zend:
+                    zone.vobjects[s_type]=0
+                else:
+                    return None
+                return str(zone.vobjects[s_type])
+            getOutput(i_ind,lambda: zoneText(info,ls_outputs[i_ind],fn,False))
+
+    # CFD domain indicators.
+    def fn():
+        s=ls_outputs[2]+'='
+        s_cfd=''
+        for i_zn,s_cfd in enumerate(ls_outputVals[lli_needs[2][1]].split('=')[1].split(',')):
+            if len(s_cfd)==0:
+                s_cfd='0'
+            else:
+                s_cfd='1' if getFile(info,TextFile,s_cfd).line(2)[1]=='0' else '2'
+            info.zones[i_zn].cfd_domain=int(s_cfd)
+            s=s+s_cfd+','
+        if len(s_cfd)>0: s=s[:-1]
+        return s
+    if not ls_outputVals[18] is None: getOutput(2,fn)
+
+    # CFD contaminants.
+    def fn():
+        s=ls_outputs[17]+':\n'
+        for i_zn,s_cfd in enumerate(ls_outputVals[lli_needs[17][1]].split('=')[1].split(',')):
+            if len(s_cfd)==0:
+                s_ctm=''
+            else:
+                s_ctm=readCfdContaminants(getFile(info,TextFile,s_cfd))
+                info.zones[i_zn].cfd_contaminants=[] if s_ctm=='none' else s_ctm.split(',')
+            s=s+'  zone#'+str(i_zn+1)+'='+s_ctm+'\n'
+        return s
+    if not ls_outputVals[18] is None: getOutput(17,fn)
+
+    # Radiance viewpoint names and scene name.
+    if not info.radiance is None:
+        s_rcf=info.radiance.file
+        def fn():
+            ls=getFile(info,TextFile,s_cfgPath+'/'+s_rcf).line(5)
+            assert ls[0]=='*rnm'
+            rif=getFile(info,TextFile,s_cfgPath+'/'+path.split(s_rcf)[0]+'/'+ls[1])
+            info.radiance.viewpoints=[]
+            for s_line in rif.ls_lines:
+                ls=s_line.split()
+                if ls[0]=='view=':
+                    info.radiance.viewpoints.append(ls[1])
+            if len(info.radiance.viewpoints)==0: return ''
+            return ls_outputs[8]+'='+','.join(info.radiance.viewpoints)
+        getOutput(8,fn)
+        def fn():
+            ls=getFile(info,TextFile,s_cfgPath+'/'+s_rcf).line(7)
+            assert ls[0]=='*srt'
+            info.radiance.scene=ls[1]
+            return ls_outputs[9]+'='+ls[1]
+        getOutput(9,fn)
+
+    # Air flow network, zone nodes and zone node indices.
+    afn=info.afn
+    if not afn is None and not afn.type is None:
+        if afn.type==0:
+            getOutput(11,lambda: ls_outputs[11]+'=')
+        elif not afn.file is None:
+            getOutput(11,lambda: ls_outputs[11]+'='+afn.file)
+            # Zone nodes are read from the line after the network file.
+            # Should there be more lines in the cfg file, their first items
+            # are appended to the last node name, and the zone node indices
+            # are those found for the most nodes.
+            if lb_outputs[14] and len(afn.ls_nodeItems)>0:
+                s=''
+                for s_item in afn.ls_nodeItems:
+                    s=s+s_item
+                    if lb_outputs[15]:
+                        s_nums=readAfnNodeNumbers(getFile(info,AfnFile,s_cfgPath+'/'+afn.file,afn.type),s.split(','))
+                        if not s_nums is None:
+                            ls_outputVals[15]=ls_outputs[15]+'='+s_nums
+                            afn.zone_node_numbers=[int(a) for a in s_nums.split(',')]
+                ls_outputVals[14]=ls_outputs[14]+'='+s
+                afn.zone_nodes=s.split(',')
+                if lb_outputs[15] and ls_outputVals[15] is None: ls_outputVals[15]=''
+    addBlank(14)
+    addBlank(15)
+
+    # Contaminant network and number of contaminants.
+    if not info.ctm is None:
+        getOutput(12,lambda: ls_outputs[12]+'='+info.ctm.file)
+        def fn():
+            ls=getFile(info,TextFile,s_cfgPath+'/'+info.ctm.file).line(5)
+            info.ctm.number=int(ls[0])
+            return ls_outputs[13]+'='+ls[0]
+        getOutput(13,fn)
+    addBlank(12)
+    addBlank(13)
+
+    # Zone control flag and setpoints.
+    ctl=info.control
+    if not ctl is None:
+        getOutput(16,lambda: ls_outputs[16]+'=1')
+        if not ctl.ls_list is None:
+            def fn():
+                f_ctl=open(s_cfgPath+'/'+ctl.file,'r')
+                ctl.setpoints=get_zone_setpoints(f_ctl,int(ctl.ls_list[1]))
+                return ctl.setpoints
+            getOutput(3,fn)
+    else:
+        addBlank(3)
+    addBlank(16,s_entry='0')
+
+    # tdfa file, time step, start day, end day and number of entities.
+    tdfa=info.tdfa
+    if not tdfa is None:
+        getOutput(20,lambda: ls_outputs[20]+'='+tdfa.file)
+        if True in lb_outputs[21:25]:
+            ls_tdfa=getFile(info,TextFile,s_cfgPath+'/'+tdfa.file).line(3)
+            for i_ind,i_item,s_attr in [(21,2,'timestep'),(22,4,'startday'),(23,5,'endday'),(24,1,'entities')]:
+                if lb_outputs[i_ind]:
+                    ls_outputVals[i_ind]=ls_outputs[i_ind]+'='+ls_tdfa[i_item]
+                    setattr(tdfa,s_attr,ls_tdfa[i_item])
+    for i_ind in range(20,25): addBlank(i_ind)
+
+    # Uncertainties file, number of simulation presets, weather file.
+    if not info.ls_ual is None:
+        info.uncertainties_file=info.ls_ual[1]
+        getOutput(25,lambda: ls_outputs[25]+'='+info.ls_ual[1])
+    addBlank(25)
+    if not info.ls_sps is None:
+        getOutput(26,lambda: ls_outputs[26]+'='+info.ls_sps[1])
+        if lb_outputs[26]: info.number_presets=int(info.ls_sps[1])
+    addBlank(26,s_entry='0')
+    if not info.ls_clm is None:
+        def fn():
+            if info.ls_clm[0]=='*clm':
+                info.weather_file=info.ls_clm[1]
+            else:
+                # Get climate location from .esprc file.
+                f_esprc=open(Path.home() / '.esprc','r')
+                for s_line2 in f_esprc:
+                    ls_line2=s_line2.strip().split(',')
+                    if ls_line2[0]=='*db_climates':
+                        s_clmpath=str(Path(ls_line2[2]).parent)
+                        break
+                f_esprc.close()
+                info.weather_file=s_clmpath+'/'+info.ls_clm[1]
+            return ls_outputs[27]+'='+info.weather_file
+        getOutput(27,fn)
+
+    # QA report, total floor area, total volume and zone volumes.
+    qa=info.qa
+    if not qa is None:
+        getOutput(28,lambda: ls_outputs[28]+'='+qa.file)
+        if True in lb_outputs[29:32]:
+            ls_all,ls_vols=readQA(getFile(info,TextFile,s_cfgPath+'/'+qa.file))
+            if not ls_all is None:
+                qa.total_floor_area=ls_all[5]
+                qa.total_volume=ls_all[1]
+                qa.zone_volumes=ls_vols
+                getOutput(29,lambda: ls_outputs[29]+'='+ls_all[5])
+                getOutput(30,lambda: ls_outputs[30]+'='+ls_all[1])
+                getOutput(31,lambda: ls_outputs[31]+'='+','.join(ls_vols))
+    for i_ind in range(28,32): addBlank(i_ind)
+
+    # FMI config file and FMU names.
+    fmi=info.fmi
+    if not fmi is None:
+        getOutput(32,lambda: ls_outputs[32]+'='+fmi.file)
+        def fn():
+            fmi.fmu_names=[]
+            for s_line2 in getFile(info,TextFile,s_cfgPath+'/'+fmi.file).ls_lines:
+                ls_line2=s_line2.strip().split()
+                if ls_line2[0]=='*FileName':
+                    fmi.fmu_names.append(ls_line2[1])
+            if len(fmi.fmu_names)==0: return ''
+            if len(fmi.fmu_names)==1: return ls_outputs[33]+'='+fmi.fmu_names[0]
+            return ls_outputs[33]+','+fmi.fmu_names[-1]
+        getOutput(33,fn)
+    addBlank(32)
+    addBlank(33)
+
+    # Building flag.
+    addBlank(39,s_entry='0')
+
+    # Plant network, component numbers and names.
+    plant=info.plant
+    if not plant is None:
+        getOutput(40,lambda: ls_outputs[40]+'='+plant.file)
+        if lb_outputs[41] or lb_outputs[42]:
+            ls_text=readPlant(getFile(info,TextFile,plant.file),lb_outputs[41:43])
+            if not ls_text is None:
+                if lb_outputs[41]:
+                    ls_outputVals[41]=ls_text[0]
+                    plant.components=ls_text[0].split('=')[1].split(',')
+                if lb_outputs[42]:
+                    ls_outputVals[42]=ls_text[1]
+                    plant.comp_names=ls_text[1].split('=')[1].split(',')
+    addBlank(40)
+    addBlank(41)
+    addBlank(42)
+
+    # If any outputs remain, something has not been found - throw an error.
+    li_errors=[i for i in range(i_numOutputs) if lb_outputs[i] and ls_outputVals[i] is None]
+    if len(li_errors)>0:
+        raise EspQueryError('some information could not be retrieved -\n'+'\n'.join(ls_outputs[i] for i in li_errors))
+
+    for s_output in info.outputs:
+        info.dict_text[s_output]=ls_outputVals[ls_outputs.index(s_output)]
+    return info
+# END FUNCTION
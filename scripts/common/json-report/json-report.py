@@ -0,0 +1,40 @@
+#! /usr/bin/env python3
+
+# v1.0 ESRU 2018
+
+# json-report.py
+# Script to write the JSON output of the performance assessment scripts.
+# "./json-report.py -h" for help.
+# This is the command line interface to the jsonreport library
+# (jsonreport.py, in the same directory as this script), which does the
+# work.
+
+import sys,argparse
+from os import path
+
+sys.path.insert(0,path.dirname(path.realpath(__file__)))
+from jsonreport import read_records,write_json,JSONReportError
+
+# Argument parser and help text.
+parser=argparse.ArgumentParser(description='Script to write the JSON output of the performance assessment scripts.\n'
+                                           'Records are read from standard input, one per line, as "path=value".\n'
+                                           'The path is a list of keys separated by "/"; in place of a key, "+" adds\n'
+                                           'a new element to an array and "-" refers to the last element added.\n'
+                                           'For example, these records:\n'
+                                           '  thermal discomfort/+/area=Zone 1\n'
+                                           '  thermal discomfort/-/location=Sensor 1\n'
+                                           '  report=\n'
+                                           'give {"thermal discomfort": [{"area": "Zone 1", "location": "Sensor 1"}],\n'
+                                           '"report": ""}. The output file is only written if all records are valid.',
+                               formatter_class=argparse.RawTextHelpFormatter)
+parser.add_argument('-o','--output-file',required=True,
+                    help='JSON file to write')
+
+# Parse command line.
+args=parser.parse_args()
+
+try:
+    write_json(read_records(sys.stdin),args.output_file)
+except JSONReportError as e:
+    sys.stderr.write('json-report error: '+str(e)+'\n')
+    sys.exit(1)
@@ -0,0 +1,122 @@
+#! /usr/bin/env python3
+
+# v1.0 ESRU 2018
+
+# jsonreport.py
+# Library to write the JSON output (data.json) of the performance assessment
+# scripts. json-report.py is the command line interface to this library.
+# The assessment scripts build up a list of records, one per line, and pass
+# them all to json-report.py at once, instead of appending each line of JSON
+# to the output file themselves:
+#   thermal discomfort/+/area=Zone 1
+#   thermal discomfort/-/location=Sensor 1
+#   thermal discomfort/-/draught/worst time=12/3/2018 @ 14:30
+#   report=
+# Each record is a path and a value, separated by the first "=". The path
+# is a list of object keys separated by "/". In place of a key, "+" adds a
+# new element to an array and "-" refers to the last element added, so the
+# records above give:
+#   {"thermal discomfort": [{"area": "Zone 1", "location": "Sensor 1",
+#    "draught": {"worst time": "12/3/2018 @ 14:30"}}], "report": ""}
+# Values are always strings, and keys keep the order they are first given
+# in. Blank lines are ignored. The records are checked as they are read, and
+# the file is only written if they are all valid. It is written under a
+# temporary name and then renamed, so that a partial file is never picked up
+# with the outputs.
+
+import json
+from os import path,getpid,rename,remove
+
+s_newElement='+'
+s_lastElement='-'
+
+
+# CLASS JSONReportError
+# Raised if a record is not valid. The message is in the form used by the
+# command line interface.
+class JSONReportError(Exception):
+    pass
+# END CLASS
+
+
+# FUNCTION add_record
+# Adds the value of record s_record (a "path=value" line) to dictionary
+# d_report.
+def add_record(d_report,s_record):
+    if not '=' in s_record:
+        raise JSONReportError('no "=" in record "'+s_record+'"')
+    s_path,s_value=s_record.split('=',1)
+    ls_keys=s_path.split('/')
+    if '' in ls_keys:
+        raise JSONReportError('empty key in record "'+s_record+'"')
+    if ls_keys[0] in [s_newElement,s_lastElement]:
+        raise JSONReportError('record "'+s_record+'" does not start with a key')
+
+    container=d_report
+    for i,s_key in enumerate(ls_keys):
+        b_last=i==len(ls_keys)-1
+        if not b_last:
+            b_array=ls_keys[i+1] in [s_newElement,s_lastElement]
+
+        if s_key==s_newElement:
+            if b_last:
+                container.append(s_value)
+                return
+            container.append([] if b_array else {})
+            container=container[-1]
+
+        elif s_key==s_lastElement:
+            if not container:
+                raise JSONReportError('no element to refer to with "-" in record "'+s_record+'"')
+            if b_last:
+                raise JSONReportError('record "'+s_record+'" ends in "-"')
+            container=container[-1]
+
+        else:
+            if b_last:
+                if s_key in container:
+                    raise JSONReportError('duplicate record "'+s_record+'"')
+                container[s_key]=s_value
+                return
+            if not s_key in container:
+                container[s_key]=[] if b_array else {}
+            container=container[s_key]
+
+        if isinstance(container,str) or isinstance(container,list)!=b_array:
+            raise JSONReportError('record "'+s_record+'" does not match the structure of earlier records')
+# END FUNCTION
+
+
+# FUNCTION read_records
+# Returns the dictionary given by the records in iterable ls_lines.
+def read_records(ls_lines):
+    d_report={}
+    for i_line,s_line in enumerate(ls_lines):
+        s_line=s_line.rstrip('\r\n')
+        if not s_line.strip():
+            continue
+        try:
+            add_record(d_report,s_line)
+        except JSONReportError as e:
+            raise JSONReportError('line '+str(i_line+1)+': '+str(e))
+    return d_report
+# END FUNCTION
+
+
+# FUNCTION write_json
+# Writes dictionary d_report as JSON to file s_file. The file is written
+# under a temporary (hidden) name in the same directory and then renamed.
+def write_json(d_report,s_file):
+    s_dir,s_name=path.split(s_file)
+    s_tmp=path.join(s_dir,'.'+s_name+'.'+str(getpid()))
+    try:
+        f=open(s_tmp,'w')
+        json.dump(d_report,f,indent=2,ensure_ascii=False)
+        f.write('\n')
+        f.close()
+        rename(s_tmp,s_file)
+    except OSError as e:
+        if path.isfile(s_tmp):
+            remove(s_tmp)
+        raise JSONReportError('could not write file "'+s_file+'": '+e.strerror)
+# END FUNCTION
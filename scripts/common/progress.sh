@@ -0,0 +1,28 @@
+#! /bin/bash
+
+# ESRU 2018
+
+# Progress reporting for performance assessment scripts. This file should be
+# sourced, not executed.
+
+# setProgress writes a progress code to "progress.txt" in the given
+# temporary directory. If the script has been called by the Marathon
+# service, the code is also written to the progress channel (a file
+# descriptor inherited from the service, given by MARATHON_PROGRESS_FD), so
+# that the service sees it immediately.
+# Progress codes are those listed in runJob in main.py. Optionally, the
+# current step and number of steps within the stage can also be given, for
+# example the year being simulated. These only go to the progress channel.
+
+# Usage: setProgress tmp-dir code [step number-of-steps]
+
+setProgress() {
+  echo "$2" > "$1/progress.txt"
+  if [ "X$MARATHON_PROGRESS_FD" != "X" ]; then
+    if [ "$#" -ge 4 ]; then
+      echo "$2 $3 $4" >&"$MARATHON_PROGRESS_FD"
+    else
+      echo "$2" >&"$MARATHON_PROGRESS_FD"
+    fi
+  fi
+}
@@ -0,0 +1,180 @@
+#! /usr/bin/env python3
+
+# v1.0 ESRU 2018
+
+# res-analysis.py
+# Script to analyse time step data exported from ESP-r results libraries.
+# "./res-analysis.py -h" for help.
+# This is the command line interface to the resanalysis library
+# (resanalysis.py, in the same directory as this script), which does the
+# work.
+
+import sys,argparse,shlex
+from os import path,environ
+
+sys.path.insert(0,path.dirname(path.realpath(__file__)))
+from resanalysis import read_table,Deviation,format_number,format_ptd,severity_ratings,frequency_rating,critical_zone,ResAnalysisError
+
+
+# FUNCTION addCriteria
+# Adds the comfort criteria arguments to subcommand parser p.
+def addCriteria(p):
+    p.add_argument('-c','--criteria',type=float,
+                   help='discomfort if further from zero than CRITERIA (default 0)')
+    p.add_argument('-u','--upper',type=float,
+                   help='discomfort if above UPPER (default 1 if LOWER is given)')
+    p.add_argument('-l','--lower',type=float,
+                   help='discomfort if below LOWER (default 0 if UPPER is given)')
+    p.add_argument('-U','--upper-finish',type=float,
+                   help='upper criterion on the last time step; varies linearly from UPPER')
+    p.add_argument('-L','--lower-finish',type=float,
+                   help='lower criterion on the last time step; varies linearly from LOWER')
+# END FUNCTION
+
+
+# FUNCTION getDeviation
+# Returns the Deviation given by the arguments of the deviation and
+# discomfort subcommands.
+def getDeviation(args):
+    if getattr(args,'deviation_files',False):
+        return Deviation.read(args.FILES)
+    return Deviation.from_table(read_table(args.FILES,s_cacheDir),args.criteria,args.upper,args.lower,args.upper_finish,args.lower_finish)
+# END FUNCTION
+
+
+# FUNCTION writeText
+# Writes text s to file s_file, or to stdout if s_file is None.
+def writeText(s,s_file):
+    if s_file:
+        f=open(s_file,'w')
+        f.write(s)
+        f.close()
+    else:
+        sys.stdout.write(s)
+# END FUNCTION
+
+
+# Argument parser and help text.
+parser=argparse.ArgumentParser(description='Script to analyse time step data exported from ESP-r results libraries.\n'
+                                           'Input files have a time column followed by a column for each zone or sensor.\n'
+                                           'Lines starting with "#" are ignored, and entries that are not numbers\n'
+                                           '(e.g. "not occ") are treated as missing data. If several files are given,\n'
+                                           'they are read one after the other as a single table.',
+                               formatter_class=argparse.RawTextHelpFormatter)
+parser.add_argument('-C','--cache-dir',
+                    help='parse each table only once, keeping its arrays in CACHE_DIR\n'
+                         '(default: RESANALYSIS_CACHE_DIR if set to an existing directory)')
+subparsers=parser.add_subparsers(dest='COMMAND',metavar='COMMAND')
+subparsers.required=True
+
+p=subparsers.add_parser('deviation',
+                        help='write deviation from comfort criteria, "x" for no discomfort and "-" for no data',
+                        formatter_class=argparse.RawTextHelpFormatter)
+addCriteria(p)
+p.add_argument('-o','--output-file',
+               help='write deviation to OUTPUT_FILE instead of stdout')
+p.add_argument('FILES',nargs='+',
+               help='time step data files')
+
+p=subparsers.add_parser('discomfort',
+                        help='write percentage of occupied time in discomfort (PTD) and severity ratings\n'
+                             'as bash assignments, for "eval" in the assessment scripts',
+                        formatter_class=argparse.RawTextHelpFormatter)
+addCriteria(p)
+p.add_argument('-d','--deviation-files',action='store_true',
+               help='FILES are deviation files written by the deviation subcommand')
+p.add_argument('-g','--groups',
+               help='comma separated list of the number of adjacent columns for each output column\n'
+                    '(e.g. floor surfaces in each zone); a single number N groups every N columns')
+p.add_argument('-t','--trace-file',
+               help='also write deviation to TRACE_FILE')
+p.add_argument('-n','--name',default='',
+               help='assign to PTD_NAME and severity_NAME (default PTD and severity)')
+p.add_argument('FILES',nargs='+',
+               help='time step data files, or deviation files with -d')
+
+p=subparsers.add_parser('runs',
+                        help='write "time value" lines of each occupied period in a column to separate\n'
+                             'files, and print the number of files',
+                        formatter_class=argparse.RawTextHelpFormatter)
+p.add_argument('-c','--column',type=int,default=1,
+               help='data column, counting from 1 after the time column (default 1)')
+p.add_argument('-o','--output-prefix',required=True,
+               help='periods are written to OUTPUT_PREFIX1, OUTPUT_PREFIX2, ...')
+p.add_argument('FILES',nargs='+',
+               help='time step data files')
+
+p=subparsers.add_parser('stats',
+                        help='print minimum, maximum and average of each column ("not_occ" if no data)')
+p.add_argument('FILES',nargs='+',
+               help='time step data files')
+
+p=subparsers.add_parser('worst',
+                        help='print time (day_hour) of the largest positive value in each column')
+p.add_argument('--day',action='store_true',
+               help='print the day number only')
+p.add_argument('FILES',nargs='+',
+               help='time step or deviation data files')
+
+p=subparsers.add_parser('critical',
+                        help='print zone, day, value and hour of the largest absolute value in res summary statistics')
+p.add_argument('FILE',
+               help='res summary statistics file')
+
+p=subparsers.add_parser('frequency',
+                        help='print how many zones have a severity rating')
+p.add_argument('-s','--severity',default='none',
+               help='rating to count; "discomfort" counts "severe" and "moderate" (default none)')
+p.add_argument('RATINGS',nargs='*',
+               help='rating of each zone')
+
+# Parse command line.
+args=parser.parse_args()
+s_cacheDir=args.cache_dir
+if not s_cacheDir: s_cacheDir=environ.get('RESANALYSIS_CACHE_DIR','')
+
+try:
+    if args.COMMAND=='deviation':
+        writeText(getDeviation(args).text(),args.output_file)
+
+    elif args.COMMAND=='discomfort':
+        dev=getDeviation(args)
+        if args.trace_file:
+            writeText(dev.text(),args.trace_file)
+        ls_groups=None
+        if args.groups:
+            ls_groups=[int(s) for s in args.groups.split(',')]
+            if len(ls_groups)==1:
+                i_num=max(ls_groups[0],1)
+                ls_groups=[i_num]*(dev.values.shape[1]//i_num)
+        a_ptd=dev.percent_time_discomfort(ls_groups)
+        s_suffix='_'+args.name if args.name else ''
+        print('PTD'+s_suffix+'='+shlex.quote(' '.join(format_ptd(a_ptd))))
+        print('severity'+s_suffix+'='+shlex.quote(' '.join(str(i) for i in severity_ratings(a_ptd))))
+
+    elif args.COMMAND=='runs':
+        ls_runs=read_table(args.FILES,s_cacheDir).runs(args.column)
+        for i,s_run in enumerate(ls_runs):
+            writeText(s_run+'\n',args.output_prefix+str(i+1))
+        print(len(ls_runs))
+
+    elif args.COMMAND=='stats':
+        for s in read_table(args.FILES,s_cacheDir).min_max_aves():
+            print(s)
+
+    elif args.COMMAND=='worst':
+        print(' '.join(read_table(args.FILES,s_cacheDir).worst_times(args.day)))
+
+    elif args.COMMAND=='critical':
+        worst=critical_zone(args.FILE)
+        if worst is None:
+            print('')
+        else:
+            print('%d %s %s %s'%(worst[0],worst[1],format_number(worst[2]),worst[3]))
+
+    elif args.COMMAND=='frequency':
+        print(frequency_rating(args.RATINGS,args.severity))
+
+except ResAnalysisError as e:
+    sys.stderr.write('res-analysis error: '+str(e)+'\n')
+    sys.exit(1)
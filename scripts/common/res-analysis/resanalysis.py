@@ -0,0 +1,404 @@
+#! /usr/bin/env python3
+
+# v1.0 ESRU 2018
+
+# resanalysis.py
+# Library to analyse time step data exported from ESP-r results libraries
+# with res. res-analysis.py is the command line interface to this library,
+# used by the assessment scripts in place of the get_deviation*,
+# get_percentTimeDiscomfort*, get_severityRating, get_frequencyRating,
+# get_singleZoneAllRecursive, get_minMaxAves, get_timeWorstDiscomfort,
+# get_dayWorstDiscomfort and get_criticalZone awk scripts. Each table is read
+# once into NumPy arrays, and every column is then analysed at the same time:
+#   from resanalysis import read_table,Deviation
+#   tbl=read_table(['early_winter_opt','summer_opt'])
+#   dev=Deviation.from_table(tbl,upper=25.0,lower=20.0)
+#   dev.percent_time_discomfort() -> array of % occupied time in discomfort
+#   tbl.runs(3) -> "time value" lines of each occupied period of column 3
+# Time step tables have a time column followed by a column for each zone or
+# sensor. Comment lines start with "#". Entries that are not numbers (e.g.
+# "not occ", "no data" or "invl") are missing data, as in the awk scripts.
+# If a cache directory is given, each table is parsed only once: the arrays
+# are saved there as .npy files, keyed by the names, sizes and modification
+# times of the files read, and later reads memory-map them instead of
+# parsing the text again.
+
+import re,hashlib
+from os import path,stat,getpid,rename
+import numpy as np
+
+# Numbers as recognised by the awk scripts; anything else is missing data.
+s_number=r'-?[0-9]+\.?[0-9]*'
+re_twoWordMissing=re.compile(r'(?<!\S)(?:not|no|invl)[ \t]+\S+')
+re_notNumber=re.compile(r'(?<!\S)(?!'+s_number+r'(?!\S))\S+')
+re_comment=re.compile(r'^[ \t]*#.*$',re.M)
+re_space=re.compile(r'[ \t]+')
+
+# Severity ratings.
+i_notOccupied=-1
+i_compliant=0
+i_nonCompliant=1
+
+
+# CLASS ResAnalysisError
+# Raised if a table cannot be read or analysed. The message is in the form
+# used by the command line interface.
+class ResAnalysisError(Exception):
+    pass
+# END CLASS
+
+
+# FUNCTION format_number
+# Returns the text of number r as awk would print it: integers in full, and
+# anything else with 6 significant figures.
+def format_number(r):
+    if r==int(r) and abs(r)<1e16:
+        return '%d'%r
+    return '%.6g'%r
+# END FUNCTION
+
+
+# FUNCTION read_text
+# Returns the lines of files ls_files, one after the other, without comment
+# lines or blank lines, as awk reads them when given several files. Entries
+# are separated by single spaces.
+def read_text(ls_files):
+    ls_text=[]
+    for s_file in ls_files:
+        try:
+            f=open(s_file,'r')
+        except OSError:
+            raise ResAnalysisError('could not open file "'+s_file+'"')
+        ls_text.append(f.read())
+        f.close()
+    s=re_space.sub(' ',re_comment.sub('','\n'.join(ls_text)))
+    return [s_line.strip() for s_line in s.split('\n') if s_line.strip()]
+# END FUNCTION
+
+
+# FUNCTION tokens
+# Returns the entries of lines ls_lines as a 2D array of strings, one row
+# for each line. Short lines are padded with missing data ("-").
+def tokens(ls_lines):
+    if not ls_lines:
+        return np.empty((0,0),dtype=str)
+    a_counts=np.char.count(np.array(ls_lines),' ')
+    i_max=int(a_counts.max())
+    if not (a_counts==i_max).all():
+        ls_lines=[s_line+' -'*(i_max-i_count) for s_line,i_count in zip(ls_lines,a_counts)]
+    return np.array(' '.join(ls_lines).split()).reshape(len(ls_lines),-1)
+# END FUNCTION
+
+
+# CLASS Table
+# A time step table. times holds the time column as text, text holds the
+# other entries as text (missing data as "-"), and values holds them as
+# numbers (missing data as NaN).
+class Table:
+    ls_arrays=['times','text','values']
+
+    def __init__(self,times,text,values=None):
+        self.times=times
+        self.text=text
+        if values is None:
+            values=np.full(text.shape,np.nan)
+            b_number=~(text=='-')
+            values[b_number]=text[b_number].astype(float)
+        self.values=values
+
+    # Saves the arrays as s_stem.times.npy, s_stem.text.npy and
+    # s_stem.values.npy. Each is written under a temporary name and renamed,
+    # values last, so that other processes never load a partial table.
+    def save(self,s_stem):
+        for s_array in self.ls_arrays:
+            s_file=s_stem+'.'+s_array+'.npy'
+            s_tmp=s_stem+'.'+s_array+'.'+str(getpid())+'.npy'
+            np.save(s_tmp,getattr(self,s_array))
+            rename(s_tmp,s_file)
+
+    # Loads a table saved by save, memory-mapped read only. Returns None if
+    # there is no complete table saved as s_stem.
+    @classmethod
+    def load(cls,s_stem):
+        if not path.isfile(s_stem+'.values.npy'):
+            return None
+        try:
+            return cls(*[np.load(s_stem+'.'+s_array+'.npy',mmap_mode='r') for s_array in cls.ls_arrays])
+        except (OSError,ValueError):
+            return None
+
+    # Number of data columns.
+    def columns(self):
+        return self.text.shape[1]
+
+    # Returns the occupied periods (runs of time steps with data) in data
+    # column i_col (counting from 1), as a list of text blocks of "time value"
+    # lines, as written by get_singleZoneAllRecursive.awk for each recursion.
+    def runs(self,i_col):
+        if i_col<1 or i_col>self.columns():
+            return []
+        b=~np.isnan(self.values[:,i_col-1])
+        a_edges=np.diff(np.concatenate(([0],b.astype(np.int8),[0])))
+        a_starts=np.flatnonzero(a_edges==1)
+        a_ends=np.flatnonzero(a_edges==-1)
+        a_lines=np.char.add(np.char.add(self.times,' '),self.text[:,i_col-1])
+        return ['\n'.join(a_lines[i_start:i_end]) for i_start,i_end in zip(a_starts,a_ends)]
+
+    # Returns minimum, maximum and average of each data column, as text in
+    # the form written by get_minMaxAves.awk ("not_occ" if there is no data).
+    def min_max_aves(self):
+        ls=[]
+        for i_col in range(self.columns()):
+            a=self.values[:,i_col]
+            b=~np.isnan(a)
+            if not b.any():
+                ls.append('not_occ')
+                continue
+            a_rows=np.flatnonzero(b)
+            s_min=self.text[a_rows[np.argmin(a[b])],i_col]
+            s_max=self.text[a_rows[np.argmax(a[b])],i_col]
+            ls.append(s_min+' '+s_max+' '+format_number(np.mean(a[b])))
+        return ls
+
+    # Returns the time of the largest positive value in each data column, as
+    # "day_hour" text (get_timeWorstDiscomfort.awk), or as the day number if
+    # b_day is True (get_dayWorstDiscomfort.awk). Columns with no positive
+    # values give day 0, as in the awk scripts.
+    def worst_times(self,b_day=False):
+        ls=[]
+        a_times=self.times.astype(float)
+        for i_col in range(self.columns()):
+            a=np.where(np.isnan(self.values[:,i_col]),-np.inf,self.values[:,i_col])
+            i_row=int(np.argmax(a)) if a.size else 0
+            r_time=a_times[i_row] if a.size and a[i_row]>0 else 0.0
+            i_day=int(r_time)
+            if b_day:
+                ls.append('%d'%i_day)
+            else:
+                ls.append('%d_'%i_day+format_number((r_time-i_day)*24))
+        return ls
+# END CLASS
+
+
+# FUNCTION cache_stem
+# Returns the cache file stem in directory s_cacheDir for tables ls_files.
+def cache_stem(ls_files,s_cacheDir):
+    md5=hashlib.md5()
+    for s_file in ls_files:
+        try:
+            st=stat(s_file)
+        except OSError:
+            raise ResAnalysisError('could not open file "'+s_file+'"')
+        md5.update('{} {:d} {:d}\n'.format(path.abspath(s_file),st.st_size,st.st_mtime_ns).encode())
+    return path.join(s_cacheDir,md5.hexdigest())
+# END FUNCTION
+
+
+# FUNCTION read_table
+# Reads time step tables ls_files, one after the other, into a Table. If
+# s_cacheDir is an existing directory, the table is loaded from the cache if
+# it is there, and saved to it if not.
+def read_table(ls_files,s_cacheDir=None):
+    s_stem=None
+    if s_cacheDir and path.isdir(s_cacheDir):
+        s_stem=cache_stem(ls_files,s_cacheDir)
+        tbl=Table.load(s_stem)
+        if tbl is not None:
+            return tbl
+    tbl=parse_table(ls_files)
+    if s_stem:
+        try:
+            tbl.save(s_stem)
+        except OSError:
+            pass
+    return tbl
+# END FUNCTION
+
+
+# FUNCTION parse_table
+# Parses the text of time step tables ls_files into a Table.
+def parse_table(ls_files):
+    ls_lines=read_text(ls_files)
+    ls_lines=[re_notNumber.sub('-',re_twoWordMissing.sub('-',s_line)) for s_line in ls_lines]
+    a=tokens(ls_lines)
+    if a.shape[0]==0 or a.shape[1]<1:
+        raise ResAnalysisError('no data in "'+'", "'.join(ls_files)+'"')
+    return Table(a[:,0],a[:,1:])
+# END FUNCTION
+
+
+# CLASS Deviation
+# Deviation of time step data from comfort criteria. values holds the
+# deviation (NaN where there is no data, or no discomfort), and occupied is
+# True where there is data.
+class Deviation:
+    def __init__(self,values,occupied):
+        self.values=values
+        self.occupied=occupied
+
+    # Returns the deviation of the data in Table tbl from criteria.
+    # If only criteria is given, data further from zero than criteria is in
+    # discomfort (get_deviation.awk). Otherwise data above upper or below
+    # lower is in discomfort (get_deviation_upAndLow.awk); if upper_finish
+    # and lower_finish are also given, the criteria vary linearly from upper
+    # and lower on the first row to upper_finish and lower_finish on the last
+    # (get_deviation_upAndLow_linear.awk).
+    @classmethod
+    def from_table(cls,tbl,criteria=None,upper=None,lower=None,upper_finish=None,lower_finish=None):
+        a=tbl.values
+        b_occ=~np.isnan(a)
+        with np.errstate(invalid='ignore'):
+            if upper is None and lower is None:
+                if criteria is None: criteria=0.0
+                b_dis=np.abs(a)-abs(criteria)>0
+                a_dev=a-criteria
+            else:
+                if upper is None: upper=1.0
+                if lower is None: lower=0.0
+                a_upper=np.full(a.shape[0],upper)
+                a_lower=np.full(a.shape[0],lower)
+                if upper_finish is not None or lower_finish is not None:
+                    if upper_finish is None: upper_finish=upper
+                    if lower_finish is None: lower_finish=lower
+                    a_frac=np.arange(a.shape[0])/max(a.shape[0]-1,1)
+                    a_upper=upper+(upper_finish-upper)*a_frac
+                    a_lower=lower+(lower_finish-lower)*a_frac
+                a_above=a-a_upper[:,None]
+                a_below=a_lower[:,None]-a
+                a_dev=np.where(a_above>0,a_above,-a_below)
+                b_dis=(a_above>0)|(a_below>0)
+        return cls(np.where(b_dis,a_dev,np.nan),b_occ)
+
+    # Reads deviation tables ls_files (as written by text), one after the
+    # other.
+    @classmethod
+    def read(cls,ls_files):
+        a=tokens(read_text(ls_files))
+        b_occ=~(a=='-')
+        b_dis=b_occ&~(a=='x')
+        a_dev=np.full(a.shape,np.nan)
+        a_dev[b_dis]=a[b_dis].astype(float)
+        return cls(a_dev,b_occ)
+
+    # Stacks the rows of Deviations ls_devs.
+    @classmethod
+    def concatenate(cls,ls_devs):
+        return cls(np.concatenate([dev.values for dev in ls_devs]),np.concatenate([dev.occupied for dev in ls_devs]))
+
+    # Returns the deviation as text, one line for each time step, with "x"
+    # where there is no discomfort and "-" where there is no data.
+    def text(self):
+        a=np.full(self.values.shape,'x',dtype=object)
+        a[~self.occupied]='-'
+        b_dis=~np.isnan(self.values)
+        a[b_dis]=[format_number(r) for r in self.values[b_dis]]
+        return ''.join(' '.join(a_row)+'\n' for a_row in a)
+
+    # Returns the percentage of occupied time in discomfort for each column,
+    # with NaN for columns without data (get_percentTimeDiscomfort.awk).
+    # If groups is given, it is a list of the number of adjacent columns
+    # making up each output column (e.g. the floor surfaces of each zone); a
+    # time step is in discomfort if any of its columns is, and a group of 0
+    # columns is never occupied.
+    def percent_time_discomfort(self,groups=None):
+        b_occ=self.occupied
+        b_dis=~np.isnan(self.values)
+        if groups is not None:
+            b_occ=group_any(b_occ,groups)
+            b_dis=group_any(b_dis,groups)
+        a_tot=np.count_nonzero(b_occ,axis=0)
+        a_dis=np.count_nonzero(b_dis,axis=0)
+        with np.errstate(invalid='ignore',divide='ignore'):
+            return np.where(a_tot>0,a_dis/a_tot*100,np.nan)
+# END CLASS
+
+
+# FUNCTION group_any
+# Returns 2D boolean array b combined over groups of adjacent columns, with
+# ls_groups giving the number of columns in each group.
+def group_any(b,ls_groups):
+    b_out=np.zeros((b.shape[0],len(ls_groups)),dtype=bool)
+    i_col=0
+    for i,i_num in enumerate(ls_groups):
+        if i_num>0:
+            b_out[:,i]=b[:,i_col:i_col+i_num].any(axis=1)
+            i_col+=i_num
+    return b_out
+# END FUNCTION
+
+
+# FUNCTION format_ptd
+# Returns percentages of time in discomfort a_ptd as text, with "not_occ"
+# for columns without data.
+def format_ptd(a_ptd):
+    return ['not_occ' if np.isnan(r) else '%.1f'%r for r in a_ptd]
+# END FUNCTION
+
+
+# FUNCTION severity_ratings
+# Returns severity ratings for percentages of time in discomfort a_ptd:
+# -1 if not occupied, 0 if compliant and 1 if not (get_severityRating.awk).
+# The percentages are rated as printed by format_ptd (to 1 decimal place),
+# so that a rating never contradicts the percentage reported with it.
+def severity_ratings(a_ptd):
+    a_ptd=np.array([float(s) if s!='not_occ' else np.nan for s in format_ptd(a_ptd)])
+    return np.where(np.isnan(a_ptd),i_notOccupied,np.where(a_ptd==0,i_compliant,i_nonCompliant))
+# END FUNCTION
+
+
+# FUNCTION frequency_rating
+# Returns a description of how many of the ratings ls_ratings are
+# s_severity ("discomfort" counts both "severe" and "moderate"), as
+# get_frequencyRating.awk.
+def frequency_rating(ls_ratings,s_severity='none'):
+    i_num=len(ls_ratings)
+    if s_severity=='discomfort':
+        i_count=sum(1 for s in ls_ratings if s in ('severe','moderate'))
+    else:
+        i_count=sum(1 for s in ls_ratings if s==s_severity)
+    if i_count==0: return 'no zones'
+    if i_count==1: return 'one zone'
+    if i_count<i_num/4: return 'few zones'
+    if i_count<=i_num/2: return 'several zones'
+    if i_count<i_num: return 'most zones'
+    return 'all zones'
+# END FUNCTION
+
+
+# FUNCTION critical_zone
+# Returns the zone number, day, absolute value and hour of the largest
+# absolute maximum or minimum in res summary statistics s_file, as
+# get_criticalZone.awk, or None if there are no data.
+def critical_zone(s_file):
+    s_header='Description Max_value Max_occur Min_value Min_occur Ave_value Std_dev'
+    try:
+        f=open(s_file,'r')
+    except OSError:
+        raise ResAnalysisError('could not open file "'+s_file+'"')
+    worst=None
+    b_active=False
+    i_zone=0
+    for s_line in f:
+        s_line=s_line.rstrip('\n')
+        if s_line==s_header:
+            b_active=True
+            continue
+        if not b_active:
+            continue
+        ls=s_line.split()
+        if not ls:
+            i_zone=0
+            b_active=False
+            continue
+        i_zone+=1
+        if ls[1:3]==['No','data:']:
+            continue
+        r_max=abs(float(ls[1]))
+        r_min=abs(float(ls[3]))
+        s_occur=ls[4] if r_max<r_min else ls[2]
+        r_abs=max(r_max,r_min)
+        if worst is None or r_abs>worst[2]:
+            worst=(i_zone,s_occur[0:6],r_abs,s_occur[7:9])
+    f.close()
+    return worst
+# END FUNCTION
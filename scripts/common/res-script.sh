@@ -0,0 +1,134 @@
+#! /bin/bash
+
+# ESRU 2018
+
+# Helpers for building res scripts that export many columns in one session.
+# This file should be sourced, not executed.
+# res can only export a limited number of columns (41) to a file at once,
+# so exports of many zones or sensors are split into chunks, each written to
+# its own file and joined back together afterwards. The chunks are planned
+# here before any res commands are written, so that every chunk of every
+# export can go into a single res script, and res only needs to open the
+# results library once.
+
+# planChunks prints the chunks needed to export the given number of columns
+# (e.g. MRT sensors) for each zone, with at most max-columns columns in each
+# chunk. Zones with no columns are left out. If split-zones is true, a
+# zone's columns may be spread over two chunks; otherwise each zone is kept
+# whole, and a chunk is started whenever the next zone would not fit (a
+# zone with more than max-columns columns is still split).
+# Each chunk is printed as one word, "zones/columns", where zones is a comma
+# separated list of the zones to select and columns is a comma separated
+# list of the columns to select, numbered from 1 over the selected zones in
+# turn. For example, "planChunks 41 true 30 30" prints "1,2/1,2,...,30,31,
+# ...,41" and "2/12,13,...,30".
+
+# Usage: planChunks max-columns split-zones count-zone-1 [count-zone-2 ...]
+
+planChunks() {
+  local max_cols="$1"
+  local split_zones="$2"
+  shift 2
+  local n
+  local izone=0
+  local icol
+  local zones=""
+  local cols=""
+  local num_cols=0
+  local num_selected=0
+  local first_col
+
+  for n in "$@"; do
+    ((izone++))
+    if [ "$n" -lt 1 ]; then continue; fi
+
+    # Start a new chunk if this zone must be kept whole and will not fit.
+    if ! "$split_zones" && [ "$num_cols" -gt 0 ] && [ "$((num_cols+n))" -gt "$max_cols" ]; then
+      echo "${zones#,}/${cols#,}"
+      zones=""; cols=""; num_cols=0; num_selected=0
+    fi
+
+    first_col="$((num_selected+1))"
+    zones="$zones,$izone"
+    ((num_selected+=n))
+    icol=0
+    while [ "$icol" -lt "$n" ]; do
+      if [ "$num_cols" -eq "$max_cols" ]; then
+        echo "${zones#,}/${cols#,}"
+        zones=",$izone"; cols=""; num_cols=0
+        first_col=1
+        num_selected="$n"
+      fi
+      cols="$cols,$((first_col+icol))"
+      ((num_cols++))
+      ((icol++))
+    done
+  done
+  if [ "$num_cols" -gt 0 ]; then
+    echo "${zones#,}/${cols#,}"
+  fi
+}
+
+# chunkZones and chunkColumns print the zones and columns of a chunk from
+# planChunks, one per line.
+
+# Usage: chunkZones chunk
+#        chunkColumns chunk
+
+chunkZones() {
+  local zones="${1%%/*}"
+  echo "${zones//,/$'\n'}"
+}
+
+chunkColumns() {
+  local cols="${1#*/}"
+  echo "${cols//,/$'\n'}"
+}
+
+# resSelectChunk prints res commands that select the zones of a chunk from
+# planChunks, then the chunk's columns from the sensor list of the given
+# res menu option (e.g. "c f" for radiant asymmetry). The zone selection is
+# left out if there is only one zone in the model.
+
+# Usage: resSelectChunk chunk number-of-zones menu-option [menu-option ...]
+
+resSelectChunk() {
+  local chunk="$1"
+  local number_zones="$2"
+  shift 2
+  local zones="${chunk%%/*}"
+  local cols="${chunk#*/}"
+  local commas
+  local opt
+
+  if [ "$number_zones" -gt 1 ]; then
+    commas="${zones//[^,]}"
+    echo "4"
+    echo "<"
+    echo "$((${#commas}+1))"
+    chunkZones "$chunk"
+  fi
+  for opt in "$@"; do
+    echo "$opt"
+  done
+  commas="${cols//[^,]}"
+  echo "<"
+  echo "$((${#commas}+1))"
+  chunkColumns "$chunk"
+}
+
+# chunkFiles prints the names of the files the chunks of an export are
+# written to, in order: the first chunk goes to the given file, the others
+# to file_1, file_2, ... Chunked exports are joined in this order, which a
+# glob would not give once there are ten or more files.
+
+# Usage: chunkFiles file number-of-chunks
+
+chunkFiles() {
+  local i=1
+  echo "$1"
+  while [ "$i" -lt "$2" ]; do
+    echo "${1}_$i"
+    ((i++))
+  done
+}
@@ -0,0 +1,131 @@
+#! /bin/bash
+
+# ESRU 2018
+
+# Parallel simulation of the years of multi-year assessments. This file
+# should be sourced, not executed. It needs progress.sh to have been sourced
+# as well, and bash 5.1 or later (for "wait -n -p").
+# The years are simulated in the background while the script analyses them
+# in order, each as soon as it has finished:
+#   startYears "$num_jobs" "$num_years" simulateYear "$tmp_dir" 4
+#   iyear=1
+#   while [ "$iyear" -le "$num_years" ]; do
+#     waitYear "$iyear" || exit "$?"
+#     ...
+#   done
+
+# startYears starts running a function once for each year, with the year
+# number as its argument, with up to max-jobs years running at the same
+# time. Each year runs in its own background subshell, so the function must
+# write its results to files rather than setting variables, and must not use
+# files that other years use at the same time. Years that are still running
+# when the script exits are stopped (see stopYears).
+
+# Usage: startYears max-jobs number-of-years function progress-dir progress-code
+
+years_pids=()
+years_status=()
+
+startYears() {
+  years_max_jobs="$1"
+  years_num="$2"
+  years_func="$3"
+  years_prog_dir="$4"
+  years_prog_code="$5"
+  years_next=1
+  years_done=0
+  years_failed=false
+  years_pids=()
+  years_status=()
+
+  if [ "$years_max_jobs" -lt 1 ]; then years_max_jobs=1; fi
+
+  trap stopYears EXIT
+  startNextYears
+}
+
+# startNextYears starts years until max-jobs years are running, unless a
+# year has failed, in which case no more years are started.
+
+# Usage: startNextYears
+
+startNextYears() {
+  while ! "$years_failed" && [ "$years_next" -le "$years_num" ] && [ "${#years_pids[@]}" -lt "$years_max_jobs" ]; do
+    "$years_func" "$years_next" &
+    years_pids[$years_next]="$!"
+    years_next=$((years_next+1))
+  done
+}
+
+# waitYear waits for the given year to finish, and returns its exit status.
+# While waiting, whichever year finishes first is dealt with first: a
+# progress code is written with setProgress (see progress.sh), and the next
+# year is started in its place, so that max-jobs years keep running. If a
+# year fails, no more years are started; waitYear returns 1 for a year that
+# was never started.
+
+# Usage: waitYear year
+
+waitYear() {
+  local year="$1"
+  local pid
+  local status
+  local iyear
+
+  while [ -z "${years_status[$year]}" ]; do
+    if [ "${#years_pids[@]}" -eq 0 ]; then return 1; fi
+    pid=""
+    wait -n -p pid "${years_pids[@]}"
+    status="$?"
+    if [ -z "$pid" ]; then return "$status"; fi
+    for iyear in "${!years_pids[@]}"; do
+      if [ "${years_pids[$iyear]}" == "$pid" ]; then break; fi
+    done
+    unset "years_pids[$iyear]"
+    years_status[$iyear]="$status"
+    years_done=$((years_done+1))
+    if [ "$status" -ne 0 ]; then years_failed=true; fi
+    setProgress "$years_prog_dir" "$years_prog_code" "$years_done" "$years_num"
+    startNextYears
+  done
+
+  return "${years_status[$year]}"
+}
+
+# stopYears stops any years that are still running, along with the programs
+# they have started (e.g. bps), for example once a year has failed the
+# assessment and the others are no longer needed.
+
+# Usage: stopYears
+
+stopYears() {
+  local pid
+  local children
+
+  for pid in "${years_pids[@]}"; do
+    children="$(pgrep -P "$pid")"
+    kill "$pid" 2> /dev/null
+    if [ "X$children" != "X" ]; then kill $children 2> /dev/null; fi
+  done
+  for pid in "${years_pids[@]}"; do
+    wait "$pid" 2> /dev/null
+  done
+  years_pids=()
+}
+
+# numJobs gives the number of years to run at the same time: the number
+# given if it is more than zero, otherwise this job's share of the CPUs
+# (MARATHON_JOB_CPUS, set by the Marathon service for each job, as several
+# jobs may be running at once), or one year at a time if that is not set.
+
+# Usage: numJobs max-jobs
+
+numJobs() {
+  if [ "$1" -gt 0 ]; then
+    echo "$1"
+  elif [ "${MARATHON_JOB_CPUS:-0}" -gt 0 ] 2> /dev/null; then
+    echo "$MARATHON_JOB_CPUS"
+  else
+    echo 1
+  fi
+}
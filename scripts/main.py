@@ -10,32 +10,56 @@
 # intervals determined by a command line argument. Communication between 
 # the front and back ends is accomplished by an SQL database and a shared 
 # directory tree, see documentation for details.
+# In event-driven mode, only jobs that need action are fetched from the
+# database, and a dispatch also happens as soon as a running job reports
+# progress or exits.
 
 # Command line options:
 # -h, --help  - displays help text
 # -d, --debug - service prints debug information to standard out,
 #               and jobs print debug information to "[jobID].log"
 #               in the job folder (../jobs/job_[jobID]).
+# -e, --event - event-driven dispatch mode (default interval 1 second).
+# -j, --jobs  - followed by the maximum number of jobs to run at once
+#               (default from processor cores and available memory).
+# -c, --cache - followed by the size in GB of the local model cache
+#               (default 10, 0 disables). Also enables the store of
+#               trained synthetic weather models shared by jobs.
 
 # Command line arguments:
 # 1: path to shared folder
 # 2: [optional] dispatch interval in seconds
 
 import sys
-from os.path import isfile,isdir,realpath,dirname,basename
-from os import devnull,makedirs,chdir,kill,remove,rename
+from os.path import isfile,isdir,realpath,dirname,basename,join
+from os import devnull,makedirs,chdir,kill,remove,rename,stat,cpu_count,pipe,read,close,environ,utime,walk,lstat,getpid
 from subprocess import run,Popen,PIPE,STDOUT
 from time import sleep,time
+import selectors
 from multiprocessing import Process,Pipe
+from multiprocessing.connection import wait
 import re
 from datetime import datetime
-from shutil import copytree,copyfile,rmtree,move
+from shutil import copytree,copyfile,copyfileobj,rmtree,move
+import tarfile
+import zipfile
+import gzip
+import hashlib
+import fcntl
 from glob import glob
 import signal
 from mysql import connector
 import ctypes
 from setproctitle import setproctitle
 
+# Job states that may need action from the dispatcher (see i_update values
+# in main): run requested, running, queued, running with progress indicator,
+# and cancel requested. All other states are pending or terminal.
+ti_activeStates=(0,1,5,7)+tuple(range(11,20))
+
+# Criteria columns in the presets and model_inputs tables.
+s_criteriaCols=','.join('in{:02d}'.format(i) for i in range(1,31))
+
 ### FUNCTION: runJob
 # This runs a performance assessment on an ESP-r model. This should be run in a
 # seperate process, otherwise errors will terminate the main script. If
@@ -56,7 +80,7 @@ def runFakeJob(s_jobID):
     while True:
         sleep(10)
 
-def runJob(s_jobID,s_tarball,s_MD5,s_building,s_estate,s_estateType,s_asmtName,ts_criteria,b_debug,con,s_shareDir):
+def runJob(s_jobID,s_tarball,s_MD5,s_building,s_estate,s_estateType,s_asmtName,ts_criteria,b_debug,con,s_shareDir,r_cacheGB,i_jobCPUs):
 
     setproctitle('marathon'+s_jobID)
 
@@ -99,68 +123,80 @@ def runJob(s_jobID,s_tarball,s_MD5,s_building,s_estate,s_estateType,s_asmtName,t
     # Get model.
     if b_debug: f_log.write('Retrieving model file '+s_modelFile+'\n')
 
-    # # If there is an MD5 checksum passed from the front end, get checksum of the model file and compare them.
-    # # Wait up to 100 seconds for model to appear and checksums to match.  
-    # if not s_MD5sum is None:
-    #     if b_debug: f_log.write('Checking MD5 checksum ...\n')  
-    #     if b_debug: f_log.write('Checksum from front end: '+s_MD5sum+'\n')
-    #     s_MD5sum=s_MD5sum.strip()
-    #     i_count=0
-    #     s_modelMD5=''
-    #     while True:
-    #         try:
-    #             s_modelMD5=run(['md5sum',s_modelFile],check=True,sdtout=PIPE,text=True).stdout.split()[0]
-    #         except:
-    #             pass            
-    #         if b_debug:f_log.write('Local checksum: '+s_modelMD5+'\n')
-    #         if s_modelMD5==s_MD5sum: break
-    #         i_count+=1
-    #         if i_count>10:            
-    #             # Timeout.
-    #             jobError(s_jobID,'Timeout while waiting for model file "'+s_model+'"',11,b_debug,f_log,s_shareDir)
-    #         if b_debug: f_log.write('Checksum does not match, waiting ...\n')
-    #         sleep(10)
-    #     if b_debug: f_log.write('Checksum verified.\n')
-    # else:
-    #     if b_debug: f_log.write('MD5 checksum not found.\n')
-
-    # Now get the model.
-    try:
-        copyfile(s_modelFile,'./'+s_tarball)
-    except:
-        # Error - cannot find model.
-        jobError(s_jobID,'error retrieving model "'+s_tarball+'"',11,b_debug,f_log,s_shareDir)
-    else:
-        if s_ext=='zip':
-            ls_extract=['unzip']
-        elif s_ext=='tar' or s_ext=='tar.gz':
-            ls_extract=['tar','-xf']
-        elif s_ext=='xml':
-            ls_extract=['../../scripts/common/gbXMLconv/gbXMLconv.sh']
-        else:
-            jobError(s_jobID,'unrecognised model archive format (.zip, .tar, .tar.gz and .xml (gbXML) supported)',16,b_debug,f_log,s_shareDir)
-        try:
-            run(ls_extract+[s_tarball],check=True)
-            remove(s_tarball)
-        except:
-            jobError(s_jobID,'failed to extract model',16,b_debug,f_log,s_shareDir)
-        
-    # Move model into folder called "model".
-    ls_dirs=[a for a in glob('./*') if not a=='./tmp' and not a=='./outputs' and isdir(a)]
-    makedirs('model')
-    if len(ls_dirs)==1:
-    # One directory found, probably means the model directories are inside this.
-        try:
-            run(['mv','-t','model']+glob('./'+ls_dirs[0]+'/*'),check=True)
-        except:
-            jobError(s_jobID,'failed to extract model',16,b_debug,f_log,s_shareDir)
-        rmtree(ls_dirs[0])
-    else:
+    if not s_ext in ['zip','tar','tar.gz','xml']:
+        jobError(s_jobID,'unrecognised model archive format (.zip, .tar, .tar.gz and .xml (gbXML) supported)',16,b_debug,f_log,s_shareDir)
+
+    # If there is an MD5 checksum passed from the front end, the model can be
+    # found in the local model cache by its checksum.
+    if not s_MD5 is None:
+        s_MD5=s_MD5.strip().lower()
+        if s_MD5=='': s_MD5=None
+        if b_debug: f_log.write('Checksum from front end: '+str(s_MD5)+'\n')
+    s_cacheEntry=None
+    b_cached=False
+    if r_cacheGB>0 and not s_MD5 is None and re.fullmatch('[0-9a-f]{32}',s_MD5):
+        s_cacheEntry=getCacheDir()+'/'+s_MD5
+        b_cached=cloneCachedModel(s_cacheEntry,'model')
+        if b_debug:
+            if b_cached:
+                f_log.write('Model found in cache '+s_cacheEntry+'\n')
+            else:
+                f_log.write('Model not found in cache\n')
+
+    if not b_cached:
+        # Extract the model straight from the shared folder into "model.part".
+        # If there is an MD5 checksum passed from the front end, compare it with
+        # the checksum of the model file, which is taken on the way. Wait up to
+        # 100 seconds for model to appear and checksums to match.
+        i_count=0
+        while True:
+            if isdir('model.part'): rmtree('model.part')
+            makedirs('model.part')
+            try:
+                s_modelMD5=stageModel(s_modelFile,s_ext,'model.part')
+            except (tarfile.TarError,zipfile.BadZipFile,gzip.BadGzipFile,EOFError,ValueError):
+                s_err='failed to extract model'
+                i_err=16
+            except:
+                # Error - cannot find model.
+                s_err='error retrieving model "'+s_tarball+'"'
+                i_err=11
+            else:
+                if b_debug: f_log.write('Local checksum: '+s_modelMD5+'\n')
+                if s_MD5 is None or s_modelMD5==s_MD5: break
+                s_err='checksum of model "'+s_tarball+'" does not match'
+                i_err=11
+            i_count+=1
+            if s_MD5 is None or i_count>10:
+                jobError(s_jobID,s_err,i_err,b_debug,f_log,s_shareDir)
+            if b_debug: f_log.write('Model not ready ('+s_err+'), waiting ...\n')
+            sleep(10)
+        if b_debug:
+            if s_MD5 is None:
+                f_log.write('MD5 checksum not found.\n')
+            else:
+                f_log.write('Checksum verified.\n')
+
+        # Move model into folder called "model".
+        ls_dirs=[a for a in glob('model.part/*') if isdir(a)]
         try:
-            run(['mv','-t','model']+ls_dirs,check=True)  
+            if len(ls_dirs)==1:
+                # One directory found, probably means the model directories are inside this.
+                rename(ls_dirs[0],'model')
+            else:
+                makedirs('model')
+                for s_dir in ls_dirs:
+                    rename(s_dir,'model/'+basename(s_dir))
+            rmtree('model.part')
         except:
             jobError(s_jobID,'failed to extract model',16,b_debug,f_log,s_shareDir)
 
+        # Keep a copy of the model in the cache for later jobs, before the
+        # assessment makes any changes to it.
+        if not s_cacheEntry is None:
+            publishModel(s_cacheEntry,'model',r_cacheGB)
+            if b_debug: f_log.write('Model added to cache '+s_cacheEntry+'\n')
+
     # Find cfg file. Must be only one in the cfg directory.
     ls_cfg=glob('model/cfg/*.cfg')
     if len(ls_cfg)==0:
@@ -223,10 +259,34 @@ Assessment: '''+s_asmtName+''' \\\\
     i_prgv=2
     con.send(i_prgv)
 
+    # Open a pipe for the assessment script to report progress through
+    # (see scripts/common/progress.sh). The write end is inherited by the
+    # script, and its file descriptor given in MARATHON_PROGRESS_FD.
+    i_prgRead,i_prgWrite=pipe()
+    dict_env=dict(environ)
+    dict_env['MARATHON_PROGRESS_FD']=str(i_prgWrite)
+
+    # If the model is in the cache, esp-query results are cached alongside it.
+    if not s_cacheEntry is None and isdir(s_cacheEntry+'/query'):
+        dict_env['ESPQUERY_CACHE_DIR']=realpath(s_cacheEntry+'/query')
+
+    # Trained synthetic weather models are shared between jobs in a store
+    # next to the model cache (see common/SyntheticWeather/modelstore.py).
+    if r_cacheGB>0:
+        dict_env['INDRA_MODEL_STORE']=realpath(dirname(getCacheDir())+'/indra')
+
+    # Each job gets an equal share of the processor cores, which the
+    # assessment scripts use by default to simulate years and train
+    # synthetic weather models in parallel, so that running the maximum
+    # number of jobs at once does not oversubscribe the machine.
+    dict_env['MARATHON_JOB_CPUS']=str(i_jobCPUs)
+
     # Run assessment.
-    proc=Popen([s_asmtScript]+ls_args,stdout=PIPE,stderr=PIPE,preexec_fn=set_pdeathsig(signal.SIGKILL))
+    proc=Popen([s_asmtScript]+ls_args,stdout=PIPE,stderr=PIPE,pass_fds=(i_prgWrite,),env=dict_env,preexec_fn=set_pdeathsig(signal.SIGKILL))
+    close(i_prgWrite)
 
-    # Read file tmp/progress.txt every second to keep track of progress.
+    # Wait for progress updates, and collect output, until the assessment
+    # script and anything it started have closed the pipes.
     # Progress = ...
     # 1: job started
     # 2: starting RA
@@ -238,27 +298,48 @@ Assessment: '''+s_asmtName+''' \\\\
     # 8: RA generating reports
     # 9: uploading results
     # 0: job complete
-    s_prg='tmp/progress.txt'
-    i_prgp=i_prgv
-    while proc.poll()==None:
-        sleep(1)
-        if isfile(s_prg):
-            f_prg=open(s_prg,'r')
-            i_prgv=int(f_prg.readline().strip())
-            f_prg.close()
-        if i_prgv>i_prgp:
-            con.send(i_prgv)
-            i_prgp=i_prgv
-
-    # Final progress value.
-    if isfile(s_prg):
-        f_prg=open(s_prg,'r')
-        i_prgv=int(f_prg.readline().strip())
-        f_prg.close()
-    if i_prgv>i_prgp:
-        con.send(i_prgv)
-
-    t_tmp=(proc.stdout.read(),proc.stderr.read())
+    # Each update is a line containing the progress code, optionally followed
+    # by the current step and number of steps within that stage (e.g. the
+    # year being simulated). Updates with steps are sent on as tuples.
+    ls_out=[]
+    ls_err=[]
+    sel=selectors.DefaultSelector()
+    sel.register(proc.stdout,selectors.EVENT_READ,ls_out)
+    sel.register(proc.stderr,selectors.EVENT_READ,ls_err)
+    sel.register(i_prgRead,selectors.EVENT_READ,None)
+    s_prgBuf=''
+    t_prgp=(i_prgv,)
+    while len(sel.get_map())>0:
+        for (key,mask) in sel.select():
+            if key.data is None:
+                s_data=read(key.fd,4096).decode()
+            else:
+                s_data=key.fileobj.read1(65536)
+            if len(s_data)==0:
+                sel.unregister(key.fileobj)
+                if key.data is None: close(key.fd)
+                continue
+            if not key.data is None:
+                key.data.append(s_data)
+                continue
+            s_prgBuf+=s_data
+            ls_lines=s_prgBuf.split('\n')
+            s_prgBuf=ls_lines.pop()
+            for s_line in ls_lines:
+                try:
+                    t_prgv=tuple(int(a) for a in s_line.split())
+                except ValueError:
+                    continue
+                if len(t_prgv)==0 or t_prgv[0]<t_prgp[0] or t_prgv==t_prgp: continue
+                if len(t_prgv)<3:
+                    con.send(t_prgv[0])
+                else:
+                    con.send(t_prgv[:3])
+                t_prgp=t_prgv
+    sel.close()
+    proc.wait()
+
+    t_tmp=(b''.join(ls_out),b''.join(ls_err))
 
     if b_debug:
         f_log.write('\nPerformance assessment finished, output follows:\n'+t_tmp[0].decode()+'\n')
@@ -282,24 +363,31 @@ Assessment: '''+s_asmtName+''' \\\\
     i_prgv=9
     con.send(i_prgv)
 
+    s_DBjobDir=s_shareDir+'/Results/'+s_jobID
+    try:
+        rmtree(s_DBjobDir)
+    except OSError:
+        pass
+    makedirs(s_DBjobDir)
+
     # If not a dummy RA, and the result is a fail, create tarball of simulation results and model (because you need the model to view results).
+    # This is written straight into the shared folder.
     if not b_dummy and i_pFlag==1:
+        if b_debug: f_log.write('Writing simulation results tarball to shared folder ...\n')
         ls_simRes=glob('simulation_results.*')
         try:
-            run(['tar','-czf','res.tar.gz','model']+ls_simRes,check=True)
+            tar=tarfile.open(s_DBjobDir+'/res.tar.gz.part','w:gz',compresslevel=6)
+            for s_path in ['model']+ls_simRes:
+                tar.add(s_path)
+            tar.close()
+            rename(s_DBjobDir+'/res.tar.gz.part',s_DBjobDir+'/res.tar.gz')
         except:
             jobError(s_jobID,'Could not create simulation results tarball\n',18,b_debug,f_log,s_shareDir)
         else:
-            run(['mv','-t','outputs','res.tar.gz'])
-            run(['rm']+ls_simRes)
+            for s_path in ls_simRes:
+                remove(s_path)
 
     if b_debug: f_log.write('Copying outputs to shared folder ...\n')
-    s_DBjobDir=s_shareDir+'/Results/'+s_jobID
-    try:
-        rmtree(s_DBjobDir)
-    except OSError:
-        pass
-    makedirs(s_DBjobDir)
     ls_outputs=glob('outputs/*')
     for s_output in ls_outputs:
         if b_debug: f_log.write('Copying '+basename(s_output)+' ...\n')
@@ -336,6 +424,210 @@ Assessment: '''+s_asmtName+''' \\\\
 ### END FUNCTION
 
 
+### CLASS: MD5Reader
+# Wraps a binary file object, and keeps an MD5 checksum of everything read
+# through it, so that an archive can be checked while it is extracted.
+class MD5Reader:
+    def __init__(self,f):
+        self.f=f
+        self.md5=hashlib.md5()
+
+    def read(self,i_size=-1):
+        b_data=self.f.read(i_size)
+        self.md5.update(b_data)
+        return b_data
+
+    # Returns the checksum of the whole file, including anything that has
+    # not been read yet (e.g. padding after the end of an archive).
+    def hexdigest(self):
+        while len(self.read(1048576))>0: pass
+        return self.md5.hexdigest()
+
+### END CLASS
+
+
+### FUNCTION: isSafePath
+# Checks that path s_path, relative to directory s_dir, does not lead
+# outside s_dir. Used to guard against archive members with absolute paths,
+# ".." components or links that point elsewhere.
+def isSafePath(s_dir,s_path):
+    s_root=realpath(s_dir)
+    s_full=realpath(join(s_root,s_path))
+    return s_full==s_root or s_full.startswith(s_root+'/')
+
+### END FUNCTION
+
+
+### FUNCTION: stageModel
+# Extracts model file s_modelFile, with extension s_ext, into directory
+# s_dest in a single pass, and returns the MD5 checksum of the model file.
+# Tar archives are streamed and checksummed as they are read. Zip archives
+# need random access, so they are checksummed first. gbXML files are copied
+# (checksummed on the way) and converted to an ESP-r model.
+def stageModel(s_modelFile,s_ext,s_dest):
+    f_model=open(s_modelFile,'rb')
+    try:
+        if s_ext=='zip':
+            md5=hashlib.md5()
+            for b_data in iter(lambda: f_model.read(1048576),b''):
+                md5.update(b_data)
+            zf=zipfile.ZipFile(f_model)
+            for s_name in zf.namelist():
+                if not isSafePath(s_dest,s_name):
+                    raise ValueError('unsafe path "'+s_name+'" in model archive')
+            zf.extractall(s_dest)
+            zf.close()
+            return md5.hexdigest()
+        reader=MD5Reader(f_model)
+        if s_ext=='xml':
+            s_xml=s_dest+'/'+basename(s_modelFile)
+            f_xml=open(s_xml,'wb')
+            copyfileobj(reader,f_xml)
+            f_xml.close()
+            run(['../../scripts/common/gbXMLconv/gbXMLconv.sh',s_xml],check=True)
+            for s_path in glob(s_dest+'/*.xml'):
+                remove(s_path)
+        else:
+            tar=tarfile.open(fileobj=reader,mode='r|*')
+            for member in tar:
+                if not isSafePath(s_dest,member.name) or \
+                   (member.issym() and not isSafePath(s_dest,join(dirname(member.name),member.linkname))) or \
+                   (member.islnk() and not isSafePath(s_dest,member.linkname)):
+                    raise ValueError('unsafe path "'+member.name+'" in model archive')
+                if hasattr(tarfile,'data_filter'):
+                    tar.extract(member,s_dest,filter='data')
+                else:
+                    tar.extract(member,s_dest)
+            tar.close()
+        return reader.hexdigest()
+    finally:
+        f_model.close()
+
+### END FUNCTION
+
+
+### FUNCTION: getCacheDir
+# Returns the path of the local model cache. Each entry in the cache is a
+# directory named by the MD5 checksum of the model file, containing the
+# extracted model ("model"), cached esp-query results ("query"), and the
+# size of the extracted model in bytes ("size"). The modification time of an
+# entry directory is updated whenever it is used.
+# Assumes that "../cache" can be created from the location of this script.
+def getCacheDir():
+    return dirname(realpath(__file__))+'/../cache/models'
+
+### END FUNCTION
+
+
+### FUNCTION: lockCache
+# Locks the model cache, exclusively if b_excl is True, otherwise shared.
+# Entries are only added or removed under an exclusive lock, and only cloned
+# under a shared lock. Returns the lock file; close it to release the lock.
+def lockCache(b_excl):
+    makedirs(getCacheDir(),exist_ok=True)
+    f_lock=open(getCacheDir()+'/.lock','a')
+    fcntl.flock(f_lock,fcntl.LOCK_EX if b_excl else fcntl.LOCK_SH)
+    return f_lock
+
+### END FUNCTION
+
+
+### FUNCTION: cloneCachedModel
+# Copies the model from cache entry s_entry to s_dest, if the entry exists.
+# Copies are copy-on-write where the file system supports it. Returns True if
+# the model was copied.
+def cloneCachedModel(s_entry,s_dest):
+    f_lock=lockCache(False)
+    try:
+        if not isdir(s_entry+'/model'): return False
+        run(['cp','-a','--reflink=auto',s_entry+'/model',s_dest],check=True)
+        utime(s_entry)
+    except:
+        if isdir(s_dest): rmtree(s_dest)
+        return False
+    finally:
+        f_lock.close()
+    return True
+
+### END FUNCTION
+
+
+### FUNCTION: dirSize
+# Returns the total size in bytes of the files in directory s_dir and its
+# subdirectories.
+def dirSize(s_dir):
+    return sum(lstat(join(s_root,s_file)).st_size for (s_root,ls_dirs,ls_files) in walk(s_dir) for s_file in ls_files)
+
+### END FUNCTION
+
+
+### FUNCTION: publishModel
+# Adds model s_model to the cache as entry s_entry, then evicts the least
+# recently used entries until the cache is no larger than r_cacheGB GB. The
+# entry is assembled under a temporary name and renamed into place, so that
+# other jobs never see a partial entry. Failures are ignored, as the cache
+# is only an optimisation.
+def publishModel(s_entry,s_model,r_cacheGB):
+    s_tmp=s_entry+'.part'+str(getpid())
+    try:
+        makedirs(getCacheDir(),exist_ok=True)
+        if isdir(s_tmp): rmtree(s_tmp)
+        makedirs(s_tmp+'/query')
+        run(['cp','-a','--reflink=auto',s_model,s_tmp+'/model'],check=True)
+        i_size=dirSize(s_tmp+'/model')
+        f_size=open(s_tmp+'/size','w')
+        f_size.write(str(i_size)+'\n')
+        f_size.close()
+    except:
+        rmtree(s_tmp,ignore_errors=True)
+        return
+    f_lock=lockCache(True)
+    try:
+        if isdir(s_entry):
+            # Another job got there first.
+            rmtree(s_tmp,ignore_errors=True)
+        else:
+            rename(s_tmp,s_entry)
+        evictModels(r_cacheGB)
+    except:
+        pass
+    finally:
+        f_lock.close()
+
+### END FUNCTION
+
+
+### FUNCTION: evictModels
+# Removes the least recently used entries from the model cache until it is
+# no larger than r_cacheGB GB. The cache must be locked exclusively.
+# The size of each entry is that of its model, recorded when it was added,
+# plus that of its query cache, which esp-query fills in as jobs use the
+# entry, so it is measured each time.
+def evictModels(r_cacheGB):
+    lt_entries=[]
+    for s_entry in glob(getCacheDir()+'/*'):
+        if not re.fullmatch('[0-9a-f]{32}',basename(s_entry)): continue
+        try:
+            f_size=open(s_entry+'/size','r')
+            i_size=int(f_size.readline().strip())
+            f_size.close()
+        except:
+            i_size=0
+        try:
+            i_size+=dirSize(s_entry+'/query')
+        except:
+            pass
+        lt_entries.append((stat(s_entry).st_mtime,i_size,s_entry))
+    lt_entries.sort(reverse=True)
+    i_total=0
+    for (r_mtime,i_size,s_entry) in lt_entries:
+        i_total+=i_size
+        if i_total>r_cacheGB*1024**3:
+            rmtree(s_entry,ignore_errors=True)
+
+### END FUNCTION
+
+
 ### FUNCTION: jobError
 # Writes an error file for a simulation job and exits with a fail code.
 # If debugging, closes the log file. 
@@ -397,6 +689,21 @@ def jobError(s_jobID,s_message,i_errorCode,b_debug,f_log,s_shareDir):
 ### END FUNCTION
 
 
+### FUNCTION: getSignal
+# Receives a signal from a job through its pipe connection. Progress updates
+# that include the current step within a stage arrive as a tuple of (code,
+# step, number of steps); the step is printed in debug mode, and only the
+# code is returned.
+def getSignal(con,b_debug):
+    i_sig=con.recv()
+    if type(i_sig)==tuple and len(i_sig)==3:
+        if b_debug: print('Marathon:   job is at step {} of {}'.format(i_sig[1],i_sig[2]))
+        i_sig=i_sig[0]
+    return i_sig
+
+### END FUNCTION
+
+
 ### FUNCTION: sleepTilNext
 # Checks the time elapsed since startTime (obtained from time() built-in),
 # compares it with r_interval, and sleeps for any remaining time.
@@ -413,6 +720,200 @@ def sleepTilNext(start_time,r_interval,b_debug):
 ### END FUNCTION
 
 
+### FUNCTION: waitTilNext
+# Event-driven counterpart of sleepTilNext. Waits for any remaining time in
+# r_interval, but returns straight away if one of the jobs in ls_jobIDs sends
+# a signal through its pipe or exits. Only jobs that were dispatched are
+# waited on, so that a signal nobody will read cannot cause a busy loop.
+def waitTilNext(start_time,r_interval,ls_jobIDs,dict_proc,dict_pipe,b_debug):
+    end_time=time()
+    time_taken=end_time-start_time
+    if b_debug: print("Marathon: dispatch took "+'{:.2f}'.format(time_taken)+" seconds")
+    if time_taken<r_interval:
+        ls_waitOn=[]
+        for s_jobID in ls_jobIDs:
+            if s_jobID in dict_proc and s_jobID in dict_pipe:
+                ls_waitOn.append(dict_pipe[s_jobID][0])
+                ls_waitOn.append(dict_proc[s_jobID].sentinel)
+        if b_debug: print('Marathon: waiting for up to '+'{:.2f}'.format(r_interval-time_taken)+' seconds on '+str(len(ls_waitOn)//2)+' job(s)')
+        if len(ls_waitOn)==0:
+            sleep(r_interval-time_taken)
+        elif wait(ls_waitOn,timeout=r_interval-time_taken):
+            if b_debug: print('Marathon: woken by job signal')
+    else:
+        if b_debug: print("Marathon: I'm late! I'm late!")
+
+### END FUNCTION
+
+
+### FUNCTION: loadSQLconfig
+# Reads SQL database details from file ".SQL.txt" into dict_db, but only if
+# the file has been modified since it was last read. If the connection
+# details have changed, the current connection is closed so that
+# getSQLconnection will reconnect with the new ones. Returns the error log
+# path.
+def loadSQLconfig(dict_db,b_debug):
+    r_mtime=stat('.SQL.txt').st_mtime
+    if r_mtime!=dict_db['mtime']:
+        f_SQL=open('.SQL.txt','r')
+        ls_config=[f_SQL.readline().strip() for i in range(5)]
+        f_SQL.close()
+        if b_debug: print('Marathon: read SQL database details')
+        if ls_config[:4]!=dict_db['config'][:4]:
+            closeSQLconnection(dict_db)
+            dict_db['fails']=0
+            dict_db['retry_time']=0
+        dict_db['config']=ls_config
+        dict_db['mtime']=r_mtime
+    return dict_db['config'][4]
+
+### END FUNCTION
+
+
+### FUNCTION: getSQLconnection
+# Returns the persistent connection to the SQL database held in dict_db,
+# after checking that it is still alive. If there is no live connection,
+# connects using the details from loadSQLconfig. After a failed attempt, no
+# further attempts are made for a back off period, which doubles with each
+# consecutive failure up to r_backoffMax seconds. Returns None if there is
+# no connection, in which case the dispatch should be skipped.
+def getSQLconnection(dict_db,r_timeout,b_debug,r_backoffMax=300):
+    (s_SQLIP,s_SQLuser,s_SQLpwd,s_SQLdbs,s_errlog)=dict_db['config']
+    cnx=dict_db['cnx']
+    if not cnx is None:
+        try:
+            if cnx.is_connected(): return cnx
+        except:
+            pass
+        printError('lost connection to SQL database',s_errlog,b_debug)
+        closeSQLconnection(dict_db)
+    if time()<dict_db['retry_time']:
+        if b_debug: print('Marathon: waiting {:.2f} seconds to reconnect to SQL database'.format(dict_db['retry_time']-time()))
+        return None
+    if b_debug: print('Marathon: connecting to SQL database at IP '+s_SQLIP)
+    try:
+        cnx=connector.connect(user=s_SQLuser,
+            password=s_SQLpwd,
+            host=s_SQLIP,
+            database=s_SQLdbs,
+            connection_timeout=r_timeout)
+        cursor=cnx.cursor(prepared=True)
+    except:
+        r_backoff=min(2**dict_db['fails'],r_backoffMax)
+        dict_db['fails']+=1
+        dict_db['retry_time']=time()+r_backoff
+        printError('failed to connect to SQL database, skipping dispatch (next attempt in {:.0f} seconds)'.format(r_backoff),s_errlog,b_debug)
+        return None
+    dict_db['cnx']=cnx
+    dict_db['cursor']=cursor
+    dict_db['fails']=0
+    return cnx
+
+### END FUNCTION
+
+
+### FUNCTION: closeSQLconnection
+# Closes the persistent connection held in dict_db, if there is one. Errors
+# are ignored, as this is used to discard connections that may be broken.
+def closeSQLconnection(dict_db):
+    if not dict_db['cnx'] is None:
+        try:
+            dict_db['cnx'].close()
+        except:
+            pass
+    dict_db['cnx']=None
+    dict_db['cursor']=None
+
+### END FUNCTION
+
+
+### FUNCTION: commitUpdates
+# Writes the status updates queued during a dispatch in lt_updates, as
+# (result,jobID) tuples, in a single transaction. This also ends the
+# transaction opened by the queries of the dispatch, so it must be called
+# even if there are no updates, otherwise the next dispatch would see the
+# same snapshot of the database.
+def commitUpdates(dict_db,lt_updates,s_errlog,b_debug):
+    try:
+        if len(lt_updates)>0:
+            dict_db['cursor'].executemany('UPDATE results SET result = %s WHERE id = %s',lt_updates)
+        dict_db['cnx'].commit()
+    except:
+        printError('failed to update SQL database',s_errlog,b_debug)
+        closeSQLconnection(dict_db)
+    else:
+        if b_debug and len(lt_updates)>0: print('Marathon: successfully updated the SQL database ({:d} job(s))'.format(len(lt_updates)))
+
+### END FUNCTION
+
+
+### FUNCTION: cacheModels
+# Retrieves the details of all models in li_models that are not already in
+# dict_models, together with the names and types of their estates, in a
+# single query. Model, estate and preset rows do not change once a job has
+# been requested, so they are cached for the lifetime of the service.
+def cacheModels(cursor,li_models,dict_models):
+    li_new=sorted(set(a for a in li_models if not a is None and not a in dict_models))
+    if len(li_new)==0: return
+    cursor.execute('''SELECT models.id,models.tarball,models.name,models.estate,models.md5,estates.name,estate_types.type
+FROM models INNER JOIN estates ON models.estate=estates.id INNER JOIN estate_types ON estates.type=estate_types.id
+WHERE models.id IN ('''+','.join(['%s']*len(li_new))+')',tuple(li_new))
+    for (i_model,s_tarball,s_building,i_estate,s_MD5,s_estate,s_estateType) in cursor.fetchall():
+        dict_models[i_model]=(s_tarball,s_building,i_estate,s_MD5,s_estate,s_estateType)
+
+### END FUNCTION
+
+
+### FUNCTION: cachePresets
+# Retrieves the custom flag and criteria of all presets in li_presets that
+# are not already in dict_presets, in a single query.
+def cachePresets(cursor,li_presets,dict_presets):
+    li_new=sorted(set(a for a in li_presets if not a is None and not a in dict_presets))
+    if len(li_new)==0: return
+    cursor.execute('SELECT id,is_custom,'+s_criteriaCols+' FROM presets WHERE id IN ('+','.join(['%s']*len(li_new))+')',tuple(li_new))
+    for t_row in cursor.fetchall():
+        dict_presets[t_row[0]]=(t_row[1],tuple(t_row[2:]))
+
+### END FUNCTION
+
+
+### FUNCTION: getCustomCriteria
+# Retrieves the criteria of custom assessments for all jobs in li_jobIDs in a
+# single query. These are not cached, because they belong to the job rather
+# than the preset. Returns a dictionary of criteria by job ID (integer).
+def getCustomCriteria(cursor,li_jobIDs):
+    dict_criteria=dict()
+    if len(li_jobIDs)==0: return dict_criteria
+    cursor.execute('SELECT result,'+s_criteriaCols+' FROM model_inputs WHERE result IN ('+','.join(['%s']*len(li_jobIDs))+')',tuple(li_jobIDs))
+    for t_row in cursor.fetchall():
+        dict_criteria[t_row[0]]=tuple(t_row[1:])
+    return dict_criteria
+
+### END FUNCTION
+
+
+### FUNCTION: defaultJobLimit
+# Works out a default for the maximum number of jobs to run at once. Each job
+# keeps a processor core busy, and is allowed r_jobMem GB of memory, so the
+# limit is the lesser of the number of cores and the number of jobs that fit
+# into the memory available when the service starts. At least one job is
+# always allowed.
+def defaultJobLimit(r_jobMem=1.0):
+    i_limit=cpu_count() or 1
+    try:
+        f_mem=open('/proc/meminfo','r')
+        for s_line in f_mem:
+            if s_line.startswith('MemAvailable:'):
+                i_limit=min(i_limit,int(int(s_line.split()[1])/(r_jobMem*1024**2)))
+                break
+        f_mem.close()
+    except:
+        pass
+    return max(i_limit,1)
+
+### END FUNCTION
+
+
 ### FUNCTION: getJobDir
 # Takes the jobID and generates a job directory name from it.
 # Creates a relative path from the location of this script,
@@ -446,14 +947,38 @@ def main():
     setproctitle('marathon')
 
     # Set defaults.
-    r_interval=15
+    r_interval=None
     b_debug=False
+    b_event=False
+    i_jobLimit=None
+    r_cacheGB=10
     i_failLimit=10
 
     # Parse command line.
     i_argCount=0
+    s_optVal=None
     for arg in sys.argv[1:]:
-        if arg[0]=='-':
+        if s_optVal=='jobs':
+            # This is the value of the jobs option.
+            try:
+                i_jobLimit=int(arg)
+            except ValueError:
+                i_jobLimit=0
+            if i_jobLimit<1:
+                print('Marathon error: maximum number of jobs is not a positive integer',file=sys.stderr)
+                sys.exit(1)
+            s_optVal=None
+        elif s_optVal=='cache':
+            # This is the value of the cache option.
+            try:
+                r_cacheGB=float(arg)
+            except ValueError:
+                r_cacheGB=-1
+            if r_cacheGB<0:
+                print('Marathon error: model cache size is not a non-negative number',file=sys.stderr)
+                sys.exit(1)
+            s_optVal=None
+        elif arg[0]=='-':
             # This is an option.
             if arg=='-h' or arg=='--help':
                 print('''
@@ -466,23 +991,41 @@ The process of checking jobs is termed a dispatch, and happens at
 intervals determined by a command line argument. Communication between 
 the front and back ends is accomplished by an SQL database and a shared 
 directory tree, see documentation for details.
+In event-driven mode, only jobs that need action are fetched from the
+database, and a dispatch also happens as soon as a running job reports
+progress or exits.
 
 Usage:
 ./main.py -h
-./main.py [-d] path-to-shared-folder [dispatch-interval]
+./main.py [-d] [-e] [-j max-jobs] [-c cache-size] path-to-shared-folder [dispatch-interval]
 
 Command line options:
 -h, --help  - displays help text
 -d, --debug - service prints debug information to standard out,
               and jobs print debug information to "[jobID].log"
               in the job folder (../jobs/job_[jobID]).
+-e, --event - event-driven dispatch mode.
+-j, --jobs  - followed by the maximum number of jobs to run at once.
+              Further jobs are queued until one finishes. Default is
+              the lesser of the number of processor cores and the
+              number of GB of available memory.
+-c, --cache - followed by the size in GB of the local cache of
+              extracted models (../cache/models), default 10.
+              0 disables the cache.
 
 Command line arguments:
 1: path to shared folder
-2: [optional] dispatch interval in seconds (default 15)''')
+2: [optional] dispatch interval in seconds (default 15, or 1 in
+   event-driven mode)''')
                 sys.exit(0)
             elif arg=='-d' or arg=='--debug':
                 b_debug=True
+            elif arg=='-e' or arg=='--event':
+                b_event=True
+            elif arg=='-j' or arg=='--jobs':
+                s_optVal='jobs'
+            elif arg=='-c' or arg=='--cache':
+                s_optVal='cache'
             else:
                 print('Marathon error: unknown command line option "'+arg+'"',file=sys.stderr)
                 sys.exit(1)
@@ -498,21 +1041,44 @@ Command line arguments:
                 except ValueError:
                     print('Marathon error: interval argument is not a number',file=sys.stderr)
                     sys.exit(1)
+    if not s_optVal is None:
+        print('Marathon error: command line option "'+sys.argv[-1]+'" requires a value',file=sys.stderr)
+        sys.exit(1)
     if i_argCount<1 or i_argCount>2:
         print('Marathon error: script accepts 1 or 2 argument(s)',file=sys.stderr)
         sys.exit(1)
+    if r_interval is None:
+        if b_event:
+            r_interval=1
+        else:
+            r_interval=15
+    if i_jobLimit is None:
+        i_jobLimit=defaultJobLimit()
+    i_jobCPUs=max((cpu_count() or 1)//i_jobLimit,1)
 
     # Main program.
 
     curDateTime=datetime.now()
     s_dateTime=curDateTime.strftime('%a %b %d %X %Y')
     if b_debug: print('Marathon: SERVICE START @ '+s_dateTime)
+    if b_debug and b_event: print('Marathon: event-driven dispatch mode')
+    if b_debug: print('Marathon: running up to {:d} job(s) at once, with {:d} CPU(s) each'.format(i_jobLimit,i_jobCPUs))
+    if b_debug: print('Marathon: model cache size {:g} GB'.format(r_cacheGB))
 
     # Create dictionaries to hold all running processes and pipe connections.
     # They can be retrieved by job ID (string).
     dict_proc=dict()
     dict_pipe=dict()
 
+    # Create dictionaries to cache model (with estate) and preset details.
+    # They can be retrieved by model and preset ID (integer).
+    dict_models=dict()
+    dict_presets=dict()
+
+    # Create dictionary to hold the SQL database details and connection,
+    # which persist between dispatches.
+    dict_db={'mtime':None,'config':['']*5,'cnx':None,'cursor':None,'fails':0,'retry_time':0}
+
     ### FUNCTION: killItWithFire
     # Kills a job with extreme prejudice. Sends a SIGKILL and erases the job directory.
     # This can be used if a job starts to look fishy.
@@ -527,6 +1093,23 @@ Command line arguments:
         del dict_proc[s_jobID]
         del dict_pipe[s_jobID]
 
+    ### FUNCTION: startJob
+    # Spawns a process to run a job, with a pipe through which it can
+    # communicate its status. t_args are the arguments to runJob, without
+    # the pipe connection and shared folder.
+    def startJob(s_jobID,t_args):
+        # Open a unidirectional pipe (slave->master) so the process can communicate its status.
+        con,sender=Pipe(False)
+
+        # Debug - run fake job
+        # proc=Process(target=runFakeJob,name='jobID_'+s_jobID,args=(s_jobID,))
+        proc=Process(target=runJob,name='jobID_'+s_jobID,args=t_args+(b_debug,sender,s_shareDir,r_cacheGB,i_jobCPUs))
+        proc.start()
+
+        # Put the process and pipe connections into a dictionary for later retrieval.
+        dict_proc[s_jobID]=proc
+        dict_pipe[s_jobID]=(con,sender)
+
     # Dispatch in infinite loop.
     while True:
         curDateTime=datetime.now()
@@ -535,123 +1118,105 @@ Command line arguments:
         # Get current time, to time how long dispatch takes.
         start_time=time()
 
-        # Get SQL database IP from file.
-        f_SQL=open('.SQL.txt','r')
-        s_SQLIP=f_SQL.readline().strip()
-        s_SQLuser=f_SQL.readline().strip()
-        s_SQLpwd=f_SQL.readline().strip()
-        s_SQLdbs=f_SQL.readline().strip()
-        s_errlog=f_SQL.readline().strip()
-        f_SQL.close()
-        if b_debug: print('Marathon: connecting to SQL database at IP '+s_SQLIP)
+        # Get SQL database details from file, if it has changed.
+        s_errlog=loadSQLconfig(dict_db,b_debug)
 
-        # Connect to SQL database.
-        try:
-            cnx=connector.connect(user=s_SQLuser,
-                password=s_SQLpwd,
-                host=s_SQLIP,
-                database=s_SQLdbs,
-                connection_timeout=r_interval)
-        except:
-            printError('failed to connect to SQL database, skipping dispatch',s_errlog,b_debug)
+        # Get the connection to the SQL database, which is kept open between
+        # dispatches.
+        # In event-driven mode the interval is too short to use as a timeout.
+        cnx=getSQLconnection(dict_db,max(r_interval,15) if b_event else r_interval,b_debug)
+        if cnx is None:
             sleepTilNext(start_time,r_interval,b_debug)
             continue
-        cursor=cnx.cursor(buffered=True)
+        cursor=dict_db['cursor']
+
+        # Status updates are queued, and written in a single transaction at
+        # the end of the dispatch.
+        lt_updates=[]
 
         ### FUNCTION: sql_update
-        # Updates the sql table with a new "result" value.
+        # Queues a new "result" value for the sql table.
         def sql_update(i_update,i_jobID):
-            try:
-                cursor.execute("UPDATE results SET result = {:d} WHERE id = {:d}".format(i_update,i_jobID))
-                cnx.commit()
-            except:
-                printError('failed to update SQL database',s_errlog,b_debug)
-            else:
-                if b_debug: print('Marathon: successfully updated the SQL database')
+            lt_updates.append((i_update,i_jobID))
 
         # Retrieve job list from SQL database.
+        # In event-driven mode, only retrieve jobs that need action, so
+        # that the cost of a dispatch does not grow with the job history.
+        if b_event:
+            s_query="SELECT id,model,result,preset,name FROM results WHERE result IN ("+','.join(['%s']*len(ti_activeStates))+")"
+            t_params=ti_activeStates
+        else:
+            s_query="SELECT id,model,result,preset,name FROM results"
+            t_params=()
         try:
-            cursor.execute("SELECT id,model,result,preset,name FROM results")
+            cursor.execute(s_query,t_params)
             query=cursor.fetchall()
         except:
             printError('failed to query SQL database, skipping dispatch',s_errlog,b_debug)
+            closeSQLconnection(dict_db)
             sleepTilNext(start_time,r_interval,b_debug)
             continue
         else:
             if b_debug: print('Marathon: successfully queried the SQL database')
 
+        # Jobs in terminal states need no action, so skip them before
+        # retrieving any details.
+        query=[t for t in query if t[2] is None or t[2] in ti_activeStates]
+
+        # Retrieve details of the models, estates and presets for these jobs
+        # in as few queries as possible. Criteria are only needed for jobs
+        # that are about to be started or restarted.
+        li_start=[i_jobID for (i_jobID,i_model,i_progress,i_preset,s_asmtName) in query
+                  if i_progress==0 or i_progress==5 or ((i_progress==1 or (i_progress>10 and i_progress<20)) and not str(i_jobID) in dict_proc)]
+        try:
+            cacheModels(cursor,[t[1] for t in query],dict_models)
+            cachePresets(cursor,[t[3] for t in query],dict_presets)
+            dict_custom=getCustomCriteria(cursor,[t[0] for t in query if t[0] in li_start and t[3] in dict_presets and dict_presets[t[3]][0]==1])
+        except:
+            printError('failed to retrieve job details from SQL database, skipping dispatch',s_errlog,b_debug)
+            closeSQLconnection(dict_db)
+            sleepTilNext(start_time,r_interval,b_debug)
+            continue
+        else:
+            if b_debug: print('Marathon: successfully retrieved job details')
+
         # Check for required actions on jobs
+        # Jobs to be started or restarted are collected in lt_waiting, and
+        # admitted afterwards if there are free slots.
+        ls_jobIDs=[]
+        lt_waiting=[]
+        dict_estateOf=dict()
         for (i_jobID,i_model,i_progress,i_preset,s_asmtName) in query:
+            ls_jobIDs.append(str(i_jobID))
 
-            # Retrieve model details.
-            try:
-                cursor.execute("SELECT tarball,name,estate,md5 FROM models WHERE id = "+str(i_model))
-                model_query=cursor.fetchall()
-            except:
+            # Retrieve model details, and estate name and type.
+            if not i_model in dict_models:
                 i_update=9
-                printError('failed to retrieve model details for job ID {:d}'.format(i_model),s_errlog,b_debug)
+                printError('failed to retrieve details of model ID {} for job ID {:d}'.format(i_model,i_jobID),s_errlog,b_debug)
                 sql_update(i_update,i_jobID)
                 continue
-            else:
-                (s_tarball,s_building,i_estate,s_MD5)=model_query[0]
-
-            # Retrieve estate name and type.
-            try:
-                cursor.execute("SELECT estates.name,estate_types.type FROM estates INNER JOIN estate_types ON estates.type=estate_types.id WHERE estates.id = "+str(i_estate))
-                model_query=cursor.fetchall()
-            except:
-                i_update=9
-                printError('failed to retrieve name and/or type of estate ID {:d}'.format(i_estate),s_errlog,b_debug)
-                sql_update(i_update,i_jobID)
-                continue
-            else:
-                (s_estate,s_estateType)=model_query[0]
+            (s_tarball,s_building,i_estate,s_MD5,s_estate,s_estateType)=dict_models[i_model]
+            dict_estateOf[str(i_jobID)]=i_estate
 
             # Retrieve criteria.
-            try:
-                cursor.execute("SELECT is_custom FROM presets WHERE id = "+str(i_preset))
-                model_query=cursor.fetchall()
-            except:
+            if not i_preset in dict_presets:
                 i_update=9
-                printError('failed to retrieve custom flag of preset id {:d}'.format(i_preset),s_errlog,b_debug)
+                printError('failed to retrieve custom flag of preset ID {} for job ID {:d}'.format(i_preset,i_jobID),s_errlog,b_debug)
                 sql_update(i_update,i_jobID)
                 continue
-            else:
-                (i_isCustom)=model_query[0]
+            (i_isCustom,ts_criteria)=dict_presets[i_preset]
 
             if (i_isCustom==1):
                 s_asmtName=s_asmtName.capitalize()+' (custom)'
-                try:
-                    cursor.execute('''SELECT 
-in01,in02,in03,in04,in05,in06,in07,in08,in09,in10,
-in11,in12,in13,in14,in15,in16,in17,in18,in19,in20,
-in21,in22,in23,in24,in25,in26,in27,in28,in29,in30
-FROM model_inputs WHERE result = '''+str(i_jobID))
-                    model_query=cursor.fetchall()
-                except:
-                    i_update=9
-                    printError('failed to retrieve criteria of custom assessment for job id {:d}'.format(i_jobID),s_errlog,b_debug)
-                    sql_update(i_update,i_jobID)
-                    continue
-                else:
-                    ts_criteria=model_query[0]
+                if i_jobID in li_start:
+                    if not i_jobID in dict_custom:
+                        i_update=9
+                        printError('failed to retrieve criteria of custom assessment for job id {:d}'.format(i_jobID),s_errlog,b_debug)
+                        sql_update(i_update,i_jobID)
+                        continue
+                    ts_criteria=dict_custom[i_jobID]
             else:
                 s_asmtName=s_asmtName.capitalize()
-                try:
-                    cursor.execute('''SELECT 
-in01,in02,in03,in04,in05,in06,in07,in08,in09,in10,
-in11,in12,in13,in14,in15,in16,in17,in18,in19,in20,
-in21,in22,in23,in24,in25,in26,in27,in28,in29,in30
-FROM presets WHERE id = '''+str(i_preset))
-                    model_query=cursor.fetchall()
-                except:
-                    i_update=9
-                    printError('failed to retrieve criteria of preset {:d} for job id {:d}'.format(i_preset,i_jobID),s_errlog,b_debug)
-                    sql_update(i_update,i_jobID)
-                    continue
-                else:
-                    ts_criteria=model_query[0]
-
 
             # Check stage of this job.
             s_jobID=str(i_jobID)
@@ -665,7 +1230,7 @@ FROM presets WHERE id = '''+str(i_preset))
             # 2: suspended
             # 3: complete
             # 4: abandoned
-            # 5: -
+            # 5: queued (waiting for a free slot)
             # 6: -
             # 7: cancel requested
             # 8: cancelled
@@ -679,7 +1244,7 @@ FROM presets WHERE id = '''+str(i_preset))
                     print('Marathon:   estate type - '+s_estateType)
                     print('Marathon:   resilience assessment - '+s_asmtName)
 
-            elif i_progress==0:
+            elif i_progress==0 or i_progress==5:
                 # Start a job - python multiprocessing.
                 # Check that a job with this ID doesn't already exist.
                 if s_jobID in dict_proc:
@@ -689,24 +1254,14 @@ FROM presets WHERE id = '''+str(i_preset))
                     continue
 
                 if b_debug:
-                    print('Marathon: *** starting new job ***')
+                    print('Marathon: *** job awaiting admission ***')
                     print('Marathon:   jobID - '+s_jobID)
                     print('Marathon:   building - '+s_building)
                     print('Marathon:   estate type - '+s_estateType)
                     print('Marathon:   resilience assessment - '+s_asmtName)
 
-                # Open a unidirectional pipe (slave->master) so the process can communicate its status.
-                con,sender=Pipe(False)
-
-                # Debug - run fake job
-                # proc=Process(target=runFakeJob,name='jobID_'+s_jobID,args=(s_jobID,))
-                proc=Process(target=runJob,name='jobID_'+s_jobID,args=(s_jobID,s_tarball,s_MD5,s_building,s_estate,s_estateType,s_asmtName,ts_criteria,b_debug,sender,s_shareDir))
-                proc.start()
-
-                # Put the process and pipe connections into a dictionary for later retrieval.
-                dict_proc[s_jobID]=proc
-                dict_pipe[s_jobID]=(con,sender)
-                i_update=1
+                lt_waiting.append((i_jobID,i_progress,False,i_estate,(s_jobID,s_tarball,s_MD5,s_building,s_estate,s_estateType,s_asmtName,ts_criteria)))
+                continue
 
             elif i_progress==1 or (i_progress>10 and i_progress<20):
 
@@ -731,20 +1286,11 @@ FROM presets WHERE id = '''+str(i_preset))
                         sql_update(i_update,i_jobID)
                         continue                        
 
-                    if b_debug: print('Marathon: *** restarting job ***')
+                    if b_debug: print('Marathon: *** job awaiting restart ***')
 
                     if s_jobID in dict_proc: del dict_proc[s_jobID]
                     if s_jobID in dict_pipe: del dict_pipe[s_jobID]
-                    con,sender=Pipe(False)
-
-                    # Debug - run fake job
-                    # proc=Process(target=runFakeJob,name='jobID_'+s_jobID,args=(s_jobID,))
-                    proc=Process(target=runJob,name='jobID_'+s_jobID,args=(s_jobID,s_tarball,s_MD5,s_building,s_estate,s_estateType,s_asmtName,ts_criteria,b_debug,sender,s_shareDir))
-                    proc.start()
-
-                    # Put the process and pipe connections into a dictionary for later retrieval.
-                    dict_proc[s_jobID]=proc
-                    dict_pipe[s_jobID]=(con,sender)                    
+                    lt_waiting.append((i_jobID,i_progress,True,i_estate,(s_jobID,s_tarball,s_MD5,s_building,s_estate,s_estateType,s_asmtName,ts_criteria)))
                     continue
 
                 # Check for an admin kill command (a file called "kill.it" in the job directory).
@@ -763,7 +1309,7 @@ FROM presets WHERE id = '''+str(i_preset))
                     b_done=False
                     if b_debug: print('Marathon:   job is alive')
                     while con.poll():
-                        i_tmp=con.recv()
+                        i_tmp=getSignal(con,b_debug)
                         if not type(i_tmp)==int:
                             # Unexpected signal type.
                             i_tmp=None
@@ -786,7 +1332,7 @@ FROM presets WHERE id = '''+str(i_preset))
                             if i_tmp==0:
                                 # Check if the performance flag is still in the pipe.
                                 if con.poll():
-                                    i_tmp=con.recv()
+                                    i_tmp=getSignal(con,b_debug)
                                 else:
                                     # This shouldn't be possible.
                                     printError('job ID {:d} didn\'t give performance flag'.format(i_model),s_errlog,b_debug)
@@ -827,7 +1373,7 @@ FROM presets WHERE id = '''+str(i_preset))
                     while con.poll():
                         try: 
                             i_tmp_prev=i_tmp
-                            i_tmp=con.recv()
+                            i_tmp=getSignal(con,b_debug)
                         except EOFError:
                             # Trap this error to avoid crashing the service.
                             i_tmp=i_tmp_prev
@@ -914,7 +1460,7 @@ FROM presets WHERE id = '''+str(i_preset))
                     while con.poll():
                         try: 
                             i_tmp_prev=i_tmp
-                            i_tmp=con.recv()
+                            i_tmp=getSignal(con,b_debug)
                         except EOFError:
                             # Trap this error to avoid crashing the service.
                             i_tmp=i_tmp_prev
@@ -953,9 +1499,40 @@ FROM presets WHERE id = '''+str(i_preset))
             if i_update>0:
                 sql_update(i_update,i_jobID)
 
-        cnx.close()
+        # Admit waiting jobs while there are free slots. Jobs that were
+        # running before the service restarted go first, then the job from
+        # the estate with the fewest running jobs, so that a burst of
+        # submissions from one estate does not hold up the others, then the
+        # oldest job.
+        dict_running=dict()
+        for s_jobID in dict_proc:
+            i_estate=dict_estateOf.get(s_jobID)
+            dict_running[i_estate]=dict_running.get(i_estate,0)+1
+        while len(lt_waiting)>0 and len(dict_proc)<i_jobLimit:
+            t_next=min(lt_waiting,key=lambda t:(not t[2],dict_running.get(t[3],0),t[0]))
+            lt_waiting.remove(t_next)
+            (i_jobID,i_progress,b_restart,i_estate,t_args)=t_next
+            if b_debug:
+                if b_restart:
+                    print('Marathon: *** restarting job '+t_args[0]+' ***')
+                else:
+                    print('Marathon: *** starting new job '+t_args[0]+' ***')
+            startJob(t_args[0],t_args)
+            dict_running[i_estate]=dict_running.get(i_estate,0)+1
+            if not b_restart: sql_update(1,i_jobID)
+
+        # Remaining jobs are queued until a slot becomes free.
+        for (i_jobID,i_progress,b_restart,i_estate,t_args) in lt_waiting:
+            if b_debug: print('Marathon: *** job '+t_args[0]+' queued ***')
+            if i_progress!=5: sql_update(5,i_jobID)
+        if b_debug: print('Marathon: {:d} job(s) running, {:d} job(s) queued'.format(len(dict_proc),len(lt_waiting)))
+
+        commitUpdates(dict_db,lt_updates,s_errlog,b_debug)
 
         # Check that dispatch has not been running for longer than the interval.
-        sleepTilNext(start_time,r_interval,b_debug)
+        if b_event:
+            waitTilNext(start_time,r_interval,ls_jobIDs,dict_proc,dict_pipe,b_debug)
+        else:
+            sleepTilNext(start_time,r_interval,b_debug)
 
 if __name__=='__main__': main()